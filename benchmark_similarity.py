@@ -0,0 +1,116 @@
+"""
+Script para medir el índice aproximado de similares frente a la búsqueda exacta
+Entrena (o carga) el índice IVF sobre el almacén de vectores y reporta recall@k
+y consultas por segundo para varios valores de nprobe
+"""
+import sys
+import time
+import argparse
+import numpy as np
+from config import config
+from utils.vector_store import VectorStore
+from utils.similarity import SimilarityIndex
+from utils.ivf_index import IVFIndex
+from utils.logger import setup_logger
+
+# Configurar logger
+logger = setup_logger("benchmark_similarity")
+
+
+def _recall(approximate, exact, k: int) -> float:
+    """Fracción media de los k vecinos exactos que devuelve el índice aproximado"""
+    hits = [
+        len({incident_id for incident_id, _ in found} & {incident_id for incident_id, _ in truth}) / max(1, min(k, len(truth)))
+        for found, truth in zip(approximate, exact)
+    ]
+    return float(np.mean(hits)) if hits else 0.0
+
+
+def _timed(search, queries: np.ndarray, batch_size: int):
+    start = time.perf_counter()
+    results = []
+    for offset in range(0, len(queries), batch_size):
+        results.extend(search(queries[offset:offset + batch_size]))
+    return results, time.perf_counter() - start
+
+
+def main():
+    """Compara recall@k y velocidad del índice IVF con la búsqueda exacta"""
+    parser = argparse.ArgumentParser(
+        description='Mide recall@k y velocidad del índice aproximado de similares'
+    )
+    parser.add_argument('--k', type=int, default=config.MAX_SIMILAR_INCIDENTS, help='Vecinos por consulta')
+    parser.add_argument('--queries', type=int, default=1000, help='Incidencias del almacén usadas como consulta')
+    parser.add_argument('--batch-size', type=int, default=config.SIMILARITY_QUERY_BATCH, help='Consultas por lote')
+    parser.add_argument(
+        '--nprobe',
+        type=str,
+        default='1,2,4,8,16,32',
+        help='Valores de nprobe a medir, separados por comas'
+    )
+    parser.add_argument('--nlist', type=int, default=config.IVF_NLIST, help='Listas del índice (0 = automático)')
+    parser.add_argument(
+        '--quantization',
+        choices=['int8', 'pq'],
+        default=config.IVF_QUANTIZATION,
+        help='Compresión de los vectores'
+    )
+    parser.add_argument('--pq-m', type=int, default=config.IVF_PQ_M, help='Subespacios de PQ')
+    parser.add_argument('--rerank', type=int, default=config.IVF_RERANK, help='Candidatos re-puntuados en float32')
+    parser.add_argument(
+        '--save',
+        action='store_true',
+        help=f'Guardar el índice entrenado en {config.IVF_INDEX_PATH}'
+    )
+    args = parser.parse_args()
+
+    store = VectorStore(config.VECTOR_STORE_DIR, config.EMBEDDING_DIMENSIONS, config.BEDROCK_EMBEDDING_MODEL_ID)
+    if len(store) == 0:
+        logger.error("✗ El almacén de vectores está vacío; ejecute embed_incidents.py")
+        return 1
+
+    ids, _ = store.items()
+    rng = np.random.default_rng(0)
+    sample = [ids[position] for position in rng.choice(len(ids), min(args.queries, len(ids)), replace=False)]
+    vectors = store.get(sample)
+    queries = np.stack([vectors[incident_id] for incident_id in sample])
+
+    exact_index = SimilarityIndex(store, block_size=config.SIMILARITY_BLOCK_SIZE)
+    exact, exact_seconds = _timed(
+        lambda batch: exact_index.search(batch, args.k),
+        queries,
+        args.batch_size
+    )
+
+    start = time.perf_counter()
+    index = IVFIndex(
+        store,
+        nlist=args.nlist,
+        quantization=args.quantization,
+        pq_m=args.pq_m,
+        rerank=args.rerank
+    )
+    logger.info(f"Entrenamiento: {time.perf_counter() - start:.1f}s")
+
+    print(f"\n{'='*80}")
+    print(f"{len(ids)} incidencias, {len(queries)} consultas, k={args.k}")
+    print(f"IVF {index.nlist} listas, {args.quantization} ({index.code_bytes} bytes/vector frente a {store.dim * 4}), rerank={args.rerank}")
+    print(f"{'='*80}")
+    print(f"{'índice':<16}{'recall@' + str(args.k):>12}{'consultas/s':>14}")
+    print(f"{'exacto':<16}{1.0:>12.3f}{len(queries) / exact_seconds:>14.1f}")
+    for nprobe in [int(value) for value in args.nprobe.split(',')]:
+        approximate, seconds = _timed(
+            lambda batch: index.search(batch, args.k, nprobe=nprobe),
+            queries,
+            args.batch_size
+        )
+        print(f"{'ivf nprobe=' + str(nprobe):<16}{_recall(approximate, exact, args.k):>12.3f}{len(queries) / seconds:>14.1f}")
+
+    if args.save:
+        index.save(config.IVF_INDEX_PATH)
+        logger.info(f"✓ Índice guardado en {config.IVF_INDEX_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,36 @@
 """
 Chain de clasificación de incidencias usando LangChain
 """
+import asyncio
+import hashlib
 import json
 import logging
-from typing import Dict, Any
+import threading
+from typing import Dict, Any, AsyncIterator, Iterable, Iterator, List, Optional, Union
 from datetime import datetime
 from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
 from langchain.output_parsers import PydanticOutputParser
-from pydantic import BaseModel, Field
+from langchain.schema import HumanMessage, SystemMessage
+from pydantic import BaseModel, Field, ValidationError
+from config import config
 from models.llm_factory import LLMFactory
-from prompts.classification import CLASSIFICATION_SYSTEM_PROMPT, CLASSIFICATION_PROMPT
+from models.local_classifier import LocalClassifier
+from models.retrieval_reuse import RetrievalReuse
+from prompts.classification import (
+    CLASSIFICATION_SYSTEM_PROMPT,
+    CLASSIFICATION_PROMPT,
+    BATCH_CLASSIFICATION_PROMPT,
+    BATCH_INCIDENT_TEMPLATE,
+)
+from utils.response_cache import ResponseCache
+from utils.tokens import estimate_tokens
+from utils.compaction import compact_text
 
 logger = logging.getLogger(__name__)
 
+# Causa asignada cuando la respuesta del modelo no se puede parsear
+PARSE_ERROR_CAUSA = "Error de Procesamiento"
+
 
 class CausaAlternativa(BaseModel):
     """Modelo para causas alternativas"""
@@ -32,11 +50,61 @@ class ClassificationOutput(BaseModel):
 class ClassificationChain:
     """Chain para clasificar incidencias y determinar causa raíz"""
     
-    def __init__(self):
-        """Inicializa el chain de clasificación"""
-        self.llm = LLMFactory.create_chat_model(temperature=0.0)
+    def __init__(
+        self,
+        cache: Optional[ResponseCache] = None,
+        refresh_cache: bool = False,
+        local_classifier: Optional[LocalClassifier] = None,
+        retrieval_reuse: Optional[RetrievalReuse] = None
+    ):
+        """
+        Inicializa el chain de clasificación
+        
+        Args:
+            cache: Caché de respuestas en disco (None = sin caché)
+            refresh_cache: Si es True, ignora las entradas existentes y las reescribe
+            local_classifier: Clasificador local consultado antes del LLM (None = desactivado)
+            retrieval_reuse: Reutilización de la clasificación de un vecino casi idéntico,
+                consultada antes que nada (None = desactivada)
+        """
+        self.temperature = 0.0
+        
+        # Cascada de modelos: el primer nivel es el modelo rápido por defecto
+        self.tiers = [
+            LLMFactory.create_balanced_chat_model(model_id=model_id, temperature=self.temperature)
+            for model_id in config.model_tiers
+        ]
+        self.tier_thresholds = config.model_tier_thresholds
+        self.llm = self.tiers[0]
+        self._tier_lock = threading.Lock()
+        self.tier_stats = {
+            llm.model_id: {"llamadas": 0, "finales": 0, "latencia_total_ms": 0}
+            for llm in self.tiers
+        }
+        self.cache = cache
+        self.refresh_cache = refresh_cache
+        self.local_classifier = local_classifier
+        self.local_threshold = config.CONFIDENCE_THRESHOLD
+        self._local_lock = threading.Lock()
+        self.local_stats = {"consultas": 0, "servidas": 0}
+        self.retrieval_reuse = retrieval_reuse
+        self._reuse_lock = threading.Lock()
+        self.reuse_stats = {"consultas": 0, "reutilizadas": 0, "latencia_ahorrada_ms": 0}
+        self.compaction_enabled = config.COMPACTION_ENABLED
+        self.notes_token_budget = config.COMPACTION_TOKEN_BUDGET
         self.parser = PydanticOutputParser(pydantic_object=ClassificationOutput)
         self._setup_chain()
+        
+        # Modo empaquetado: varias incidencias por petición
+        self._packed_llm = None
+        self.pack_token_budget = config.PACK_TOKEN_BUDGET
+        self.max_pack_items = max(1, min(
+            config.PACK_MAX_ITEMS,
+            config.PACK_MAX_OUTPUT_TOKENS // config.PACK_OUTPUT_TOKENS_PER_ITEM
+        ))
+        self._pack_overhead_tokens = estimate_tokens(CLASSIFICATION_SYSTEM_PROMPT) + estimate_tokens(BATCH_CLASSIFICATION_PROMPT)
+        self._pack_lock = threading.Lock()
+        self.pack_stats = {"peticiones": 0, "incidencias": 0, "reintentos_individuales": 0}
     
     def _setup_chain(self):
         """Configura el chain con los prompts"""
@@ -53,14 +121,408 @@ class ClassificationChain:
             human_message
         ])
         
+        # Huella de la plantilla completa: cambia si cambia el prompt o el esquema de salida
+        self.prompt_version = hashlib.sha256(
+            "\n".join([
+                CLASSIFICATION_SYSTEM_PROMPT,
+                CLASSIFICATION_PROMPT,
+                self.parser.get_format_instructions()
+            ]).encode("utf-8")
+        ).hexdigest()[:16]
+        self.packed_prompt_version = hashlib.sha256(
+            "\n".join([
+                CLASSIFICATION_SYSTEM_PROMPT,
+                BATCH_CLASSIFICATION_PROMPT,
+                BATCH_INCIDENT_TEMPLATE
+            ]).encode("utf-8")
+        ).hexdigest()[:16]
+        
         logger.info("Chain de clasificación configurado")
     
+    def _build_messages(
+        self,
+        ticket_id: str,
+        resumen: str,
+        notas: str,
+        fecha_creacion: Optional[datetime]
+    ) -> list:
+        """Prepara los mensajes del prompt para una incidencia (sin fecha se usa la actual)"""
+        return self.prompt.format_messages(
+            ticket_id=ticket_id,
+            resumen=resumen,
+            notas=notas or "No hay notas adicionales",
+            fecha_creacion=(fecha_creacion or datetime.now()).strftime("%Y-%m-%d %H:%M:%S"),
+            format_instructions=self.parser.get_format_instructions()
+        )
+    
+    @staticmethod
+    def _load_json(content: Any) -> Any:
+        """Parsea el contenido de la respuesta, limpiando bloques markdown si existen"""
+        if not isinstance(content, str):
+            return content
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0].strip()
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0].strip()
+        return json.loads(content)
+    
+    @staticmethod
+    def _response_endpoint(response: Any) -> Optional[str]:
+        """Endpoint (región/modelo) que generó la respuesta, si el pool lo anotó"""
+        metadata = getattr(response, "response_metadata", None)
+        return metadata.get("endpoint") if isinstance(metadata, dict) else None
+    
+    def _parse_response(
+        self,
+        ticket_id: str,
+        response: Any,
+        start_time: datetime,
+        model_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Convierte la respuesta del modelo en el diccionario de resultado
+        
+        Args:
+            ticket_id: ID del ticket
+            response: Mensaje devuelto por el modelo
+            start_time: Momento de inicio de la clasificación
+            model_id: Modelo que generó la respuesta (por defecto el primer nivel)
+            
+        Returns:
+            Diccionario con la clasificación y metadatos
+        """
+        model_id = model_id or self.llm.model_id
+        try:
+            # Intentar parsear como JSON primero
+            result_dict = self._load_json(response.content)
+            
+            # Convertir a formato esperado
+            result = {
+                "ticket_id": ticket_id,
+                "causa_raiz_predicha": result_dict.get("causa_raiz_predicha", "Desconocido"),
+                "confianza": float(result_dict.get("confianza", 0.0)),
+                "razonamiento": result_dict.get("razonamiento", ""),
+                "keywords_detectadas": result_dict.get("keywords_detectadas", []),
+                "causas_alternativas": result_dict.get("causas_alternativas", []),
+                "tiempo_procesamiento_ms": int((datetime.now() - start_time).total_seconds() * 1000),
+                "modelo_version": model_id,
+                "prompt_version": self.prompt_version,
+                "endpoint": self._response_endpoint(response)
+            }
+            
+            logger.info(f"Incidencia {ticket_id} clasificada: {result['causa_raiz_predicha']} (confianza: {result['confianza']})")
+            return result
+            
+        except json.JSONDecodeError as e:
+            logger.error(f"Error al parsear respuesta JSON: {e}")
+            logger.error(f"Contenido recibido: {response.content}")
+            
+            # Retornar resultado por defecto
+            return {
+                "ticket_id": ticket_id,
+                "causa_raiz_predicha": PARSE_ERROR_CAUSA,
+                "confianza": 0.0,
+                "razonamiento": f"Error al parsear respuesta del modelo: {str(e)}",
+                "keywords_detectadas": [],
+                "causas_alternativas": [],
+                "tiempo_procesamiento_ms": int((datetime.now() - start_time).total_seconds() * 1000),
+                "modelo_version": model_id,
+                "prompt_version": self.prompt_version,
+                "endpoint": self._response_endpoint(response)
+            }
+    
+    @property
+    def model_signature(self) -> str:
+        """Identifica la configuración de modelos (cascada incluida) para la caché"""
+        if len(self.tiers) == 1:
+            return self.llm.model_id
+        return "+".join(
+            f"{llm.model_id}<{threshold}" for llm, threshold in zip(self.tiers, self.tier_thresholds + [None])
+        )
+    
+    def _needs_escalation(self, result: Dict[str, Any], tier: int) -> bool:
+        """Indica si un resultado del nivel `tier` debe repetirse en el siguiente nivel"""
+        if tier + 1 >= len(self.tiers):
+            return False
+        return (
+            result["causa_raiz_predicha"] == PARSE_ERROR_CAUSA
+            or result["confianza"] < self.tier_thresholds[tier]
+        )
+    
+    def _record_tier_call(self, tier: int, latency_ms: int) -> None:
+        with self._tier_lock:
+            stats = self.tier_stats[self.tiers[tier].model_id]
+            stats["llamadas"] += 1
+            stats["latencia_total_ms"] += latency_ms
+    
+    def _record_tier_final(self, tier: int) -> None:
+        with self._tier_lock:
+            self.tier_stats[self.tiers[tier].model_id]["finales"] += 1
+    
+    def _invoke_tier(
+        self,
+        tier: int,
+        messages: list,
+        ticket_id: str,
+        start_time: datetime
+    ) -> Dict[str, Any]:
+        """Invoca un nivel de la cascada y parsea su respuesta"""
+        call_start = datetime.now()
+        try:
+            response = self.tiers[tier].invoke(messages)
+        finally:
+            self._record_tier_call(tier, int((datetime.now() - call_start).total_seconds() * 1000))
+        return self._parse_response(ticket_id, response, start_time, model_id=self.tiers[tier].model_id)
+    
+    async def _ainvoke_tier(
+        self,
+        tier: int,
+        messages: list,
+        ticket_id: str,
+        start_time: datetime
+    ) -> Dict[str, Any]:
+        """Versión asíncrona de _invoke_tier"""
+        call_start = datetime.now()
+        try:
+            response = await self.tiers[tier].ainvoke(messages)
+        finally:
+            self._record_tier_call(tier, int((datetime.now() - call_start).total_seconds() * 1000))
+        return self._parse_response(ticket_id, response, start_time, model_id=self.tiers[tier].model_id)
+    
+    def _escalate(
+        self,
+        result: Dict[str, Any],
+        messages: list,
+        ticket_id: str,
+        start_time: datetime,
+        tier: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Repite la clasificación en niveles superiores mientras la confianza sea baja
+        
+        Si un nivel superior falla, se conserva el último resultado válido.
+        """
+        while self._needs_escalation(result, tier):
+            logger.info(
+                f"Escalando incidencia {ticket_id} a {self.tiers[tier + 1].model_id} "
+                f"(confianza {result['confianza']:.2f} en {self.tiers[tier].model_id})"
+            )
+            try:
+                result = self._invoke_tier(tier + 1, messages, ticket_id, start_time)
+            except Exception as e:
+                logger.warning(f"Error al escalar incidencia {ticket_id}, se mantiene el nivel {tier}: {e}")
+                break
+            tier += 1
+        self._record_tier_final(tier)
+        return result
+    
+    async def _aescalate(
+        self,
+        result: Dict[str, Any],
+        messages: list,
+        ticket_id: str,
+        start_time: datetime,
+        tier: int = 0
+    ) -> Dict[str, Any]:
+        """Versión asíncrona de _escalate"""
+        while self._needs_escalation(result, tier):
+            logger.info(f"Escalando incidencia {ticket_id} a {self.tiers[tier + 1].model_id}")
+            try:
+                result = await self._ainvoke_tier(tier + 1, messages, ticket_id, start_time)
+            except Exception as e:
+                logger.warning(f"Error al escalar incidencia {ticket_id}, se mantiene el nivel {tier}: {e}")
+                break
+            tier += 1
+        self._record_tier_final(tier)
+        return result
+    
+    def _fast_path(
+        self,
+        ticket_id: str,
+        resumen: str,
+        notas: str,
+        start_time: datetime
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Consulta el clasificador local y devuelve su resultado si supera el umbral de confianza
+        
+        Returns:
+            Resultado de clasificación local o None si hay que llamar al LLM
+        """
+        if self.local_classifier is None:
+            return None
+        
+        prediction = self.local_classifier.predict(f"{resumen}\n{notas}")
+        served = prediction["confianza"] >= self.local_threshold
+        with self._local_lock:
+            self.local_stats["consultas"] += 1
+            if served:
+                self.local_stats["servidas"] += 1
+        if not served:
+            return None
+        
+        logger.info(
+            f"Incidencia {ticket_id} clasificada localmente: {prediction['causa_raiz_predicha']} "
+            f"(confianza: {prediction['confianza']:.2f})"
+        )
+        return {
+            "ticket_id": ticket_id,
+            "causa_raiz_predicha": prediction["causa_raiz_predicha"],
+            "confianza": prediction["confianza"],
+            "razonamiento": (
+                "Clasificación del modelo local por similitud con el histórico. "
+                f"Términos determinantes: {', '.join(prediction['keywords_detectadas']) or 'ninguno'}"
+            ),
+            "keywords_detectadas": prediction["keywords_detectadas"],
+            "causas_alternativas": prediction["causas_alternativas"],
+            "tiempo_procesamiento_ms": int((datetime.now() - start_time).total_seconds() * 1000),
+            "modelo_version": self.local_classifier.version,
+            "prompt_version": None,
+            "origen": "local"
+        }
+    
+    def _reuse_path(
+        self,
+        ticket_id: str,
+        resumen: str,
+        notas: str,
+        start_time: datetime,
+        similares: Optional[List[Dict[str, Any]]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve la clasificación guardada de un vecino ya triado por encima del umbral de similitud
+        
+        Returns:
+            Resultado reutilizado (con la incidencia origen) o None si hay que clasificar
+        """
+        if self.retrieval_reuse is None:
+            return None
+        
+        try:
+            match = self.retrieval_reuse.find(ticket_id, resumen, notas, similares)
+        except Exception as e:
+            logger.warning(f"No se pudo buscar una clasificación reutilizable para {ticket_id}: {e}")
+            match = None
+        elapsed_ms = int((datetime.now() - start_time).total_seconds() * 1000)
+        # Latencia ahorrada: lo que costó clasificar la incidencia origen menos la búsqueda
+        saved_ms = max(0, int(match[2].get("tiempo_procesamiento_ms") or 0) - elapsed_ms) if match else 0
+        with self._reuse_lock:
+            self.reuse_stats["consultas"] += 1
+            if match is not None:
+                self.reuse_stats["reutilizadas"] += 1
+                self.reuse_stats["latencia_ahorrada_ms"] += saved_ms
+        if match is None:
+            return None
+        
+        source_id, similarity, stored = match
+        logger.info(
+            f"Incidencia {ticket_id} reutiliza la clasificación de {source_id}: "
+            f"{stored['causa_raiz_predicha']} (similitud: {similarity:.3f})"
+        )
+        return {
+            "ticket_id": ticket_id,
+            "causa_raiz_predicha": stored["causa_raiz_predicha"],
+            "confianza": float(stored["confianza"]),
+            "razonamiento": (
+                f"Clasificación reutilizada de la incidencia {source_id} (similitud {similarity:.3f}). "
+                f"{stored.get('razonamiento') or ''}"
+            ).strip(),
+            "keywords_detectadas": stored.get("keywords_detectadas") or [],
+            "causas_alternativas": stored.get("causas_alternativas") or [],
+            "tiempo_procesamiento_ms": elapsed_ms,
+            "modelo_version": stored.get("modelo_version"),
+            "prompt_version": stored.get("prompt_version"),
+            "origen": "reutilizada",
+            "reutilizada_de": source_id,
+            "similitud_reutilizacion": round(similarity, 4)
+        }
+    
+    def _compact_notas(self, resumen: str, notas: str) -> tuple[str, Dict[str, int]]:
+        """
+        Compacta las notas al presupuesto de tokens por ticket
+        
+        Returns:
+            Tupla (notas compactadas, tokens de entrada originales y compactados)
+        """
+        resumen_tokens = estimate_tokens(resumen)
+        if not self.compaction_enabled:
+            tokens = resumen_tokens + estimate_tokens(notas)
+            return notas, {"tokens_originales": tokens, "tokens_compactados": tokens}
+        
+        compacted = compact_text(notas, self.notes_token_budget)
+        if compacted.compacted_tokens < compacted.original_tokens:
+            logger.debug(f"Notas compactadas de {compacted.original_tokens} a {compacted.compacted_tokens} tokens")
+        return compacted.text, {
+            "tokens_originales": resumen_tokens + compacted.original_tokens,
+            "tokens_compactados": resumen_tokens + compacted.compacted_tokens
+        }
+    
+    def _cache_key(
+        self,
+        resumen: str,
+        notas: str,
+        prompt_version: Optional[str] = None
+    ) -> Optional[str]:
+        """Clave de caché para las entradas que determinan la clasificación"""
+        if self.cache is None:
+            return None
+        return ResponseCache.make_key(
+            inputs={"resumen": resumen, "notas": notas},
+            model_id=self.model_signature,
+            temperature=self.temperature,
+            prompt_version=prompt_version or self.prompt_version
+        )
+    
+    def _cache_lookup(
+        self,
+        cache_key: Optional[str],
+        ticket_id: str,
+        start_time: datetime
+    ) -> Optional[Dict[str, Any]]:
+        """Devuelve el resultado cacheado adaptado al ticket actual, si existe"""
+        if cache_key is None or self.refresh_cache:
+            return None
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            return None
+        
+        result = dict(cached)
+        result["ticket_id"] = ticket_id
+        result["tiempo_procesamiento_ms"] = int((datetime.now() - start_time).total_seconds() * 1000)
+        result["cache_hit"] = True
+        logger.info(f"Incidencia {ticket_id} servida desde caché: {result['causa_raiz_predicha']}")
+        return result
+    
+    def _cache_store(self, cache_key: Optional[str], result: Dict[str, Any]) -> None:
+        """Guarda un resultado válido en la caché"""
+        if cache_key is None or result["causa_raiz_predicha"] == PARSE_ERROR_CAUSA:
+            return
+        self.cache.put(cache_key, {
+            name: value for name, value in result.items()
+            if name not in ("ticket_id", "tiempo_procesamiento_ms")
+        })
+    
+    @staticmethod
+    def _error_result(ticket_id: str, error: Exception) -> Dict[str, Any]:
+        """Resultado por defecto para una incidencia que no se pudo clasificar"""
+        return {
+            "ticket_id": ticket_id,
+            "causa_raiz_predicha": "Error",
+            "confianza": 0.0,
+            "razonamiento": f"Error: {str(error)}",
+            "keywords_detectadas": [],
+            "causas_alternativas": [],
+            "tiempo_procesamiento_ms": 0,
+            "modelo_version": "error"
+        }
+    
     def classify(
         self,
         ticket_id: str,
         resumen: str,
         notas: str,
-        fecha_creacion: datetime
+        fecha_creacion: datetime,
+        similares: Optional[List[Dict[str, Any]]] = None
     ) -> Dict[str, Any]:
         """
         Clasifica una incidencia y determina su causa raíz
@@ -70,6 +532,7 @@ class ClassificationChain:
             resumen: Resumen de la incidencia
             notas: Notas adicionales
             fecha_creacion: Fecha de creación
+            similares: Candidatos a reutilizar ya calculados (None = buscarlos)
             
         Returns:
             Diccionario con la clasificación y metadatos
@@ -77,104 +540,398 @@ class ClassificationChain:
         try:
             start_time = datetime.now()
             
+            # Reutilización: vecino casi idéntico ya triado
+            reused = self._reuse_path(ticket_id, resumen, notas, start_time, similares)
+            if reused is not None:
+                return reused
+            
+            # Fast-path: clasificador local con confianza suficiente
+            local = self._fast_path(ticket_id, resumen, notas, start_time)
+            if local is not None:
+                return local
+            
+            # Compactar la entrada al presupuesto de tokens
+            notas, token_counts = self._compact_notas(resumen, notas)
+            
+            # Consultar la caché de respuestas
+            cache_key = self._cache_key(resumen, notas)
+            cached = self._cache_lookup(cache_key, ticket_id, start_time)
+            if cached is not None:
+                return {**cached, **token_counts}
+            
             # Preparar el prompt
-            messages = self.prompt.format_messages(
-                ticket_id=ticket_id,
-                resumen=resumen,
-                notas=notas or "No hay notas adicionales",
-                fecha_creacion=fecha_creacion.strftime("%Y-%m-%d %H:%M:%S"),
-                format_instructions=self.parser.get_format_instructions()
-            )
+            messages = self._build_messages(ticket_id, resumen, notas, fecha_creacion)
             
-            # Invocar el modelo
+            # Invocar el modelo (escalando en la cascada si la confianza es baja)
             logger.info(f"Clasificando incidencia {ticket_id}")
-            response = self.llm.invoke(messages)
-            
-            # Parsear la respuesta
-            try:
-                # Intentar parsear como JSON primero
-                content = response.content
-                if isinstance(content, str):
-                    # Limpiar markdown si existe
-                    if "```json" in content:
-                        content = content.split("```json")[1].split("```")[0].strip()
-                    elif "```" in content:
-                        content = content.split("```")[1].split("```")[0].strip()
-                    
-                    result_dict = json.loads(content)
-                else:
-                    result_dict = content
-                
-                # Convertir a formato esperado
-                result = {
-                    "ticket_id": ticket_id,
-                    "causa_raiz_predicha": result_dict.get("causa_raiz_predicha", "Desconocido"),
-                    "confianza": float(result_dict.get("confianza", 0.0)),
-                    "razonamiento": result_dict.get("razonamiento", ""),
-                    "keywords_detectadas": result_dict.get("keywords_detectadas", []),
-                    "causas_alternativas": result_dict.get("causas_alternativas", []),
-                    "tiempo_procesamiento_ms": int((datetime.now() - start_time).total_seconds() * 1000),
-                    "modelo_version": self.llm.model_id
-                }
+            result = self._invoke_tier(0, messages, ticket_id, start_time)
+            result = self._escalate(result, messages, ticket_id, start_time)
+            self._cache_store(cache_key, result)
+            return {**result, **token_counts}
                 
-                logger.info(f"Incidencia {ticket_id} clasificada: {result['causa_raiz_predicha']} (confianza: {result['confianza']})")
-                return result
-                
-            except json.JSONDecodeError as e:
-                logger.error(f"Error al parsear respuesta JSON: {e}")
-                logger.error(f"Contenido recibido: {response.content}")
-                
-                # Retornar resultado por defecto
-                return {
-                    "ticket_id": ticket_id,
-                    "causa_raiz_predicha": "Error de Procesamiento",
-                    "confianza": 0.0,
-                    "razonamiento": f"Error al parsear respuesta del modelo: {str(e)}",
-                    "keywords_detectadas": [],
-                    "causas_alternativas": [],
-                    "tiempo_procesamiento_ms": int((datetime.now() - start_time).total_seconds() * 1000),
-                    "modelo_version": self.llm.model_id
-                }
+        except Exception as e:
+            logger.error(f"Error al clasificar incidencia {ticket_id}: {e}")
+            raise
+    
+    async def aclassify(
+        self,
+        ticket_id: str,
+        resumen: str,
+        notas: str,
+        fecha_creacion: datetime,
+        similares: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Versión asíncrona de classify basada en la invocación async del modelo
+        
+        Args:
+            ticket_id: ID del ticket
+            resumen: Resumen de la incidencia
+            notas: Notas adicionales
+            fecha_creacion: Fecha de creación
+            similares: Candidatos a reutilizar ya calculados (None = buscarlos)
+            
+        Returns:
+            Diccionario con la clasificación y metadatos
+        """
+        try:
+            start_time = datetime.now()
+            
+            # La búsqueda de reutilización y la caché hacen E/S bloqueante (base de datos, SQLite):
+            # se ejecutan en un hilo para no detener el event loop
+            reused = await asyncio.to_thread(self._reuse_path, ticket_id, resumen, notas, start_time, similares)
+            if reused is not None:
+                return reused
+            
+            local = self._fast_path(ticket_id, resumen, notas, start_time)
+            if local is not None:
+                return local
+            
+            notas, token_counts = self._compact_notas(resumen, notas)
+            
+            cache_key = self._cache_key(resumen, notas)
+            cached = await asyncio.to_thread(self._cache_lookup, cache_key, ticket_id, start_time)
+            if cached is not None:
+                return {**cached, **token_counts}
+            
+            messages = self._build_messages(ticket_id, resumen, notas, fecha_creacion)
+            
+            logger.info(f"Clasificando incidencia {ticket_id} (async)")
+            result = await self._ainvoke_tier(0, messages, ticket_id, start_time)
+            result = await self._aescalate(result, messages, ticket_id, start_time)
+            await asyncio.to_thread(self._cache_store, cache_key, result)
+            return {**result, **token_counts}
                 
         except Exception as e:
             logger.error(f"Error al clasificar incidencia {ticket_id}: {e}")
             raise
     
-    def classify_batch(
+    def _get_packed_llm(self):
+        """Modelo para peticiones empaquetadas, con margen de salida para varias incidencias"""
+        if self._packed_llm is None:
+            self._packed_llm = LLMFactory.create_balanced_chat_model(
+                model_id=self.llm.model_id,
+                temperature=self.temperature,
+                max_tokens=config.PACK_MAX_OUTPUT_TOKENS
+            )
+        return self._packed_llm
+    
+    def _incident_tokens(self, incident: Dict[str, Any]) -> int:
+        """Tokens estimados que aporta una incidencia a un prompt empaquetado"""
+        notas_tokens = estimate_tokens(incident.get("notas", ""))
+        if self.compaction_enabled:
+            notas_tokens = min(notas_tokens, self.notes_token_budget)
+        return (
+            estimate_tokens(BATCH_INCIDENT_TEMPLATE)
+            + estimate_tokens(str(incident.get("ticket_id", "")))
+            + estimate_tokens(incident.get("resumen", ""))
+            + notas_tokens
+        )
+    
+    def fits_in_pack(
+        self,
+        pack: list[Dict[str, Any]],
+        incident: Dict[str, Any]
+    ) -> bool:
+        """
+        Indica si una incidencia cabe en un paquete sin superar el presupuesto de tokens
+        
+        Args:
+            pack: Incidencias ya incluidas en el paquete
+            incident: Incidencia candidata
+            
+        Returns:
+            True si cabe (un paquete vacío siempre admite una incidencia)
+        """
+        if not pack:
+            return True
+        if len(pack) >= self.max_pack_items:
+            return False
+        tokens = self._pack_overhead_tokens + sum(self._incident_tokens(item) for item in pack)
+        return tokens + self._incident_tokens(incident) <= self.pack_token_budget
+    
+    def iter_packs(
+        self,
+        incidents: Iterable[Dict[str, Any]]
+    ) -> Iterator[list[Dict[str, Any]]]:
+        """Agrupa incidencias consecutivas en paquetes ajustados al presupuesto de tokens"""
+        pack: list[Dict[str, Any]] = []
+        for incident in incidents:
+            if not self.fits_in_pack(pack, incident):
+                yield pack
+                pack = []
+            pack.append(incident)
+        if pack:
+            yield pack
+    
+    def _build_packed_messages(self, incidents: list[Dict[str, Any]]) -> list:
+        """Prepara un único prompt con varias incidencias"""
+        blocks = []
+        for position, incident in enumerate(incidents, start=1):
+            fecha_creacion = incident.get("fecha_creacion") or datetime.now()
+            blocks.append(BATCH_INCIDENT_TEMPLATE.format(
+                posicion=position,
+                ticket_id=incident.get("ticket_id", ""),
+                resumen=incident.get("resumen", ""),
+                notas=incident.get("notas") or "No hay notas adicionales",
+                fecha_creacion=fecha_creacion.strftime("%Y-%m-%d %H:%M:%S")
+            ))
+        
+        return [
+            SystemMessage(content=CLASSIFICATION_SYSTEM_PROMPT),
+            HumanMessage(content=BATCH_CLASSIFICATION_PROMPT.format(
+                num_incidencias=len(incidents),
+                incidencias="\n\n".join(blocks)
+            ))
+        ]
+    
+    def _parse_packed_response(self, response: Any) -> Dict[str, Dict[str, Any]]:
+        """
+        Valida cada elemento de una respuesta empaquetada contra ClassificationOutput
+        
+        Returns:
+            Diccionario ticket_id -> clasificación; los elementos inválidos se descartan
+        """
+        try:
+            items = self._load_json(response.content)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Respuesta empaquetada no es JSON válido: {e}")
+            return {}
+        
+        if isinstance(items, dict):
+            items = items.get("resultados") or items.get("incidencias") or [items]
+        if not isinstance(items, list):
+            return {}
+        
+        parsed = {}
+        for item in items:
+            if not isinstance(item, dict) or "ticket_id" not in item:
+                continue
+            try:
+                parsed[str(item["ticket_id"])] = ClassificationOutput.model_validate(item).model_dump()
+            except ValidationError as e:
+                logger.warning(f"Elemento inválido para {item.get('ticket_id')} en respuesta empaquetada: {e}")
+        return parsed
+    
+    def classify_packed(
         self,
         incidents: list[Dict[str, Any]]
+    ) -> list[Union[Dict[str, Any], Exception]]:
+        """
+        Clasifica varias incidencias con una única petición al modelo
+        
+        Las incidencias que faltan en la respuesta o no superan la validación se
+        reintentan individualmente con classify.
+        
+        Args:
+            incidents: Incidencias del paquete
+            
+        Returns:
+            Un resultado por incidencia, en el mismo orden; la excepción si falló
+        """
+        start_time = datetime.now()
+        outcomes: list = [None] * len(incidents)
+        cache_keys: Dict[int, Optional[str]] = {}
+        compacted: Dict[int, Dict[str, Any]] = {}
+        token_counts: Dict[int, Dict[str, int]] = {}
+        
+        for position, incident in enumerate(incidents):
+            resumen = incident.get("resumen", "")
+            reused = self._reuse_path(
+                str(incident.get("ticket_id", "")),
+                resumen,
+                incident.get("notas", ""),
+                start_time,
+                incident.get("candidatos_reutilizacion")
+            )
+            if reused is not None:
+                outcomes[position] = reused
+                continue
+            local = self._fast_path(str(incident.get("ticket_id", "")), resumen, incident.get("notas", ""), start_time)
+            if local is not None:
+                outcomes[position] = local
+                continue
+            notas, token_counts[position] = self._compact_notas(resumen, incident.get("notas", ""))
+            cache_key = self._cache_key(resumen, notas, self.packed_prompt_version)
+            cached = self._cache_lookup(cache_key, str(incident.get("ticket_id", "")), start_time)
+            if cached is not None:
+                outcomes[position] = {**cached, **token_counts[position]}
+            else:
+                cache_keys[position] = cache_key
+                compacted[position] = {**incident, "notas": notas}
+        
+        if not cache_keys:
+            return outcomes
+        
+        pack = [compacted[position] for position in cache_keys]
+        parsed: Dict[str, Dict[str, Any]] = {}
+        endpoint = None
+        try:
+            logger.info(f"Clasificando paquete de {len(pack)} incidencias")
+            call_start = datetime.now()
+            try:
+                response = self._get_packed_llm().invoke(self._build_packed_messages(pack))
+            finally:
+                self._record_tier_call(0, int((datetime.now() - call_start).total_seconds() * 1000))
+            parsed = self._parse_packed_response(response)
+            endpoint = self._response_endpoint(response)
+        except Exception as e:
+            logger.warning(f"Error en la petición empaquetada, se reintenta cada incidencia individualmente: {e}")
+        
+        elapsed_ms = int((datetime.now() - start_time).total_seconds() * 1000)
+        retries = 0
+        
+        for position, cache_key in cache_keys.items():
+            incident = incidents[position]
+            ticket_id = str(incident.get("ticket_id", ""))
+            item = parsed.get(ticket_id)
+            
+            if item is None:
+                retries += 1
+                # La reutilización ya se consultó al preparar el paquete
+                try:
+                    outcomes[position] = self.classify(
+                        ticket_id=ticket_id,
+                        resumen=incident.get("resumen", ""),
+                        notas=incident.get("notas", ""),
+                        fecha_creacion=incident.get("fecha_creacion") or datetime.now(),
+                        similares=[]
+                    )
+                except Exception as e:
+                    outcomes[position] = e
+                continue
+            
+            result = {
+                "ticket_id": ticket_id,
+                **item,
+                "tiempo_procesamiento_ms": elapsed_ms // len(pack),
+                "modelo_version": self.llm.model_id,
+                "prompt_version": self.packed_prompt_version,
+                "endpoint": endpoint
+            }
+            if self._needs_escalation(result, 0):
+                item_incident = compacted[position]
+                messages = self._build_messages(
+                    ticket_id,
+                    item_incident.get("resumen", ""),
+                    item_incident.get("notas", ""),
+                    item_incident.get("fecha_creacion") or datetime.now()
+                )
+                result = self._escalate(result, messages, ticket_id, start_time)
+            else:
+                self._record_tier_final(0)
+            self._cache_store(cache_key, result)
+            outcomes[position] = {**result, **token_counts[position]}
+        
+        with self._pack_lock:
+            self.pack_stats["peticiones"] += 1
+            self.pack_stats["incidencias"] += len(pack)
+            self.pack_stats["reintentos_individuales"] += retries
+        
+        logger.info(f"Paquete de {len(pack)} incidencias clasificado en {elapsed_ms}ms ({retries} reintentos individuales)")
+        return outcomes
+    
+    def classify_batch(
+        self,
+        incidents: list[Dict[str, Any]],
+        packed: bool = False
     ) -> list[Dict[str, Any]]:
         """
         Clasifica un lote de incidencias
         
         Args:
             incidents: Lista de diccionarios con datos de incidencias
+            packed: Si es True, agrupa varias incidencias por petición al modelo
             
         Returns:
             Lista de resultados de clasificación
         """
         results = []
         
+        if packed:
+            for pack in self.iter_packs(incidents):
+                for incident, outcome in zip(pack, self.classify_packed(pack)):
+                    if isinstance(outcome, Exception):
+                        logger.error(f"Error al procesar incidencia {incident.get('ticket_id')}: {outcome}")
+                        results.append(self._error_result(incident.get("ticket_id", ""), outcome))
+                    else:
+                        results.append(outcome)
+            return results
+        
         for incident in incidents:
             try:
                 result = self.classify(
                     ticket_id=incident.get("ticket_id", ""),
                     resumen=incident.get("resumen", ""),
                     notas=incident.get("notas", ""),
-                    fecha_creacion=incident.get("fecha_creacion", datetime.now())
+                    fecha_creacion=incident.get("fecha_creacion", datetime.now()),
+                    similares=incident.get("candidatos_reutilizacion")
                 )
                 results.append(result)
             except Exception as e:
                 logger.error(f"Error al procesar incidencia {incident.get('ticket_id')}: {e}")
-                results.append({
-                    "ticket_id": incident.get("ticket_id", ""),
-                    "causa_raiz_predicha": "Error",
-                    "confianza": 0.0,
-                    "razonamiento": f"Error: {str(e)}",
-                    "keywords_detectadas": [],
-                    "causas_alternativas": [],
-                    "tiempo_procesamiento_ms": 0,
-                    "modelo_version": "error"
-                })
+                results.append(self._error_result(incident.get("ticket_id", ""), e))
         
         return results
+    
+    async def aclassify_batch(
+        self,
+        incidents: list[Dict[str, Any]],
+        max_concurrency: int = 10
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Clasifica un lote de incidencias de forma concurrente en un único event loop
+        
+        Los resultados se entregan a medida que terminan, no en el orden de
+        entrada; cada uno incluye su ticket_id.
+        
+        Args:
+            incidents: Lista de diccionarios con datos de incidencias
+            max_concurrency: Máximo de llamadas simultáneas al modelo
+            
+        Yields:
+            Resultados de clasificación en orden de finalización
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        
+        async def _run(incident: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    return await self.aclassify(
+                        ticket_id=incident.get("ticket_id", ""),
+                        resumen=incident.get("resumen", ""),
+                        notas=incident.get("notas", ""),
+                        fecha_creacion=incident.get("fecha_creacion", datetime.now()),
+                        similares=incident.get("candidatos_reutilizacion")
+                    )
+                except Exception as e:
+                    logger.error(f"Error al procesar incidencia {incident.get('ticket_id')}: {e}")
+                    return self._error_result(incident.get("ticket_id", ""), e)
+        
+        tasks = [asyncio.ensure_future(_run(incident)) for incident in incidents]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,170 @@
+"""
+Script de verificación local de la resiliencia frente a Bedrock y OpenSearch
+Sin credenciales ni clúster: usa endpoints y clientes falsos para comprobar el
+limitador AIMD con reintentos ante throttling, la expulsión y readmisión de
+endpoints del pool y el reintento de los documentos rechazados en la
+indexación bulk
+"""
+import sys
+import time
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from models.fake_bedrock import FakeChatModel, FakeClientError
+from models.endpoint_pool import Endpoint, EndpointPool
+from models.rate_limiter import AdaptiveRateLimiter, RateLimitedChatModel
+from utils.vector_store import VectorStore
+from utils.opensearch_indexer import FakeOpenSearchClient, OpenSearchIndexer
+from utils.logger import setup_logger
+
+# Configurar logger
+logger = setup_logger("check_resilience")
+
+
+def check_rate_limiter(requests: int, capacity: float, workers: int) -> bool:
+    """Throttling de un endpoint con cuota: el limitador reduce la tasa y los reintentos completan todo"""
+    fake = FakeChatModel(capacity_rps=capacity)
+    initial_rate = capacity * 4
+    limiter = AdaptiveRateLimiter(initial_rate=initial_rate, min_rate=0.5, max_rate=initial_rate)
+    model = RateLimitedChatModel(fake, limiter, max_retries=20, backoff_base=0.05, backoff_cap=0.5)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        responses = list(executor.map(lambda _: model.invoke("ping"), range(requests)))
+    elapsed = time.monotonic() - start
+
+    stats = limiter.stats()
+    logger.info(
+        f"  {len(responses)}/{requests} respuestas en {elapsed:.1f}s; endpoint: {fake.stats()}; "
+        f"limitador: tasa {initial_rate:.1f} -> {stats['tasa_actual']:.2f}, "
+        f"{stats['throttles']} throttles, {stats['reintentos']} reintentos"
+    )
+    return (
+        len(responses) == requests
+        and fake.throttled > 0
+        and stats["reintentos"] > 0
+        and stats["tasa_actual"] < initial_rate
+    )
+
+
+def check_endpoint_pool(eject_seconds: float) -> bool:
+    """Un endpoint con errores 5xx se expulsa, el pool conmuta al sano y el endpoint se readmite al recuperarse"""
+    broken = FakeChatModel(model_id="fake-a")
+    healthy = FakeChatModel(model_id="fake-b")
+    broken.fail_with("InternalServerException", 500)
+    pool = EndpointPool(
+        [Endpoint("fake-a", broken), Endpoint("fake-b", healthy)],
+        eject_after=2,
+        eject_seconds=eject_seconds,
+        max_attempts=2,
+        max_retries=3,
+        backoff_base=0.01
+    )
+
+    served = sum(1 for _ in range(10) if pool.invoke("ping") is not None)
+    ejected = pool.stats()["fake-a"]["expulsado"]
+    logger.info(f"  Con fake-a caído: {served}/10 respuestas, fake-a expulsado: {ejected}")
+
+    broken.recover()
+    time.sleep(eject_seconds * 1.5)
+    for _ in range(10):
+        pool.invoke("ping")
+        if broken.succeeded:
+            break
+    readmitted = broken.succeeded > 0 and not pool.stats()["fake-a"]["expulsado"]
+    logger.info(f"  Tras recuperarse: fake-a readmitido: {readmitted}")
+
+    # Un error de cliente falla igual en cualquier endpoint: ni conmuta ni cuenta como fallo
+    for fake in (broken, healthy):
+        fake.fail_with("ValidationException", 400)
+    calls_before = broken.calls + healthy.calls
+    failures_before = {name: endpoint["fallos"] for name, endpoint in pool.stats().items()}
+    try:
+        pool.invoke("ping")
+        propagated = False
+    except FakeClientError:
+        propagated = True
+    failures_after = {name: endpoint["fallos"] for name, endpoint in pool.stats().items()}
+    single_call = broken.calls + healthy.calls - calls_before == 1
+    logger.info(
+        f"  ValidationException propagada: {propagated}, sin conmutar: {single_call}, "
+        f"sin contar como fallo: {failures_before == failures_after}"
+    )
+    return served == 10 and ejected and readmitted and propagated and single_call and failures_before == failures_after
+
+
+def check_bulk_indexing(documents: int, throttle_ratio: float, seed: int) -> bool:
+    """Los documentos rechazados con 429 se reintentan; los 400 se registran sin retener la marca"""
+    rng = np.random.default_rng(seed)
+    ids = [f"INC{number:06d}" for number in range(documents)]
+    vectors = rng.standard_normal((documents, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = VectorStore(directory, 16, "fake")
+        store.add(ids, [f"hash-{incident_id}" for incident_id in ids], vectors)
+        client = FakeOpenSearchClient(throttle_ratio=throttle_ratio, reject_ids={ids[7]}, latency=0.01, seed=seed)
+        indexer = OpenSearchIndexer(client, "incidencias-check", max_bytes=20_000, workers=4, max_retries=10, backoff=0.01)
+        indexer.ensure_index(store.dim)
+        stats = indexer.index_store(store)
+        logger.info(f"  Primera ejecución: {stats}; peticiones simultáneas: {client.max_concurrent}")
+
+        second = OpenSearchIndexer(client, "incidencias-check").index_store(store)
+        logger.info(f"  Segunda ejecución (incremental): {second['enviados']} documentos enviados")
+        rejected = indexer.rejected_documents(store)
+
+    return (
+        stats["indexados"] == documents - 1
+        and stats["rechazados"] == 1
+        and stats["fallidos"] == 0
+        and stats["reintentados"] > 0
+        and len(client.documents) == documents - 1
+        and list(rejected) == [ids[7]]
+        and second["enviados"] == 0
+    )
+
+
+def main():
+    """Ejecuta las verificaciones con endpoints y clientes falsos"""
+    parser = argparse.ArgumentParser(
+        description='Verifica en local el limitador, el pool de endpoints y la indexación bulk con falsos'
+    )
+    parser.add_argument('--requests', type=int, default=60, help='Peticiones contra el endpoint con cuota')
+    parser.add_argument('--capacity', type=float, default=20.0, help='Cuota del endpoint falso (peticiones/s)')
+    parser.add_argument('--workers', type=int, default=8, help='Hilos que envían peticiones a la vez')
+    parser.add_argument('--eject-seconds', type=float, default=0.2, help='Duración de la expulsión en el pool')
+    parser.add_argument('--documents', type=int, default=500, help='Documentos indexados en el OpenSearch falso')
+    parser.add_argument('--throttle-ratio', type=float, default=0.3, help='Fracción de documentos rechazados con 429')
+    parser.add_argument('--seed', type=int, default=0, help='Semilla de los datos y los rechazos')
+    args = parser.parse_args()
+
+    checks = [
+        ("Limitador AIMD y reintentos ante throttling", lambda: check_rate_limiter(args.requests, args.capacity, args.workers)),
+        ("Expulsión y readmisión de endpoints del pool", lambda: check_endpoint_pool(args.eject_seconds)),
+        ("Reintentos de documentos rechazados en bulk", lambda: check_bulk_indexing(args.documents, args.throttle_ratio, args.seed)),
+    ]
+    failed = 0
+    for name, check in checks:
+        logger.info(f"=== {name} ===")
+        try:
+            passed = check()
+        except Exception as e:
+            logger.error(f"✗ {name}: {e}")
+            failed += 1
+            continue
+        if passed:
+            logger.info(f"✓ {name}")
+        else:
+            logger.error(f"✗ {name}")
+            failed += 1
+
+    if failed:
+        logger.error(f"✗ {failed}/{len(checks)} verificaciones fallidas")
+        return 1
+    logger.info("✓ Todas las verificaciones superadas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
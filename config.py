@@ -4,7 +4,7 @@ Carga variables de entorno y proporciona configuración centralizada
 """
 import os
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Sequence
 from dotenv import load_dotenv
 
 # Cargar variables de entorno
@@ -29,14 +29,118 @@ class Config:
         """Construye la URL de conexión a la base de datos"""
         return f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
     
+    # Backend de resultados: "postgres" o embebido ("sqlite" en modo WAL, "duckdb") para ejecuciones locales
+    DB_BACKEND: str = os.getenv("DB_BACKEND", "postgres")
+    DB_LOCAL_PATH: Path = Path(os.getenv("DB_LOCAL_PATH", "./data/local/triage_results.db"))
+    
+    # Guardado masivo de resultados: "values" (INSERT multi-fila) o "copy" (COPY + fusión)
+    DB_BULK_MODE: str = os.getenv("DB_BULK_MODE", "values")
+    DB_FLUSH_SIZE: int = int(os.getenv("DB_FLUSH_SIZE", "200"))
+    DB_FLUSH_INTERVAL_S: float = float(os.getenv("DB_FLUSH_INTERVAL_S", "2"))
+    DB_WRITE_QUEUE_SIZE: int = int(os.getenv("DB_WRITE_QUEUE_SIZE", "2000"))
+    DB_SPILL_PATH: Path = Path(os.getenv("DB_SPILL_PATH", "./data/spill/triage_results_failed.jsonl"))
+    ROLLUP_REFRESH_ENABLED: bool = os.getenv("ROLLUP_REFRESH_ENABLED", "true").lower() == "true"
+    EXPORT_FETCH_SIZE: int = int(os.getenv("EXPORT_FETCH_SIZE", "1000"))
+    # Particionado mensual de triage_results por fecha_creacion (PostgreSQL 15+)
+    DB_PARTITIONED: bool = os.getenv("DB_PARTITIONED", "false").lower() == "true"
+    DB_RETENTION_MONTHS: int = int(os.getenv("DB_RETENTION_MONTHS", "24"))
+    
     # OpenSearch Configuration
     OPENSEARCH_ENDPOINT: str = os.getenv("OPENSEARCH_ENDPOINT", "")
     OPENSEARCH_INDEX: str = os.getenv("OPENSEARCH_INDEX", "incidents-embeddings")
+    # Indexación bulk de embeddings: tamaño de cada petición, peticiones en paralelo y reintentos
+    OPENSEARCH_BULK_MAX_BYTES: int = int(os.getenv("OPENSEARCH_BULK_MAX_BYTES", "5000000"))
+    OPENSEARCH_BULK_MAX_DOCS: int = int(os.getenv("OPENSEARCH_BULK_MAX_DOCS", "500"))
+    OPENSEARCH_BULK_WORKERS: int = int(os.getenv("OPENSEARCH_BULK_WORKERS", "4"))
+    OPENSEARCH_MAX_RETRIES: int = int(os.getenv("OPENSEARCH_MAX_RETRIES", "5"))
+    OPENSEARCH_TIMEOUT: int = int(os.getenv("OPENSEARCH_TIMEOUT", "60"))
     
     # Bedrock Configuration
     BEDROCK_MODEL_ID: str = os.getenv("BEDROCK_MODEL_ID", "anthropic.claude-3-haiku-20240307-v1:0")
     BEDROCK_EMBEDDING_MODEL_ID: str = os.getenv("BEDROCK_EMBEDDING_MODEL_ID", "amazon.titan-embed-text-v2:0")
     
+    # Embeddings de incidencias (Titan) y almacén local de vectores
+    EMBEDDINGS_ENABLED: bool = os.getenv("EMBEDDINGS_ENABLED", "false").lower() == "true"
+    EMBEDDING_DIMENSIONS: int = int(os.getenv("EMBEDDING_DIMENSIONS", "1024"))
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    EMBEDDING_MAX_WORKERS: int = int(os.getenv("EMBEDDING_MAX_WORKERS", "8"))
+    EMBEDDING_MAX_CHARS: int = int(os.getenv("EMBEDDING_MAX_CHARS", "20000"))
+    VECTOR_STORE_DIR: Path = Path(os.getenv("VECTOR_STORE_DIR", "./data/vectors"))
+    # Búsqueda local de similares (top MAX_SIMILAR_INCIDENTS sobre el almacén de vectores)
+    SIMILARITY_BLOCK_SIZE: int = int(os.getenv("SIMILARITY_BLOCK_SIZE", "65536"))
+    SIMILARITY_QUERY_BATCH: int = int(os.getenv("SIMILARITY_QUERY_BATCH", "256"))
+    SIMILARITY_MIN_SCORE: float = float(os.getenv("SIMILARITY_MIN_SCORE", "0.0"))
+    # Índice de similares: "exact" o "ivf" (aproximado, IVF + int8/PQ; recall/velocidad con IVF_NPROBE)
+    SIMILARITY_INDEX: str = os.getenv("SIMILARITY_INDEX", "exact")
+    IVF_INDEX_PATH: Path = Path(os.getenv("IVF_INDEX_PATH", "./data/vectors/ivf_index.npz"))
+    IVF_MIN_VECTORS: int = int(os.getenv("IVF_MIN_VECTORS", "50000"))
+    IVF_NLIST: int = int(os.getenv("IVF_NLIST", "0"))
+    IVF_NPROBE: int = int(os.getenv("IVF_NPROBE", "8"))
+    IVF_QUANTIZATION: str = os.getenv("IVF_QUANTIZATION", "int8")
+    IVF_PQ_M: int = int(os.getenv("IVF_PQ_M", "64"))
+    IVF_RERANK: int = int(os.getenv("IVF_RERANK", "50"))
+    # Reutilización: un vecino ya triado con similitud >= REUSE_THRESHOLD responde sin llamar a Bedrock
+    REUSE_ENABLED: bool = os.getenv("REUSE_ENABLED", "false").lower() == "true"
+    REUSE_THRESHOLD: float = float(os.getenv("REUSE_THRESHOLD", "0.97"))
+    
+    # Cascada de modelos: IDs separados por comas, del más barato al más capaz
+    MODEL_TIERS: str = os.getenv("MODEL_TIERS", "")
+    # Confianza por debajo de la cual se escala al siguiente nivel (una por nivel salvo el último)
+    MODEL_TIER_THRESHOLDS: str = os.getenv("MODEL_TIER_THRESHOLDS", "")
+    
+    @property
+    def model_tiers(self) -> list:
+        """Lista de modelos de la cascada (por defecto solo BEDROCK_MODEL_ID)"""
+        tiers = [model.strip() for model in self.MODEL_TIERS.split(",") if model.strip()]
+        return tiers or [self.BEDROCK_MODEL_ID]
+    
+    @property
+    def model_tier_thresholds(self) -> list:
+        """Umbral de escalado de cada nivel (por defecto CONFIDENCE_THRESHOLD)"""
+        thresholds = [float(value) for value in self.MODEL_TIER_THRESHOLDS.split(",") if value.strip()]
+        missing = max(0, len(self.model_tiers) - 1 - len(thresholds))
+        return thresholds + [self.CONFIDENCE_THRESHOLD] * missing
+    
+    # Limitación de tasa adaptativa contra Bedrock
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_INITIAL_RPS: float = float(os.getenv("RATE_LIMIT_INITIAL_RPS", "2"))
+    RATE_LIMIT_MIN_RPS: float = float(os.getenv("RATE_LIMIT_MIN_RPS", "0.2"))
+    RATE_LIMIT_MAX_RPS: float = float(os.getenv("RATE_LIMIT_MAX_RPS", "20"))
+    RATE_LIMIT_MAX_RETRIES: int = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "8"))
+    
+    # Clientes de Bedrock compartidos (pool de conexiones de botocore)
+    BEDROCK_MAX_POOL_CONNECTIONS: int = int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "50"))
+    BEDROCK_CONNECT_TIMEOUT_S: float = float(os.getenv("BEDROCK_CONNECT_TIMEOUT_S", "5"))
+    BEDROCK_READ_TIMEOUT_S: float = float(os.getenv("BEDROCK_READ_TIMEOUT_S", "120"))
+    BEDROCK_TCP_KEEPALIVE: bool = os.getenv("BEDROCK_TCP_KEEPALIVE", "true").lower() == "true"
+    # Intentos de botocore para servicios distintos de bedrock-runtime (ahí siempre 1)
+    BEDROCK_BOTO_MAX_ATTEMPTS: int = int(os.getenv("BEDROCK_BOTO_MAX_ATTEMPTS", "2"))
+    BEDROCK_WARMUP: bool = os.getenv("BEDROCK_WARMUP", "true").lower() == "true"
+    
+    # Endpoints de Bedrock para balanceo de carga: "region" o "region/model_id" separados por comas
+    BEDROCK_ENDPOINTS: str = os.getenv("BEDROCK_ENDPOINTS", "")
+    ENDPOINT_EJECT_AFTER: int = int(os.getenv("ENDPOINT_EJECT_AFTER", "3"))
+    ENDPOINT_EJECT_SECONDS: float = float(os.getenv("ENDPOINT_EJECT_SECONDS", "30"))
+    ENDPOINT_MAX_ATTEMPTS: int = int(os.getenv("ENDPOINT_MAX_ATTEMPTS", "2"))
+    
+    @property
+    def bedrock_endpoints(self) -> list:
+        """Lista de (región, model_id o None); por defecto solo AWS_REGION"""
+        endpoints = []
+        for entry in self.BEDROCK_ENDPOINTS.split(","):
+            entry = entry.strip()
+            if not entry:
+                continue
+            region, _, model_id = entry.partition("/")
+            endpoints.append((region.strip(), model_id.strip() or None))
+        return endpoints or [(self.AWS_REGION, None)]
+    
+    # Plazo máximo por llamada y peticiones de cobertura (hedging) en llamadas lentas
+    LLM_CALL_TIMEOUT_S: float = float(os.getenv("LLM_CALL_TIMEOUT_S", "60"))
+    HEDGING_ENABLED: bool = os.getenv("HEDGING_ENABLED", "false").lower() == "true"
+    HEDGE_QUANTILE: float = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+    HEDGE_MIN_SAMPLES: int = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+    
     # LangChain Configuration
     LANGCHAIN_TRACING_V2: bool = os.getenv("LANGCHAIN_TRACING_V2", "false").lower() == "true"
     
@@ -49,8 +153,38 @@ class Config:
     CONFIDENCE_THRESHOLD: float = float(os.getenv("CONFIDENCE_THRESHOLD", "0.8"))
     MAX_SIMILAR_INCIDENTS: int = int(os.getenv("MAX_SIMILAR_INCIDENTS", "5"))
     BATCH_SIZE: int = int(os.getenv("BATCH_SIZE", "10"))
+    MAX_CONCURRENCY: int = int(os.getenv("MAX_CONCURRENCY", "1"))
+    INGEST_CHUNK_SIZE: int = int(os.getenv("INGEST_CHUNK_SIZE", "0"))
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     
+    # Caché de respuestas del LLM
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_PATH: Path = Path(os.getenv("RESPONSE_CACHE_PATH", "./data/cache/llm_responses.sqlite3"))
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "100000"))
+    RESPONSE_CACHE_MAX_MB: int = int(os.getenv("RESPONSE_CACHE_MAX_MB", "512"))
+    RESPONSE_CACHE_TTL_HOURS: float = float(os.getenv("RESPONSE_CACHE_TTL_HOURS", "720"))
+    
+    # Agrupación de incidencias casi duplicadas
+    DEDUP_ENABLED: bool = os.getenv("DEDUP_ENABLED", "false").lower() == "true"
+    DEDUP_THRESHOLD: float = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+    DEDUP_NUM_PERM: int = int(os.getenv("DEDUP_NUM_PERM", "64"))
+    
+    # Prompts empaquetados (varias incidencias por petición)
+    PACK_ENABLED: bool = os.getenv("PACK_ENABLED", "false").lower() == "true"
+    PACK_TOKEN_BUDGET: int = int(os.getenv("PACK_TOKEN_BUDGET", "6000"))
+    PACK_MAX_ITEMS: int = int(os.getenv("PACK_MAX_ITEMS", "10"))
+    PACK_MAX_OUTPUT_TOKENS: int = int(os.getenv("PACK_MAX_OUTPUT_TOKENS", "4096"))
+    PACK_OUTPUT_TOKENS_PER_ITEM: int = int(os.getenv("PACK_OUTPUT_TOKENS_PER_ITEM", "350"))
+    
+    # Compactación de la entrada (notas) antes de llamar al modelo
+    COMPACTION_ENABLED: bool = os.getenv("COMPACTION_ENABLED", "false").lower() == "true"
+    COMPACTION_TOKEN_BUDGET: int = int(os.getenv("COMPACTION_TOKEN_BUDGET", "1500"))
+    
+    # Clasificador local (fast-path antes de Bedrock)
+    LOCAL_CLASSIFIER_ENABLED: bool = os.getenv("LOCAL_CLASSIFIER_ENABLED", "false").lower() == "true"
+    LOCAL_CLASSIFIER_PATH: Path = Path(os.getenv("LOCAL_CLASSIFIER_PATH", "./data/models/local_classifier.npz"))
+    LOCAL_CLASSIFIER_MIN_TRAIN_CONFIDENCE: float = float(os.getenv("LOCAL_CLASSIFIER_MIN_TRAIN_CONFIDENCE", "0.8"))
+    
     # S3 Configuration
     S3_BUCKET: str = os.getenv("S3_BUCKET", "")
     
@@ -63,15 +197,25 @@ class Config:
         self.DATA_DIR.mkdir(parents=True, exist_ok=True)
         self.LOG_DIR.mkdir(parents=True, exist_ok=True)
     
-    def validate(self) -> bool:
-        """Valida que todas las configuraciones críticas estén presentes"""
-        required_fields = [
-            ("DB_HOST", self.DB_HOST),
-            ("DB_USER", self.DB_USER),
-            ("DB_PASSWORD", self.DB_PASSWORD),
-            ("OPENSEARCH_ENDPOINT", self.OPENSEARCH_ENDPOINT),
-            ("S3_BUCKET", self.S3_BUCKET),
-        ]
+    def validate(self, services: Sequence[str] = ()) -> bool:
+        """
+        Valida que estén presentes las configuraciones críticas de lo que se va a usar
+        
+        Args:
+            services: Servicios opcionales que usa el llamador ("opensearch", "s3");
+                las credenciales de PostgreSQL se exigen solo con DB_BACKEND=postgres
+        """
+        service_fields = {
+            "opensearch": ("OPENSEARCH_ENDPOINT", self.OPENSEARCH_ENDPOINT),
+            "s3": ("S3_BUCKET", self.S3_BUCKET),
+        }
+        required_fields = [service_fields[service] for service in services]
+        if self.DB_BACKEND == "postgres":
+            required_fields += [
+                ("DB_HOST", self.DB_HOST),
+                ("DB_USER", self.DB_USER),
+                ("DB_PASSWORD", self.DB_PASSWORD),
+            ]
         
         missing_fields = [field for field, value in required_fields if not value]
         
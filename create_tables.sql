@@ -11,6 +11,12 @@ CREATE TABLE IF NOT EXISTS triage_results (
     causas_alternativas JSONB,
     incidencias_similares JSONB,
     modelo_version VARCHAR(50),
+    prompt_version VARCHAR(32),
+    heredada_de VARCHAR(100),
+    reutilizada_de VARCHAR(100),
+    tokens_originales INTEGER,
+    tokens_compactados INTEGER,
+    endpoint VARCHAR(150),
     tiempo_procesamiento_ms INTEGER,
     timestamp_procesamiento TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     batch_id VARCHAR(100),
@@ -21,6 +27,31 @@ CREATE INDEX IF NOT EXISTS idx_incident_id ON triage_results(incident_id);
 CREATE INDEX IF NOT EXISTS idx_batch_id ON triage_results(batch_id);
 CREATE INDEX IF NOT EXISTS idx_causa_raiz ON triage_results(causa_raiz_predicha);
 CREATE INDEX IF NOT EXISTS idx_timestamp ON triage_results(timestamp_procesamiento);
+CREATE INDEX IF NOT EXISTS idx_modelo_prompt ON triage_results(modelo_version, prompt_version);
+
+CREATE INDEX IF NOT EXISTS idx_keywords_gin ON triage_results USING GIN (keywords_detectadas jsonb_path_ops);
+CREATE INDEX IF NOT EXISTS idx_batch_causa ON triage_results(batch_id, causa_raiz_predicha);
+
+CREATE TABLE IF NOT EXISTS triage_rollup_diario (
+    batch_id VARCHAR(100) NOT NULL,
+    dia DATE NOT NULL,
+    causa_raiz_predicha VARCHAR(200) NOT NULL,
+    total INTEGER NOT NULL,
+    heredadas INTEGER NOT NULL,
+    reutilizadas INTEGER NOT NULL DEFAULT 0,
+    suma_confianza DOUBLE PRECISION NOT NULL,
+    histograma_confianza INTEGER[] NOT NULL,
+    suma_tiempo_ms BIGINT NOT NULL,
+    histograma_tiempo INTEGER[] NOT NULL,
+    actualizado TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (batch_id, dia, causa_raiz_predicha)
+);
+CREATE INDEX IF NOT EXISTS idx_rollup_dia ON triage_rollup_diario(dia);
+
+CREATE TABLE IF NOT EXISTS triage_rollup_estado (
+    nombre VARCHAR(50) PRIMARY KEY,
+    watermark TIMESTAMP NOT NULL
+);
 
 CREATE TABLE IF NOT EXISTS triage_metrics (
     id SERIAL PRIMARY KEY,
@@ -29,3 +60,23 @@ CREATE TABLE IF NOT EXISTS triage_metrics (
     metric_metadata JSONB,
     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
+
+-- Diseño particionado opcional (DB_PARTITIONED=true, PostgreSQL 15+), en lugar del
+-- CREATE TABLE triage_results anterior. Las particiones mensuales triage_results_pYYYYMM
+-- las crea DatabaseManager.ensure_partitions; para migrar una tabla existente y para
+-- la retención, ver manage_partitions.py.
+--
+-- CREATE TABLE IF NOT EXISTS triage_results (
+--     id BIGSERIAL,
+--     incident_id VARCHAR(100) NOT NULL,
+--     ... (mismas columnas que arriba) ...
+-- ) PARTITION BY RANGE (fecha_creacion);
+-- CREATE UNIQUE INDEX IF NOT EXISTS idx_incident_fecha
+--     ON triage_results(incident_id, fecha_creacion) NULLS NOT DISTINCT;
+-- CREATE TABLE IF NOT EXISTS triage_results_default PARTITION OF triage_results DEFAULT;
+--
+-- Mapa sin particionar para las búsquedas por incident_id (una sola partición)
+-- CREATE TABLE IF NOT EXISTS triage_incident_fechas (
+--     incident_id VARCHAR(100) PRIMARY KEY,
+--     fecha_creacion TIMESTAMP
+-- );
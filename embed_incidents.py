@@ -0,0 +1,68 @@
+"""
+Script para calcular los embeddings de una exportación de incidencias
+Anexa al almacén local de vectores solo las incidencias nuevas o modificadas
+"""
+import sys
+import argparse
+from config import config
+from models.embeddings import IncidentEmbedder
+from utils.incident_loader import iter_incident_chunks
+from utils.logger import setup_logger
+
+# Configurar logger
+logger = setup_logger("embed_incidents")
+
+
+def _iter_rows(input_path: str, chunk_size: int, limit=None):
+    """Incidencias del fichero como diccionarios con ticket_id, resumen y notas"""
+    for chunk in iter_incident_chunks(input_path, chunk_size=chunk_size, limit=limit):
+        for idx, row in chunk.iterrows():
+            yield {
+                "ticket_id": str(row.get('Ticket ID', f'UNKNOWN_{idx}')),
+                "resumen": row.get('Resumen'),
+                "notas": row.get('Notas'),
+            }
+
+
+def main():
+    """Calcula los embeddings que falten y los guarda en el almacén de vectores"""
+    parser = argparse.ArgumentParser(
+        description='Calcula con Titan los embeddings de las incidencias nuevas o modificadas'
+    )
+    parser.add_argument(
+        '--input',
+        type=str,
+        required=True,
+        help='Archivo CSV o Excel con incidencias'
+    )
+    parser.add_argument(
+        '--limit',
+        type=int,
+        default=None,
+        help='Límite de incidencias a procesar'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=config.EMBEDDING_BATCH_SIZE,
+        help='Incidencias por lote de peticiones a Bedrock'
+    )
+    args = parser.parse_args()
+
+    embedder = IncidentEmbedder.from_config()
+    embedder.batch_size = max(1, args.batch_size)
+    try:
+        stats = embedder.embed_incidents(_iter_rows(args.input, chunk_size=max(1000, args.batch_size), limit=args.limit))
+    except Exception as e:
+        logger.error(f"✗ Error al calcular embeddings: {e}")
+        return 1
+
+    logger.info(
+        f"✓ Embeddings actualizados en {config.VECTOR_STORE_DIR}: {stats['embebidas']} calculados, "
+        f"{stats['reutilizadas']} reutilizados por hash, {stats['sin_cambios']} sin cambios"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
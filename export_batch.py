@@ -0,0 +1,88 @@
+"""
+Script para exportar los resultados de un batch a JSONL o Parquet
+Lee triage_results en streaming (cursor de servidor) y escribe en memoria constante.
+Se escribe en un fichero temporal que solo sustituye a --output si la exportación
+termina bien, de modo que un fallo a mitad no deja un fichero truncado
+"""
+import os
+import sys
+import sqlite3
+import argparse
+from pathlib import Path
+from sqlalchemy.exc import SQLAlchemyError
+from config import config
+from utils.database import create_database_manager, TRIAGE_RESULT_COLUMNS
+from utils.export import write_jsonl, write_parquet
+from utils.logger import setup_logger
+
+# Configurar logger
+logger = setup_logger("export_batch")
+
+
+def main():
+    """Exporta un batch de triage_results"""
+    parser = argparse.ArgumentParser(
+        description='Exporta los resultados de un batch en streaming'
+    )
+    parser.add_argument(
+        '--batch-id',
+        type=str,
+        required=True,
+        help='ID del batch a exportar'
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        required=True,
+        help='Fichero de salida'
+    )
+    parser.add_argument(
+        '--format',
+        choices=['jsonl', 'parquet'],
+        default=None,
+        help='Formato de salida (por defecto según la extensión de --output)'
+    )
+    parser.add_argument(
+        '--columns',
+        type=str,
+        default=None,
+        help='Columnas a exportar separadas por comas (por defecto todas)'
+    )
+    parser.add_argument(
+        '--fetch-size',
+        type=int,
+        default=config.EXPORT_FETCH_SIZE,
+        help='Filas por viaje al servidor'
+    )
+    args = parser.parse_args()
+
+    output_format = args.format or ('parquet' if args.output.endswith('.parquet') else 'jsonl')
+    columns = [column.strip() for column in args.columns.split(',')] if args.columns else TRIAGE_RESULT_COLUMNS
+
+    db = create_database_manager()
+    if not db.test_connection():
+        logger.error("✗ No se pudo conectar a la base de datos")
+        return 1
+
+    output = Path(args.output)
+    temp_path = output.with_name(f".{output.name}.tmp")
+    try:
+        rows = db.iter_batch_results(args.batch_id, columns=columns, yield_per=args.fetch_size)
+        if output_format == 'parquet':
+            count = write_parquet(rows, temp_path, columns=columns, row_group_size=args.fetch_size * 10)
+        else:
+            count = write_jsonl(rows, temp_path)
+        os.replace(temp_path, output)
+    except (ValueError, ImportError, OSError, SQLAlchemyError, sqlite3.Error) as e:
+        logger.error(f"✗ Error al exportar el batch {args.batch_id}: {e}")
+        return 1
+    finally:
+        db.close()
+        temp_path.unlink(missing_ok=True)
+
+    logger.info(f"✓ {count} resultados del batch {args.batch_id} exportados a {args.output} ({output_format})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Script para indexar en OpenSearch los embeddings del almacén local de vectores
+Por defecto solo envía las incidencias embebidas desde la última ejecución
+(upsert por ticket_id); --full reindexa todo el almacén
+"""
+import sys
+import argparse
+from config import config
+from utils.vector_store import VectorStore
+from utils.opensearch_indexer import OpenSearchIndexer, create_opensearch_client
+from utils.logger import setup_logger
+
+# Configurar logger
+logger = setup_logger("index_opensearch")
+
+
+def main():
+    """Indexa con la API bulk las incidencias nuevas o modificadas del almacén de vectores"""
+    parser = argparse.ArgumentParser(
+        description='Indexa en OpenSearch los embeddings de las incidencias'
+    )
+    parser.add_argument(
+        '--endpoint',
+        type=str,
+        default=config.OPENSEARCH_ENDPOINT,
+        help='Endpoint de OpenSearch (p. ej. http://localhost:9200 para un contenedor local)'
+    )
+    parser.add_argument('--index', type=str, default=config.OPENSEARCH_INDEX, help='Índice destino')
+    parser.add_argument(
+        '--full',
+        action='store_true',
+        help='Reindexar todas las incidencias, no solo las cambiadas desde la última ejecución'
+    )
+    parser.add_argument('--max-bytes', type=int, default=config.OPENSEARCH_BULK_MAX_BYTES, help='Bytes máximos por petición bulk')
+    parser.add_argument('--max-docs', type=int, default=config.OPENSEARCH_BULK_MAX_DOCS, help='Documentos máximos por petición bulk')
+    parser.add_argument('--workers', type=int, default=config.OPENSEARCH_BULK_WORKERS, help='Peticiones bulk en paralelo')
+    args = parser.parse_args()
+
+    if not args.endpoint:
+        logger.error("✗ Falta OPENSEARCH_ENDPOINT (o --endpoint)")
+        return 1
+
+    store = VectorStore(config.VECTOR_STORE_DIR, config.EMBEDDING_DIMENSIONS, config.BEDROCK_EMBEDDING_MODEL_ID)
+    indexer = OpenSearchIndexer(
+        create_opensearch_client(args.endpoint, timeout=config.OPENSEARCH_TIMEOUT),
+        args.index,
+        max_bytes=args.max_bytes,
+        max_docs=args.max_docs,
+        workers=args.workers,
+        max_retries=config.OPENSEARCH_MAX_RETRIES
+    )
+    try:
+        indexer.ensure_index(store.dim)
+        stats = indexer.index_store(store, full=args.full)
+    except Exception as e:
+        logger.error(f"✗ Error al indexar en OpenSearch: {e}")
+        return 1
+
+    for doc_id, reason in indexer.failed[:10]:
+        logger.warning(f"Documento {doc_id} no indexado: {reason}")
+    for doc_id, reason in indexer.rejected[:10]:
+        logger.warning(f"Documento {doc_id} rechazado: {reason}")
+    logger.info(
+        f"{stats['indexados']}/{stats['enviados']} documentos indexados en {args.index} "
+        f"({stats['peticiones']} peticiones bulk, {stats['bytes'] / 1e6:.1f} MB, {stats['reintentados']} reintentos)"
+    )
+    if stats['rechazados']:
+        logger.error(
+            f"✗ {stats['rechazados']} documentos rechazados de forma permanente "
+            f"({len(indexer.rejected_documents(store))} pendientes en total); no se reenviarán salvo que cambien o con --full"
+        )
+    if stats['fallidos']:
+        logger.error(f"✗ {stats['fallidos']} documentos no indexados; se reenviarán en la próxima ejecución")
+    if stats['rechazados'] or stats['fallidos']:
+        return 1
+    logger.info("✓ Indexación completada")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
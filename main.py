@@ -4,13 +4,28 @@ Procesa incidencias desde archivos CSV y las clasifica usando LangChain + Bedroc
 """
 import sys
 import argparse
+import threading
+import numpy as np
 import pandas as pd
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 from pathlib import Path
 from config import config
 from utils.logger import setup_logger
-from utils.database import DatabaseManager
+from utils.database import create_database_manager
+from utils.incident_loader import iter_incident_chunks, prefetch
+from utils.response_cache import ResponseCache
+from utils.dedup import NearDuplicateIndex
+from utils.similarity import SimilarityIndex
+from utils.ivf_index import IVFIndex
+from utils.write_behind import WriteBehindWriter, replay_spilled_rows
 from chains.classification import ClassificationChain
+from models.llm_factory import LLMFactory
+from models.local_classifier import LocalClassifier
+from models.embeddings import IncidentEmbedder
+from models.retrieval_reuse import RetrievalReuse
 
 # Configurar logger
 logger = setup_logger("triage_main")
@@ -35,108 +50,625 @@ def load_incidents_from_csv(file_path: str) -> pd.DataFrame:
         raise
 
 
+def _extract_incident(idx: Any, row: pd.Series) -> Dict[str, Any]:
+    """
+    Extrae los campos de una fila del DataFrame de incidencias
+    
+    Args:
+        idx: Índice de la fila
+        row: Fila del DataFrame
+        
+    Returns:
+        Diccionario con ticket_id, resumen, notas y fecha_creacion (None si falta
+        o no se puede interpretar: se guarda como NULL, no como la fecha actual,
+        para que reprocesar el ticket actualice la misma fila)
+    """
+    ticket_id = str(row.get('Ticket ID', f'UNKNOWN_{idx}'))
+    resumen = str(row.get('Resumen', ''))
+    notas = str(row.get('Notas', ''))
+    
+    # Parsear fecha
+    fecha_str = row.get('Fecha Creacion')
+    if isinstance(fecha_str, str):
+        try:
+            fecha_creacion = pd.to_datetime(fecha_str)
+        except (ValueError, OverflowError):
+            fecha_creacion = None
+    else:
+        fecha_creacion = fecha_str
+    if fecha_creacion is not None and pd.isna(fecha_creacion):
+        fecha_creacion = None
+    
+    return {
+        "idx": idx,
+        "ticket_id": ticket_id,
+        "resumen": resumen,
+        "notas": notas,
+        "fecha_creacion": fecha_creacion
+    }
+
+
+def _classify_incident(
+    classifier: ClassificationChain,
+    incident: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Clasifica una incidencia ya extraída"""
+    logger.info(f"Procesando incidencia {incident['ticket_id']}")
+    return classifier.classify(
+        ticket_id=incident['ticket_id'],
+        resumen=incident['resumen'],
+        notas=incident['notas'],
+        fecha_creacion=incident['fecha_creacion'],
+        similares=incident.get('candidatos_reutilizacion')
+    )
+
+
+def _iter_incidents(
+    incidents: Union[pd.DataFrame, Iterable[pd.DataFrame]]
+) -> Iterator[Tuple[Any, Optional[Dict[str, Any]], Optional[Exception]]]:
+    """
+    Recorre las filas de un DataFrame o de una secuencia de bloques
+    
+    Yields:
+        Tuplas (idx, incidencia, error); si la fila no se pudo extraer,
+        la incidencia es None y se devuelve el error
+    """
+    chunks = [incidents] if isinstance(incidents, pd.DataFrame) else incidents
+    for chunk in chunks:
+        for idx, row in chunk.iterrows():
+            try:
+                yield idx, _extract_incident(idx, row), None
+            except Exception as e:
+                yield idx, None, e
+
+
+def _inherit_result(
+    representative_result: Dict[str, Any],
+    incident: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Copia el resultado del representante de un grupo de casi duplicados a otro miembro"""
+    result = dict(representative_result)
+    result["ticket_id"] = incident['ticket_id']
+    result["heredada_de"] = incident['heredada_de']
+    result["tiempo_procesamiento_ms"] = 0
+    result.pop("tokens_originales", None)
+    result.pop("tokens_compactados", None)
+    result.pop("endpoint", None)
+    logger.info(f"Incidencia {incident['ticket_id']} hereda la clasificación de {incident['heredada_de']}")
+    return result
+
+
+def _iter_classified(
+    classifier: ClassificationChain,
+    incidents: Iterable[Tuple[Any, Optional[Dict[str, Any]], Optional[Exception]]],
+    concurrency: int = 1,
+    pack: bool = False
+) -> Iterator[Tuple[Any, Optional[Dict[str, Any]], Optional[Dict[str, Any]], Optional[Exception]]]:
+    """
+    Clasifica incidencias manteniendo como máximo `concurrency` llamadas en vuelo
+    
+    Los resultados se entregan en el mismo orden que la entrada. Los errores se
+    aíslan por incidencia y se devuelven en lugar de propagarse. Las incidencias
+    marcadas con `heredada_de` reutilizan el resultado de su representante; si
+    este falló, se clasifican individualmente.
+    
+    Args:
+        classifier: Chain de clasificación
+        incidents: Iterable de tuplas (idx, incidencia, error) de _iter_incidents
+        concurrency: Número máximo de clasificaciones (o paquetes) simultáneos
+        pack: Si es True, agrupa incidencias consecutivas en una única petición
+        
+    Yields:
+        Tuplas (idx, incidencia, resultado, error)
+    """
+    if concurrency <= 1 and not pack:
+        representative_results: Dict[str, Dict[str, Any]] = {}
+        for idx, incident, error in incidents:
+            if error is not None:
+                yield idx, None, None, error
+                continue
+            try:
+                representative = representative_results.get(incident.get('heredada_de'))
+                if representative is not None:
+                    yield idx, incident, _inherit_result(representative, incident), None
+                    continue
+                incident.pop('heredada_de', None)
+                result = _classify_incident(classifier, incident)
+                representative_results[incident['ticket_id']] = result
+                yield idx, incident, result, None
+            except Exception as e:
+                yield idx, incident, None, e
+        return
+    
+    # Ventana acotada: los workers limitan las llamadas en vuelo y la cola
+    # limita las incidencias pendientes de entregar en orden
+    max_pending = concurrency * 2 * (classifier.max_pack_items if pack else 1)
+    pending: deque = deque()
+    representative_futures: Dict[str, Future] = {}
+    pack_buffer: List[Tuple[Dict[str, Any], Future]] = []
+    
+    def _drain_head():
+        idx, incident, future, error = pending.popleft()
+        if future is None:
+            return idx, incident, None, error
+        try:
+            result = future.result()
+        except Exception as e:
+            if not incident.get('heredada_de'):
+                return idx, incident, None, e
+            # El representante falló: el miembro se clasifica por su cuenta
+            incident.pop('heredada_de', None)
+            try:
+                return idx, incident, _classify_incident(classifier, incident), None
+            except Exception as member_error:
+                return idx, incident, None, member_error
+        if incident.get('heredada_de'):
+            return idx, incident, _inherit_result(result, incident), None
+        return idx, incident, result, None
+    
+    def _submit_pack(executor: ThreadPoolExecutor) -> None:
+        if not pack_buffer:
+            return
+        batch = list(pack_buffer)
+        pack_buffer.clear()
+        
+        def _distribute(pack_future: Future) -> None:
+            try:
+                outcomes = pack_future.result()
+            except Exception as e:
+                outcomes = [e] * len(batch)
+            for (_, item_future), outcome in zip(batch, outcomes):
+                if isinstance(outcome, Exception):
+                    item_future.set_exception(outcome)
+                else:
+                    item_future.set_result(outcome)
+        
+        executor.submit(classifier.classify_packed, [item for item, _ in batch]).add_done_callback(_distribute)
+    
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="triage") as executor:
+        for idx, incident, error in incidents:
+            if error is not None:
+                pending.append((idx, None, None, error))
+            elif incident.get('heredada_de') in representative_futures:
+                pending.append((idx, incident, representative_futures[incident['heredada_de']], None))
+            else:
+                incident.pop('heredada_de', None)
+                if pack:
+                    if not classifier.fits_in_pack([item for item, _ in pack_buffer], incident):
+                        _submit_pack(executor)
+                    future = Future()
+                    pack_buffer.append((incident, future))
+                else:
+                    future = executor.submit(_classify_incident, classifier, incident)
+                representative_futures[incident['ticket_id']] = future
+                pending.append((idx, incident, future, None))
+            
+            if len(pending) >= max_pending:
+                # Un paquete a medio llenar no puede bloquear la entrega en orden
+                _submit_pack(executor)
+                while len(pending) >= max_pending:
+                    yield _drain_head()
+        
+        _submit_pack(executor)
+        while pending:
+            yield _drain_head()
+
+
+def _mark_near_duplicates(
+    incidents: Iterable[Tuple[Any, Optional[Dict[str, Any]], Optional[Exception]]],
+    index: NearDuplicateIndex,
+    stats: Dict[str, Any]
+) -> Iterator[Tuple[Any, Optional[Dict[str, Any]], Optional[Exception]]]:
+    """
+    Marca las incidencias casi duplicadas de otra ya vista con `heredada_de`
+    
+    El índice LSH solo guarda representantes, por lo que el coste por
+    incidencia no depende del número de filas procesadas.
+    """
+    for idx, incident, error in incidents:
+        if incident is not None:
+            text = f"{incident['resumen']}\n{incident['notas']}"
+            representative = index.find_or_add(incident['ticket_id'], text)
+            if representative is not None and representative != incident['ticket_id']:
+                incident['heredada_de'] = representative
+                stats["heredadas"] += 1
+        yield idx, incident, error
+
+
+def _similarity_index(store: Any) -> Union[SimilarityIndex, IVFIndex]:
+    """
+    Índice de similares configurado sobre el almacén de vectores
+    
+    Con SIMILARITY_INDEX=ivf se carga el índice guardado (incorporando lo
+    añadido desde entonces) o se entrena y guarda; por debajo de
+    IVF_MIN_VECTORS la búsqueda exacta es igual de rápida y se usa esa.
+    """
+    if config.SIMILARITY_INDEX != "ivf" or len(store) < config.IVF_MIN_VECTORS:
+        return SimilarityIndex(store, block_size=config.SIMILARITY_BLOCK_SIZE)
+    if config.IVF_INDEX_PATH.exists():
+        try:
+            index = IVFIndex.load(config.IVF_INDEX_PATH, store)
+            index.nprobe = config.IVF_NPROBE
+            index.rerank = config.IVF_RERANK
+            return index
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"No se pudo cargar el índice IVF ({e}); se reentrena")
+    index = IVFIndex(
+        store,
+        nlist=config.IVF_NLIST,
+        nprobe=config.IVF_NPROBE,
+        quantization=config.IVF_QUANTIZATION,
+        pq_m=config.IVF_PQ_M,
+        rerank=config.IVF_RERANK
+    )
+    index.save(config.IVF_INDEX_PATH)
+    return index
+
+
+def _reuse_candidates(
+    index: Union[SimilarityIndex, IVFIndex],
+    queries: np.ndarray,
+    ids: List[str],
+    run_ids: Set[str],
+    threshold: float,
+    k: int,
+    max_k: int = 1024
+) -> List[List[Dict[str, Any]]]:
+    """
+    Vecinos por encima del umbral de reutilización que no son incidencias de esta ejecución
+    
+    Las copias aún sin triar de la misma ejecución (texto repetido) puntúan 1.0
+    y llenarían el top-k; se descartan y, si no queda ningún candidato, la
+    búsqueda se repite con k mayor hasta `max_k`.
+    """
+    results: List[List[Dict[str, Any]]] = [[] for _ in ids]
+    pending = list(range(len(ids)))
+    depth = k
+    while pending:
+        found = index.search(queries[pending], depth, exclude=[ids[position] for position in pending], min_score=threshold)
+        widen = []
+        for position, neighbours in zip(pending, found):
+            kept = [(incident_id, score) for incident_id, score in neighbours if incident_id not in run_ids]
+            if kept or len(neighbours) < depth or depth >= max_k:
+                results[position] = [{"incident_id": incident_id, "similitud": score} for incident_id, score in kept[:k]]
+            else:
+                widen.append(position)
+        pending, depth = widen, depth * 4
+    return results
+
+
+def _attach_similar(
+    incidents: Iterable[Tuple[Any, Optional[Dict[str, Any]], Optional[Exception]]],
+    embedder: IncidentEmbedder,
+    index: Union[SimilarityIndex, IVFIndex],
+    batch_size: int,
+    stats: Dict[str, Any],
+    reuse_threshold: Optional[float] = None
+) -> Iterator[Tuple[Any, Optional[Dict[str, Any]], Optional[Exception]]]:
+    """
+    Añade `incidencias_similares` a cada incidencia, por lotes de `batch_size`
+    
+    Cada lote se embebe (solo lo nuevo o modificado), se incorpora al índice
+    y se consulta con un único recorrido del histórico para todo el lote.
+    Con `reuse_threshold`, antes de incorporar el lote se buscan además los
+    `candidatos_reutilizacion`: vecinos por encima del umbral que no son de
+    esta ejecución (las incidencias ya triadas de ejecuciones anteriores).
+    Un fallo de esta etapa no impide clasificar: el lote queda sin similares.
+    """
+    run_ids: Set[str] = set()
+    
+    def _flush(pending):
+        batch = [incident for _, incident, _ in pending if incident is not None]
+        if batch:
+            try:
+                embedder.embed_incidents(batch)
+                ids = [incident['ticket_id'] for incident in batch]
+                vectors = embedder.store.get(ids)
+                queries = [incident for incident in batch if incident['ticket_id'] in vectors]
+                matrix = np.stack([vectors[incident['ticket_id']] for incident in queries]) if queries else np.empty((0, 0))
+                if reuse_threshold is not None:
+                    run_ids.update(ids)
+                    candidates = _reuse_candidates(
+                        index,
+                        matrix,
+                        [incident['ticket_id'] for incident in queries],
+                        run_ids,
+                        reuse_threshold,
+                        k=config.MAX_SIMILAR_INCIDENTS
+                    )
+                    for incident, found in zip(queries, candidates):
+                        incident['candidatos_reutilizacion'] = found
+                index.update(ids)
+                neighbours = index.search(
+                    matrix,
+                    k=config.MAX_SIMILAR_INCIDENTS,
+                    exclude=[incident['ticket_id'] for incident in queries],
+                    min_score=config.SIMILARITY_MIN_SCORE
+                )
+                for incident, similar in zip(queries, neighbours):
+                    incident['incidencias_similares'] = [
+                        {"incident_id": incident_id, "similitud": round(score, 4)}
+                        for incident_id, score in similar
+                    ]
+                stats["con_similares"] += sum(1 for similar in neighbours if similar)
+            except Exception as e:
+                logger.warning(f"No se pudieron calcular similares de {len(batch)} incidencias: {e}")
+        yield from pending
+    
+    pending = []
+    for item in incidents:
+        pending.append(item)
+        if len(pending) >= batch_size:
+            yield from _flush(pending)
+            pending = []
+    yield from _flush(pending)
+
+
+def _skip_processed(
+    incidents: Iterable[Tuple[Any, Optional[Dict[str, Any]], Optional[Exception]]],
+    processed_ids: Set[str],
+    stats: Dict[str, Any]
+) -> Iterator[Tuple[Any, Optional[Dict[str, Any]], Optional[Exception]]]:
+    """Descarta las incidencias ya triadas antes de llamar al modelo"""
+    for idx, incident, error in incidents:
+        if incident is not None and incident['ticket_id'] in processed_ids:
+            stats["omitidas"] += 1
+            logger.debug(f"Incidencia {incident['ticket_id']} ya triada, se omite")
+            continue
+        yield idx, incident, error
+
+
+def _result_row(incident: Dict[str, Any], result: Dict[str, Any], batch_id: str, prompt_version: str) -> Dict[str, Any]:
+    """Fila de triage_results para el guardado masivo"""
+    return {
+        "incident_id": incident['ticket_id'],
+        "resumen": incident['resumen'],
+        "notas": incident['notas'],
+        "fecha_creacion": incident['fecha_creacion'],
+        "causa_raiz_predicha": result['causa_raiz_predicha'],
+        "confianza": result['confianza'],
+        "razonamiento": result['razonamiento'],
+        "keywords_detectadas": result['keywords_detectadas'],
+        "causas_alternativas": result['causas_alternativas'],
+        "incidencias_similares": incident.get('incidencias_similares', []),
+        "modelo_version": result['modelo_version'],
+        "tiempo_procesamiento_ms": result['tiempo_procesamiento_ms'],
+        "batch_id": batch_id,
+        "prompt_version": result.get('prompt_version', prompt_version),
+        "heredada_de": result.get('heredada_de'),
+        "reutilizada_de": result.get('reutilizada_de'),
+        "tokens_originales": result.get('tokens_originales'),
+        "tokens_compactados": result.get('tokens_compactados'),
+        "endpoint": result.get('endpoint')
+    }
+
+
+def _print_result(result: Dict[str, Any]) -> None:
+    """Muestra por consola el resultado de una clasificación"""
+    print(f"\n{'='*80}")
+    print(f"Ticket: {result['ticket_id']}")
+    print(f"Causa Raíz: {result['causa_raiz_predicha']}")
+    print(f"Confianza: {result['confianza']:.2%}")
+    print(f"Razonamiento: {result['razonamiento'][:200]}...")
+    print(f"Keywords: {', '.join(result['keywords_detectadas'][:5])}")
+    print(f"Tiempo: {result['tiempo_procesamiento_ms']}ms")
+    print(f"{'='*80}\n")
+
+
 def process_incidents(
-    incidents_df: pd.DataFrame,
+    incidents_df: Union[pd.DataFrame, Iterable[pd.DataFrame]],
     batch_id: str,
-    dry_run: bool = False
+    dry_run: bool = False,
+    concurrency: Optional[int] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    resume: bool = False,
+    use_cache: Optional[bool] = None,
+    refresh_cache: bool = False,
+    dedup_threshold: Optional[float] = None,
+    pack: bool = False,
+    local_fast_path: Optional[bool] = None,
+    flush_size: Optional[int] = None,
+    similar: Optional[bool] = None,
+    reuse: Optional[bool] = None
 ) -> list:
     """
     Procesa un lote de incidencias
     
     Args:
-        incidents_df: DataFrame con las incidencias
+        incidents_df: DataFrame con las incidencias o iterable de bloques (streaming)
         batch_id: ID del batch para tracking
         dry_run: Si es True, no guarda en base de datos
+        concurrency: Clasificaciones simultáneas contra Bedrock (por defecto usa config)
+        stats: Diccionario opcional que se rellena con los contadores del batch
+        resume: Si es True, omite las incidencias ya triadas con el mismo modelo y prompt
+        use_cache: Usar la caché de respuestas en disco (por defecto usa config)
+        refresh_cache: Si es True, ignora las respuestas cacheadas y las reescribe
+        dedup_threshold: Similitud a partir de la cual las incidencias casi duplicadas
+            heredan la clasificación de su representante (None = desactivado)
+        pack: Si es True, envía varias incidencias por petición al modelo
+        local_fast_path: Consultar el clasificador local antes de Bedrock (por defecto usa config)
+        flush_size: Resultados por guardado masivo del escritor diferido (por defecto usa config)
+        similar: Embeber las incidencias y rellenar incidencias_similares (por defecto usa config)
+        reuse: Reutilizar la clasificación guardada de un vecino con similitud >= REUSE_THRESHOLD
+            en lugar de llamar a Bedrock (por defecto usa config; implica similar)
         
     Returns:
-        Lista de resultados procesados
+        Lista de resultados procesados, en el orden de entrada
     """
-    logger.info(f"Procesando batch {batch_id} con {len(incidents_df)} incidencias")
+    concurrency = max(1, concurrency or config.MAX_CONCURRENCY)
+    stats = stats if stats is not None else {}
+    stats.update({
+        "total": 0,
+        "procesadas": 0,
+        "omitidas": 0,
+        "heredadas": 0,
+        "servidas_localmente": 0,
+        "tokens_originales": 0,
+        "tokens_compactados": 0,
+        "guardadas": 0,
+        "no_guardadas": 0,
+        "con_similares": 0,
+        "reutilizadas": 0
+    })
+    flush_size = max(1, flush_size or config.DB_FLUSH_SIZE)
+    logger.info(f"Procesando batch {batch_id} (concurrencia: {concurrency})")
     
     # Inicializar chain de clasificación
-    classifier = ClassificationChain()
+    use_cache = config.RESPONSE_CACHE_ENABLED if use_cache is None else use_cache
+    cache = ResponseCache.from_config() if use_cache else None
+    local_fast_path = config.LOCAL_CLASSIFIER_ENABLED if local_fast_path is None else local_fast_path
+    local_classifier = None
+    if local_fast_path:
+        if config.LOCAL_CLASSIFIER_PATH.exists():
+            local_classifier = LocalClassifier.load(config.LOCAL_CLASSIFIER_PATH)
+            logger.info(f"Clasificador local cargado: {local_classifier.version} (umbral {config.CONFIDENCE_THRESHOLD})")
+        else:
+            logger.warning(f"No existe el clasificador local en {config.LOCAL_CLASSIFIER_PATH}; ejecute train_local_classifier.py")
     
     # Inicializar base de datos si no es dry-run
     db = None
     if not dry_run:
-        db = DatabaseManager()
+        db = create_database_manager()
         if not db.test_connection():
             logger.error("No se pudo conectar a la base de datos")
             return []
+        # Resultados que una ejecución anterior no pudo guardar
+        replay_spilled_rows(db, config.DB_SPILL_PATH, mode=config.DB_BULK_MODE, chunk_size=flush_size)
     
-    results = []
+    # Reutilización: las clasificaciones de los vecinos se leen de la BD de resultados
+    reuse = config.REUSE_ENABLED if reuse is None else reuse
+    retrieval_reuse = None
+    if reuse:
+        if db:
+            retrieval_reuse = RetrievalReuse(db.get_triage_result, threshold=config.REUSE_THRESHOLD)
+            logger.info(f"Reutilización de clasificaciones activa (similitud >= {config.REUSE_THRESHOLD})")
+        else:
+            logger.warning("--reuse requiere base de datos; se ignora en modo dry-run")
+    classifier = ClassificationChain(
+        cache=cache,
+        refresh_cache=refresh_cache,
+        local_classifier=local_classifier,
+        retrieval_reuse=retrieval_reuse
+    )
     
-    for idx, row in incidents_df.iterrows():
-        try:
-            # Extraer datos de la incidencia
-            ticket_id = str(row.get('Ticket ID', f'UNKNOWN_{idx}'))
-            resumen = str(row.get('Resumen', ''))
-            notas = str(row.get('Notas', ''))
-            
-            # Parsear fecha
-            fecha_str = row.get('Fecha Creacion', datetime.now())
-            if isinstance(fecha_str, str):
-                try:
-                    fecha_creacion = pd.to_datetime(fecha_str)
-                except:
-                    fecha_creacion = datetime.now()
-            else:
-                fecha_creacion = fecha_str if pd.notna(fecha_str) else datetime.now()
-            
-            logger.info(f"Procesando incidencia {ticket_id}")
-            
-            # Clasificar incidencia
-            result = classifier.classify(
-                ticket_id=ticket_id,
-                resumen=resumen,
-                notas=notas,
-                fecha_creacion=fecha_creacion
+    incidents = _iter_incidents(incidents_df)
+    
+    # Reanudación: una única consulta con los IDs ya triados
+    if resume:
+        if db:
+            processed_ids = db.get_processed_incident_ids(
+                modelo_versions=[llm.model_id for llm in classifier.tiers],
+                # Con --pack, las incidencias reintentadas de una en una se guardan con el prompt individual
+                prompt_versions=(
+                    [classifier.packed_prompt_version, classifier.prompt_version] if pack
+                    else [classifier.prompt_version]
+                )
             )
+            logger.info(f"Reanudando batch: {len(processed_ids)} incidencias ya triadas con este modelo y prompt")
+            incidents = _skip_processed(incidents, processed_ids, stats)
+        else:
+            logger.warning("--resume requiere base de datos; se ignora en modo dry-run")
+    
+    # Agrupación de casi duplicados: un único representante por grupo va al LLM
+    if dedup_threshold:
+        dedup_index = NearDuplicateIndex(threshold=dedup_threshold, num_perm=config.DEDUP_NUM_PERM)
+        logger.info(
+            f"Agrupación de casi duplicados activa (umbral {dedup_threshold}, "
+            f"{dedup_index.bands} bandas x {dedup_index.rows} filas)"
+        )
+        incidents = _mark_near_duplicates(incidents, dedup_index, stats)
+    
+    # Similares: embeddings por lotes y búsqueda local sobre el almacén de vectores
+    similar = (config.EMBEDDINGS_ENABLED if similar is None else similar) or retrieval_reuse is not None
+    embedder = None
+    if similar:
+        embedder = IncidentEmbedder.from_config()
+        similarity_index = _similarity_index(embedder.store)
+        incidents = _attach_similar(
+            incidents,
+            embedder,
+            similarity_index,
+            config.SIMILARITY_QUERY_BATCH,
+            stats,
+            reuse_threshold=config.REUSE_THRESHOLD if retrieval_reuse else None
+        )
+    
+    results = []
+    
+    # Escritura diferida: la BD se escribe en bloque desde un hilo de fondo
+    writer = None
+    if not dry_run and db:
+        writer = WriteBehindWriter(
+            db,
+            spill_path=config.DB_SPILL_PATH,
+            flush_size=flush_size,
+            flush_interval=config.DB_FLUSH_INTERVAL_S,
+            max_queue=config.DB_WRITE_QUEUE_SIZE,
+            mode=config.DB_BULK_MODE
+        )
+    
+    try:
+        for idx, incident, result, error in _iter_classified(classifier, incidents, concurrency, pack):
+            stats["total"] += 1
+            if error is not None:
+                logger.error(f"Error al procesar incidencia {idx}: {error}")
+                continue
             
-            # Guardar en base de datos si no es dry-run
-            if not dry_run and db:
-                success = db.save_triage_result(
-                    incident_id=ticket_id,
-                    resumen=resumen,
-                    notas=notas,
-                    fecha_creacion=fecha_creacion,
-                    causa_raiz_predicha=result['causa_raiz_predicha'],
-                    confianza=result['confianza'],
-                    razonamiento=result['razonamiento'],
-                    keywords_detectadas=result['keywords_detectadas'],
-                    causas_alternativas=result['causas_alternativas'],
-                    incidencias_similares=[],  # TODO: Implementar búsqueda de similares
-                    modelo_version=result['modelo_version'],
-                    tiempo_procesamiento_ms=result['tiempo_procesamiento_ms'],
-                    batch_id=batch_id
-                )
+            try:
+                if writer:
+                    writer.put(_result_row(incident, result, batch_id, classifier.prompt_version))
                 
-                if success:
-                    logger.info(f"Resultado guardado en BD para {ticket_id}")
-                else:
-                    logger.warning(f"No se pudo guardar resultado para {ticket_id}")
-            
-            results.append(result)
-            
-            # Mostrar resultado
-            print(f"\n{'='*80}")
-            print(f"Ticket: {ticket_id}")
-            print(f"Causa Raíz: {result['causa_raiz_predicha']}")
-            print(f"Confianza: {result['confianza']:.2%}")
-            print(f"Razonamiento: {result['razonamiento'][:200]}...")
-            print(f"Keywords: {', '.join(result['keywords_detectadas'][:5])}")
-            print(f"Tiempo: {result['tiempo_procesamiento_ms']}ms")
-            print(f"{'='*80}\n")
-            
-        except Exception as e:
-            logger.error(f"Error al procesar incidencia {idx}: {e}")
-            continue
-    
-    # Cerrar conexión a BD
-    if db:
-        db.close()
+                results.append(result)
+                if result.get('origen') == 'local':
+                    stats["servidas_localmente"] += 1
+                elif result.get('origen') == 'reutilizada':
+                    stats["reutilizadas"] += 1
+                if not result.get('heredada_de'):
+                    stats["tokens_originales"] += result.get('tokens_originales') or 0
+                    stats["tokens_compactados"] += result.get('tokens_compactados') or 0
+                
+                # Mostrar resultado
+                _print_result(result)
+                
+            except Exception as e:
+                logger.error(f"Error al procesar incidencia {idx}: {e}")
+                continue
+    finally:
+        # Vaciar la cola de escritura (también tras Ctrl-C) y cerrar conexión a BD
+        if writer:
+            writer.close()
+            stats["escritura"] = writer.stats()
+            stats["guardadas"] = stats["escritura"]["guardadas"]
+            stats["no_guardadas"] = stats["escritura"]["volcadas"]
+            logger.info(f"Escritura diferida: {stats['escritura']}")
+            if config.ROLLUP_REFRESH_ENABLED and stats["guardadas"]:
+                db.refresh_rollups()
+        if db:
+            db.close()
     
-    logger.info(f"Batch {batch_id} completado: {len(results)}/{len(incidents_df)} incidencias procesadas")
+    stats["procesadas"] = len(results)
+    stats["total"] += stats["omitidas"]
+    stats["niveles"] = {model_id: dict(tier) for model_id, tier in classifier.tier_stats.items()}
+    stats["limitadores"] = LLMFactory.rate_limiter_stats()
+    stats["coberturas"] = LLMFactory.hedging_stats()
+    stats["endpoints"] = LLMFactory.endpoint_stats()
+    if embedder:
+        stats["embeddings"] = embedder.stats()
+        logger.info(f"Embeddings: {stats['embeddings']}")
+    if retrieval_reuse:
+        stats["reutilizacion"] = dict(classifier.reuse_stats)
+        logger.info(f"Reutilización de clasificaciones: {stats['reutilizacion']}")
+    if pack:
+        stats["paquetes"] = dict(classifier.pack_stats)
+        logger.info(f"Prompts empaquetados: {stats['paquetes']}")
+    if cache:
+        stats["cache"] = cache.stats()
+        logger.info(f"Caché de respuestas: {stats['cache']}")
+        cache.close()
+    logger.info(
+        f"Batch {batch_id} completado: {len(results)}/{stats['total']} incidencias procesadas"
+        f" ({stats['omitidas']} omitidas por estar ya triadas, {stats['heredadas']} heredadas de casi duplicados)"
+    )
     return results
 
 
@@ -168,29 +700,149 @@ def main():
         default=None,
         help='Limitar número de incidencias a procesar'
     )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=config.INGEST_CHUNK_SIZE,
+        help='Leer el archivo en streaming por bloques de N filas (0 = cargar completo)'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Omitir incidencias ya triadas con el mismo modelo y versión de prompt'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='No usar la caché de respuestas del LLM'
+    )
+    parser.add_argument(
+        '--refresh-cache',
+        action='store_true',
+        help='Ignorar las respuestas cacheadas y volver a consultar el modelo'
+    )
+    parser.add_argument(
+        '--dedup',
+        action=argparse.BooleanOptionalAction,
+        default=config.DEDUP_ENABLED,
+        help='Clasificar un único representante por grupo de incidencias casi duplicadas'
+    )
+    parser.add_argument(
+        '--dedup-threshold',
+        type=float,
+        default=config.DEDUP_THRESHOLD,
+        help='Similitud mínima (0-1) para considerar dos incidencias casi duplicadas'
+    )
+    parser.add_argument(
+        '--pack',
+        action=argparse.BooleanOptionalAction,
+        default=config.PACK_ENABLED,
+        help='Enviar varias incidencias por petición al modelo (ajustado al presupuesto de tokens)'
+    )
+    parser.add_argument(
+        '--local-fast-path',
+        action=argparse.BooleanOptionalAction,
+        default=config.LOCAL_CLASSIFIER_ENABLED,
+        help='Clasificar con el modelo local cuando su confianza supere CONFIDENCE_THRESHOLD'
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=config.MAX_CONCURRENCY,
+        help='Número máximo de clasificaciones simultáneas contra Bedrock'
+    )
+    parser.add_argument(
+        '--flush-size',
+        type=int,
+        default=config.DB_FLUSH_SIZE,
+        help='Resultados acumulados antes de cada guardado masivo en la base de datos'
+    )
+    parser.add_argument(
+        '--warmup',
+        action=argparse.BooleanOptionalAction,
+        default=config.BEDROCK_WARMUP,
+        help='Precalentar clientes y conexiones de Bedrock al arrancar'
+    )
+    parser.add_argument(
+        '--similar',
+        action=argparse.BooleanOptionalAction,
+        default=config.EMBEDDINGS_ENABLED,
+        help=f'Calcular embeddings y guardar las {config.MAX_SIMILAR_INCIDENTS} incidencias más similares'
+    )
+    parser.add_argument(
+        '--reuse',
+        action=argparse.BooleanOptionalAction,
+        default=config.REUSE_ENABLED,
+        help='Reutilizar la clasificación de un vecino ya triado casi idéntico en lugar de llamar a Bedrock (implica --similar)'
+    )
+    parser.add_argument(
+        '--reuse-threshold',
+        type=float,
+        default=config.REUSE_THRESHOLD,
+        help='Similitud coseno mínima (0-1) para reutilizar la clasificación de un vecino'
+    )
+    parser.add_argument(
+        '--db-backend',
+        choices=['postgres', 'sqlite', 'duckdb'],
+        default=config.DB_BACKEND,
+        help=f'Backend de resultados; sqlite/duckdb guardan en {config.DB_LOCAL_PATH} sin servidor'
+    )
     
     args = parser.parse_args()
     
     try:
         # Validar configuración
         logger.info("Validando configuración...")
+        config.DB_BACKEND = args.db_backend
+        config.REUSE_THRESHOLD = args.reuse_threshold
+        config.MAX_CONCURRENCY = args.concurrency
         config.validate()
         logger.info("Configuración válida")
         
+        # Calentar clientes de Bedrock mientras se carga el archivo
+        warmup = None
+        if args.warmup:
+            warmup = threading.Thread(
+                target=LLMFactory.warm_up,
+                kwargs={"connections": args.concurrency},
+                name="bedrock-warmup",
+                daemon=True
+            )
+            warmup.start()
+        
         # Cargar incidencias
         logger.info(f"Cargando incidencias desde {args.input}")
-        incidents_df = load_incidents_from_csv(args.input)
+        if args.chunk_size and args.chunk_size > 0:
+            # Streaming: la clasificación empieza con el primer bloque
+            incidents_df = prefetch(iter_incident_chunks(args.input, args.chunk_size, args.limit))
+        else:
+            incidents_df = load_incidents_from_csv(args.input)
+            
+            # Limitar si se especificó
+            if args.limit:
+                incidents_df = incidents_df.head(args.limit)
+                logger.info(f"Limitando a {args.limit} incidencias")
         
-        # Limitar si se especificó
-        if args.limit:
-            incidents_df = incidents_df.head(args.limit)
-            logger.info(f"Limitando a {args.limit} incidencias")
+        if warmup is not None:
+            warmup.join()
         
         # Procesar incidencias
+        stats: Dict[str, Any] = {}
         results = process_incidents(
             incidents_df=incidents_df,
             batch_id=args.batch_id,
-            dry_run=args.dry_run
+            dry_run=args.dry_run,
+            concurrency=args.concurrency,
+            stats=stats,
+            resume=args.resume,
+            use_cache=False if args.no_cache else None,
+            refresh_cache=args.refresh_cache,
+            dedup_threshold=args.dedup_threshold if args.dedup else None,
+            pack=args.pack,
+            local_fast_path=args.local_fast_path,
+            flush_size=args.flush_size,
+            similar=args.similar,
+            reuse=args.reuse
         )
         
         # Resumen final
@@ -198,14 +850,60 @@ def main():
         print(f"RESUMEN DEL PROCESAMIENTO")
         print(f"{'='*80}")
         print(f"Batch ID: {args.batch_id}")
-        print(f"Total incidencias: {len(incidents_df)}")
+        print(f"Total incidencias: {stats['total']}")
         print(f"Procesadas exitosamente: {len(results)}")
+        if args.resume:
+            print(f"Omitidas (ya triadas): {stats['omitidas']}")
+        print(f"Concurrencia: {args.concurrency}")
+        if not args.dry_run:
+            print(f"Guardadas en BD: {stats['guardadas']} ({stats['no_guardadas']} volcadas a {config.DB_SPILL_PATH})")
+            if stats.get('escritura', {}).get('espera_backpressure_s'):
+                print(f"Espera por backpressure de la BD: {stats['escritura']['espera_backpressure_s']}s")
+        if args.dedup:
+            print(f"Heredadas de casi duplicados: {stats['heredadas']}")
+        if args.local_fast_path and stats['procesadas']:
+            print(f"Servidas por el clasificador local: {stats['servidas_localmente']} ({stats['servidas_localmente'] / stats['procesadas']:.1%})")
+        if 'embeddings' in stats:
+            embeddings = stats['embeddings']
+            print(f"Embeddings: {embeddings['embebidas']} calculados, {embeddings['reutilizadas']} reutilizados por hash, {embeddings['sin_cambios']} sin cambios")
+            print(f"Incidencias con similares: {stats['con_similares']}")
+        if 'reutilizacion' in stats and stats['procesadas']:
+            print(
+                f"Reutilizadas de incidencias ya triadas: {stats['reutilizadas']} ({stats['reutilizadas'] / stats['procesadas']:.1%}), "
+                f"latencia ahorrada ~{stats['reutilizacion']['latencia_ahorrada_ms'] / 1000:.1f}s"
+            )
+        if stats['tokens_originales']:
+            ahorro = 1 - stats['tokens_compactados'] / stats['tokens_originales']
+            print(f"Tokens de entrada: {stats['tokens_originales']} -> {stats['tokens_compactados']} tras compactación ({ahorro:.1%} de ahorro)")
+        if len(stats['niveles']) > 1:
+            print("Cascada de modelos:")
+            for model_id, tier in stats['niveles'].items():
+                latencia_media = tier['latencia_total_ms'] / tier['llamadas'] if tier['llamadas'] else 0
+                print(f"  - {model_id}: {tier['llamadas']} llamadas, {tier['finales']} respuestas finales, latencia media {latencia_media:.0f}ms")
+        for model_id, limiter in stats['limitadores'].items():
+            if limiter['throttles']:
+                print(f"Throttling en {model_id}: {limiter['throttles']} rechazos, {limiter['reintentos']} reintentos, tasa final {limiter['tasa_actual']} peticiones/s")
+        if len(stats['endpoints']) > 1:
+            print("Endpoints de Bedrock:")
+            for name, endpoint in stats['endpoints'].items():
+                print(f"  - {name}: {endpoint['peticiones']} peticiones, {endpoint['fallos']} fallos, {endpoint['expulsiones']} expulsiones, latencia media {endpoint['latencia_media_ms']}ms")
+        for model_id, hedging in stats['coberturas'].items():
+            if hedging['coberturas_lanzadas'] or hedging['plazos_superados']:
+                print(f"Plazos en {model_id}: {hedging['plazos_superados']} superados, {hedging['coberturas_lanzadas']} coberturas lanzadas, {hedging['coberturas_ganadoras']} ganadoras")
+        if 'paquetes' in stats:
+            print(f"Peticiones empaquetadas: {stats['paquetes']['peticiones']} ({stats['paquetes']['incidencias']} incidencias, {stats['paquetes']['reintentos_individuales']} reintentos individuales)")
+        if 'cache' in stats:
+            print(f"Caché: {stats['cache']['hits']} aciertos / {stats['cache']['misses']} fallos ({stats['cache']['hit_rate']:.1%})")
         print(f"Modo: {'DRY-RUN (no guardado en BD)' if args.dry_run else 'PRODUCCIÓN (guardado en BD)'}")
         print(f"{'='*80}\n")
         
         logger.info("Procesamiento completado exitosamente")
         return 0
         
+    except KeyboardInterrupt:
+        logger.warning("Procesamiento interrumpido por el usuario; los resultados en cola ya se han guardado o volcado")
+        return 130
+        
     except Exception as e:
         logger.error(f"Error en ejecución principal: {e}", exc_info=True)
         return 1
@@ -0,0 +1,102 @@
+"""
+Script para gestionar el particionado mensual de triage_results
+Migra la tabla sin particionar, crea particiones por adelantado y aplica la
+retención eliminando particiones completas en lugar de borrar filas
+"""
+import sys
+import argparse
+from datetime import date
+from config import config
+from utils.database import DatabaseManager
+from utils.logger import setup_logger
+
+# Configurar logger
+logger = setup_logger("manage_partitions")
+
+
+def _parse_month(value: str) -> date:
+    """Convierte YYYY-MM en el primer día del mes"""
+    try:
+        year, month = value.split('-')
+        return date(int(year), int(month), 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Mes no válido (formato YYYY-MM): {value}")
+
+
+def _months_between(first: date, last: date):
+    month = first
+    while month <= last:
+        yield month
+        month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def main():
+    """Gestiona las particiones de triage_results"""
+    parser = argparse.ArgumentParser(
+        description='Gestiona el particionado mensual de triage_results'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    migrate = subparsers.add_parser('migrate', help='Migra la tabla actual al diseño particionado')
+    migrate.add_argument(
+        '--drop-legacy',
+        action='store_true',
+        help='Eliminar triage_results_legacy tras copiar las filas'
+    )
+
+    ensure = subparsers.add_parser('ensure', help='Crea por adelantado las particiones de un rango de meses')
+    ensure.add_argument('--from', dest='desde', type=_parse_month, required=True, help='Primer mes (YYYY-MM)')
+    ensure.add_argument('--to', dest='hasta', type=_parse_month, required=True, help='Último mes (YYYY-MM)')
+
+    subparsers.add_parser('list', help='Lista las particiones existentes')
+
+    retention = subparsers.add_parser('retention', help='Elimina las particiones más antiguas')
+    retention.add_argument(
+        '--keep-months',
+        type=int,
+        default=config.DB_RETENTION_MONTHS,
+        help='Meses completos anteriores al actual que se conservan'
+    )
+    retention.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Mostrar las particiones que se eliminarían sin eliminarlas'
+    )
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    if not db.test_connection():
+        logger.error("✗ No se pudo conectar a la base de datos")
+        return 1
+
+    try:
+        if args.command == 'migrate':
+            copied = db.migrate_to_partitioned(drop_legacy=args.drop_legacy)
+            logger.info(f"✓ Migración completada ({copied} filas copiadas)")
+        elif args.command == 'ensure':
+            if not db.partitioned:
+                logger.error("✗ triage_results no está particionada; ejecute antes 'migrate'")
+                return 1
+            created = db.ensure_partitions(list(_months_between(args.desde, args.hasta)))
+            logger.info(f"✓ {len(created)} particiones creadas")
+        elif args.command == 'list':
+            for partition in db.list_partitions():
+                logger.info(f"  {partition['nombre']}: ~{partition['filas_estimadas']} filas")
+        else:
+            today = date.today()
+            index = today.year * 12 + today.month - 1 - args.keep_months
+            cutoff = date(index // 12, index % 12 + 1, 1)
+            dropped = db.drop_partitions_before(cutoff, dry_run=args.dry_run)
+            verb = "se eliminarían" if args.dry_run else "eliminadas"
+            logger.info(f"✓ {len(dropped)} particiones anteriores a {cutoff} {verb}: {', '.join(dropped) or '-'}")
+    except ValueError as e:
+        logger.error(f"✗ {e}")
+        return 1
+    finally:
+        db.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
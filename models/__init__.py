@@ -2,5 +2,27 @@
 Módulo de modelos LLM para la aplicación de Triage
 """
 from .llm_factory import LLMFactory
+from .local_classifier import LocalClassifier
+from .hedging import DeadlineExceeded, HedgedChatModel
+from .endpoint_pool import Endpoint, EndpointPool
+from .embeddings import IncidentEmbedder
+from .retrieval_reuse import RetrievalReuse
+from .fake_bedrock import FakeChatModel, FakeClientError
+from .rate_limiter import AdaptiveRateLimiter, RateLimitedChatModel, is_throttling_error, is_transient_error
 
-__all__ = ["LLMFactory"]
+__all__ = [
+    "LLMFactory",
+    "LocalClassifier",
+    "AdaptiveRateLimiter",
+    "RateLimitedChatModel",
+    "is_throttling_error",
+    "is_transient_error",
+    "DeadlineExceeded",
+    "HedgedChatModel",
+    "Endpoint",
+    "EndpointPool",
+    "IncidentEmbedder",
+    "RetrievalReuse",
+    "FakeChatModel",
+    "FakeClientError",
+]
@@ -0,0 +1,161 @@
+"""
+Cálculo de embeddings de incidencias con Titan
+Las llamadas se agrupan en lotes que se envían en paralelo (Titan embebe un
+texto por petición) a través del limitador de tasa compartido; el contenido ya
+embebido se reconoce por su hash y nunca se vuelve a enviar
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+from config import config
+from utils.response_cache import normalize_text
+from utils.vector_store import VectorStore
+from .llm_factory import LLMFactory
+
+logger = logging.getLogger(__name__)
+
+
+def embedding_text(resumen: Optional[str], notas: Optional[str], max_chars: int) -> str:
+    """Texto que se embebe de una incidencia: resumen y notas normalizados y recortados"""
+    return normalize_text(f"{normalize_text(resumen)}\n{normalize_text(notas)}")[:max_chars]
+
+
+def content_hash(text: str, model_id: str, dimensions: int) -> str:
+    """Clave de la caché de embeddings: el mismo texto con el mismo modelo da el mismo vector"""
+    return hashlib.sha256(f"{model_id}|{dimensions}|{text}".encode("utf-8")).hexdigest()
+
+
+class _EmbeddingCall:
+    """Adapta embed_query a invoke para reutilizar RateLimitedChatModel (limitador y reintentos)"""
+
+    def __init__(self, embeddings: Any, model_id: str):
+        self.embeddings = embeddings
+        self.model_id = model_id
+
+    def invoke(self, text: str, **kwargs) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+class IncidentEmbedder:
+    """Calcula y guarda en un VectorStore los embeddings normalizados de las incidencias"""
+
+    def __init__(
+        self,
+        store: VectorStore,
+        embeddings: Any = None,
+        model_id: Optional[str] = None,
+        batch_size: int = 64,
+        max_workers: int = 8,
+        max_chars: int = 20000
+    ):
+        """
+        Inicializa el calculador
+
+        Args:
+            store: Almacén de vectores (fija la dimensión)
+            embeddings: Modelo con embed_query (por defecto BedrockEmbeddings de Titan)
+            model_id: ID del modelo de embeddings (por defecto usa config)
+            batch_size: Incidencias por lote
+            max_workers: Peticiones simultáneas a Bedrock dentro de un lote
+            max_chars: Caracteres máximos del texto embebido
+        """
+        self.store = store
+        self.model_id = model_id or config.BEDROCK_EMBEDDING_MODEL_ID
+        embeddings = embeddings or LLMFactory.create_embedding_model(self.model_id, dimensions=store.dim)
+        self.llm = LLMFactory.with_rate_limit(
+            _EmbeddingCall(embeddings, self.model_id),
+            limiter_key=f"{config.AWS_REGION}/{self.model_id}"
+        )
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.max_chars = max_chars
+        self.embedded = 0
+        self.reused = 0
+        self.unchanged = 0
+
+    @classmethod
+    def from_config(cls, embeddings: Any = None) -> "IncidentEmbedder":
+        """Crea el calculador y su almacén con los parámetros de configuración"""
+        store = VectorStore(config.VECTOR_STORE_DIR, config.EMBEDDING_DIMENSIONS, config.BEDROCK_EMBEDDING_MODEL_ID)
+        return cls(
+            store,
+            embeddings=embeddings,
+            batch_size=config.EMBEDDING_BATCH_SIZE,
+            max_workers=config.EMBEDDING_MAX_WORKERS,
+            max_chars=config.EMBEDDING_MAX_CHARS
+        )
+
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Embebe textos en paralelo y normaliza los vectores (similitud coseno = producto escalar)
+
+        Returns:
+            Matriz float32 (len(texts) x dim)
+        """
+        if not texts:
+            return np.empty((0, self.store.dim), dtype=np.float32)
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(texts))) as executor:
+            vectors = np.asarray(list(executor.map(self.llm.invoke, texts)), dtype=np.float32)
+        if vectors.shape[1] != self.store.dim:
+            raise ValueError(f"El modelo devolvió vectores de {vectors.shape[1]} dimensiones; el almacén usa {self.store.dim}")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _embed_batch(self, incidents: List[Dict[str, Any]]) -> None:
+        ids = [str(incident["ticket_id"]) for incident in incidents]
+        texts = [embedding_text(incident.get("resumen"), incident.get("notas"), self.max_chars) for incident in incidents]
+        hashes = [content_hash(text, self.model_id, self.store.dim) for text in texts]
+
+        stored = self.store.content_hashes(ids)
+        pending = [position for position, incident_id in enumerate(ids) if stored.get(incident_id) != hashes[position]]
+        self.unchanged += len(ids) - len(pending)
+        if not pending:
+            return
+
+        # Contenido ya embebido (otra incidencia o una versión anterior): se reutiliza la fila
+        known = self.store.rows_for_hashes([hashes[position] for position in pending])
+        entries = [(ids[position], known[hashes[position]], hashes[position]) for position in pending if hashes[position] in known]
+        self.reused += len(entries)
+
+        new_texts: Dict[str, str] = {}
+        for position in pending:
+            if hashes[position] not in known:
+                new_texts.setdefault(hashes[position], texts[position])
+        if new_texts:
+            start = self.store.append(self.embed_texts(list(new_texts.values())))
+            rows = {text_hash: start + offset for offset, text_hash in enumerate(new_texts)}
+            fresh = [(ids[position], rows[hashes[position]], hashes[position]) for position in pending if hashes[position] in rows]
+            entries.extend(fresh)
+            self.embedded += len(new_texts)
+            self.reused += len(fresh) - len(new_texts)
+        self.store.assign(entries)
+
+    def embed_incidents(self, incidents: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Calcula los embeddings que falten, por lotes de `batch_size`
+
+        Args:
+            incidents: Incidencias con ticket_id, resumen y notas
+
+        Returns:
+            Contadores acumulados (ver stats)
+        """
+        batch: List[Dict[str, Any]] = []
+        for incident in incidents:
+            batch.append(incident)
+            if len(batch) >= self.batch_size:
+                self._embed_batch(batch)
+                batch = []
+        if batch:
+            self._embed_batch(batch)
+        return self.stats()
+
+    def stats(self) -> Dict[str, int]:
+        """Textos enviados a Bedrock, incidencias servidas por la caché de hashes y sin cambios"""
+        return {
+            "embebidas": self.embedded,
+            "reutilizadas": self.reused,
+            "sin_cambios": self.unchanged,
+        }
@@ -0,0 +1,251 @@
+"""
+Balanceo de carga entre varios endpoints de Bedrock (regiones o model IDs)
+Cada petición va al endpoint con menos carga relativa a su tasa admitida;
+los endpoints que fallan repetidamente se expulsan temporalmente y se
+readmiten con una petición de prueba. Solo cuentan como fallos del endpoint
+el throttling, los errores 5xx y los timeouts; los errores de cliente se
+propagan sin conmutar de endpoint. Los reintentos ante throttling también
+los gestiona el pool: primero en otro endpoint y, si todos se han probado,
+en una nueva ronda tras un backoff exponencial con jitter
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set
+from .rate_limiter import is_throttling_error, is_transient_error
+
+logger = logging.getLogger(__name__)
+
+
+class Endpoint:
+    """Un destino concreto (región + model ID) con su estado de salud"""
+
+    def __init__(self, name: str, llm: Any, limiter: Any = None):
+        """
+        Args:
+            name: Identificador legible, p. ej. "eu-west-1/anthropic.claude-3-haiku-20240307-v1:0"
+            llm: Modelo de chat del endpoint (invoke/ainvoke)
+            limiter: Limitador de tasa del endpoint; su tasa actual pondera la carga
+        """
+        self.name = name
+        self.llm = llm
+        self.limiter = limiter
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.throttles = 0
+        self.ejections = 0
+        self.consecutive_failures = 0
+        self.ejection_streak = 0
+        self.ejected_until = 0.0
+        self.throttle_score = 0.0
+        self.latency_ewma: Optional[float] = None
+
+
+class EndpointPool:
+    """
+    Cliente de chat que reparte las peticiones entre varios endpoints
+
+    Expone invoke/ainvoke y model_id como un modelo normal, de modo que puede
+    sustituir a ChatBedrock en la cadena. Acepta cualquier objeto con
+    invoke/ainvoke como endpoint, lo que permite probarlo con stubs locales.
+    """
+
+    def __init__(
+        self,
+        endpoints: Sequence[Endpoint],
+        model_id: Optional[str] = None,
+        eject_after: int = 3,
+        eject_seconds: float = 30.0,
+        max_eject_seconds: float = 600.0,
+        max_attempts: int = 2,
+        max_retries: int = 8,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 20.0
+    ):
+        """
+        Args:
+            endpoints: Endpoints disponibles (al menos uno)
+            model_id: Modelo lógico que representa el pool (por defecto el del primer endpoint)
+            eject_after: Fallos consecutivos que provocan la expulsión
+            eject_seconds: Duración de la primera expulsión (se duplica en expulsiones seguidas)
+            max_eject_seconds: Duración máxima de una expulsión
+            max_attempts: Intentos por petición ante errores que no son throttling (cada uno en otro endpoint si lo hay)
+            max_retries: Reintentos máximos por petición ante throttling
+            backoff_base: Espera base del backoff entre rondas (segundos)
+            backoff_cap: Espera máxima entre rondas (segundos)
+        """
+        if not endpoints:
+            raise ValueError("El pool necesita al menos un endpoint")
+        self.endpoints: List[Endpoint] = list(endpoints)
+        self.model_id = model_id or self.endpoints[0].llm.model_id
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "endpoints":
+            raise AttributeError(name)
+        return getattr(self.endpoints[0].llm, name)
+
+    @staticmethod
+    def _score(endpoint: Endpoint) -> float:
+        """Carga relativa: peticiones en curso frente a la tasa admitida, penalizando el throttling reciente"""
+        rate = endpoint.limiter.rate if endpoint.limiter is not None else 1.0
+        return (endpoint.in_flight + 1) / rate * (1.0 + 4.0 * endpoint.throttle_score)
+
+    def _acquire(self, exclude: Set[str]) -> Optional[Endpoint]:
+        """Elige el endpoint sano menos cargado y lo marca como ocupado"""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [
+                endpoint for endpoint in self.endpoints
+                if endpoint.name not in exclude and (
+                    endpoint.ejected_until == 0.0
+                    # Readmisión a prueba: una sola petición hasta que tenga éxito
+                    or (endpoint.ejected_until <= now and endpoint.in_flight == 0)
+                )
+            ]
+            if candidates:
+                chosen = min(candidates, key=self._score)
+            else:
+                # Todos expulsados: se usa el que antes vaya a readmitirse en lugar de fallar
+                remaining = [endpoint for endpoint in self.endpoints if endpoint.name not in exclude]
+                if not remaining:
+                    return None
+                chosen = min(remaining, key=lambda endpoint: endpoint.ejected_until)
+            chosen.in_flight += 1
+            chosen.requests += 1
+            return chosen
+
+    def _release(self, endpoint: Endpoint, start: float, error: Optional[Exception] = None) -> None:
+        """Actualiza la salud del endpoint tras una petición (los errores de cliente no la afectan)"""
+        elapsed = time.monotonic() - start
+        with self._lock:
+            endpoint.in_flight -= 1
+            if error is not None and not is_transient_error(error):
+                return
+            throttled = error is not None and is_throttling_error(error)
+            endpoint.throttle_score = 0.8 * endpoint.throttle_score + (0.2 if throttled else 0.0)
+            if error is None:
+                endpoint.latency_ewma = elapsed if endpoint.latency_ewma is None else 0.8 * endpoint.latency_ewma + 0.2 * elapsed
+                if endpoint.ejected_until:
+                    logger.info(f"Endpoint {endpoint.name} readmitido")
+                endpoint.consecutive_failures = 0
+                endpoint.ejection_streak = 0
+                endpoint.ejected_until = 0.0
+                return
+
+            endpoint.failures += 1
+            endpoint.throttles += int(throttled)
+            endpoint.consecutive_failures += 1
+            on_probation = endpoint.ejected_until > 0.0
+            if not on_probation and endpoint.consecutive_failures < self.eject_after:
+                return
+            endpoint.ejections += 1
+            endpoint.ejection_streak += 1
+            duration = min(self.max_eject_seconds, self.eject_seconds * 2 ** (endpoint.ejection_streak - 1))
+            endpoint.ejected_until = time.monotonic() + duration
+        logger.warning(f"Endpoint {endpoint.name} expulsado durante {duration:.1f}s tras error: {error}")
+
+    @staticmethod
+    def _tag(response: Any, endpoint: Endpoint) -> Any:
+        """Anota en la respuesta el endpoint que la generó"""
+        metadata = getattr(response, "response_metadata", None)
+        if isinstance(metadata, dict):
+            metadata["endpoint"] = endpoint.name
+        return response
+
+    def _retry_delay(self, error: Exception, endpoint: Endpoint, tried: Set[str], attempt: int) -> Optional[float]:
+        """
+        Decide si reintentar una petición fallida
+
+        Returns:
+            Segundos a esperar antes del siguiente intento (0 si hay otro endpoint
+            sin probar) o None si la petición debe fallar
+        """
+        if not is_transient_error(error):
+            return None
+        throttled = is_throttling_error(error)
+        if throttled:
+            if attempt >= self.max_retries:
+                return None
+            if endpoint.limiter is not None:
+                endpoint.limiter.record_retry()
+        elif attempt + 1 >= self.max_attempts:
+            return None
+        if any(candidate.name not in tried for candidate in self.endpoints):
+            logger.warning(f"Fallo en endpoint {endpoint.name}, se reintenta en otro: {error}")
+            return 0.0
+        # Todos los endpoints probados: nueva ronda tras el backoff
+        tried.clear()
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        logger.info(f"Reintento {attempt + 1} en {delay:.2f}s tras fallo en {endpoint.name}: {error}")
+        return delay
+
+    def invoke(self, messages: Any, **kwargs) -> Any:
+        """Invoca el endpoint elegido; si falla, reintenta en otro o tras un backoff"""
+        tried: Set[str] = set()
+        attempt = 0
+        while True:
+            endpoint = self._acquire(tried)
+            tried.add(endpoint.name)
+            start = time.monotonic()
+            try:
+                response = endpoint.llm.invoke(messages, **kwargs)
+            except Exception as e:
+                self._release(endpoint, start, e)
+                delay = self._retry_delay(e, endpoint, tried, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                if delay > 0:
+                    time.sleep(delay)
+                continue
+            self._release(endpoint, start)
+            return self._tag(response, endpoint)
+
+    async def ainvoke(self, messages: Any, **kwargs) -> Any:
+        """Versión asíncrona de invoke"""
+        tried: Set[str] = set()
+        attempt = 0
+        while True:
+            endpoint = self._acquire(tried)
+            tried.add(endpoint.name)
+            start = time.monotonic()
+            try:
+                response = await endpoint.llm.ainvoke(messages, **kwargs)
+            except Exception as e:
+                self._release(endpoint, start, e)
+                delay = self._retry_delay(e, endpoint, tried, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                continue
+            self._release(endpoint, start)
+            return self._tag(response, endpoint)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Estado y contadores de cada endpoint"""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                endpoint.name: {
+                    "peticiones": endpoint.requests,
+                    "fallos": endpoint.failures,
+                    "throttles": endpoint.throttles,
+                    "expulsiones": endpoint.ejections,
+                    "expulsado": endpoint.ejected_until > now,
+                    "latencia_media_ms": round(endpoint.latency_ewma * 1000) if endpoint.latency_ewma is not None else None,
+                }
+                for endpoint in self.endpoints
+            }
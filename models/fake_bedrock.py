@@ -0,0 +1,124 @@
+"""
+Modelo de chat falso que simula un endpoint de Bedrock en local
+Admite una cuota de peticiones por segundo (por encima responde con
+ThrottlingException, como Bedrock) y fallos forzados (5xx, errores de
+cliente), de modo que el limitador adaptativo, los reintentos y el pool de
+endpoints pueden verificarse sin credenciales de AWS (ver check_resilience.py)
+"""
+import asyncio
+import json
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+
+class FakeClientError(Exception):
+    """Error con la forma del ClientError de botocore: response["Error"]["Code"] y código HTTP"""
+
+    def __init__(self, code: str, status: int, message: str = ""):
+        super().__init__(f"An error occurred ({code}) when calling the InvokeModel operation: {message or code}")
+        self.response = {
+            "Error": {"Code": code, "Message": message},
+            "ResponseMetadata": {"HTTPStatusCode": status},
+        }
+
+
+class FakeResponse:
+    """Respuesta mínima compatible con la de ChatBedrock (content y response_metadata)"""
+
+    def __init__(self, content: str, model_id: str):
+        self.content = content
+        self.response_metadata: Dict[str, Any] = {"model_id": model_id}
+
+
+class FakeChatModel:
+    """
+    Endpoint falso con invoke/ainvoke y model_id, intercambiable con ChatBedrock
+
+    La cuota se modela con un token bucket de `capacity_rps` peticiones por
+    segundo: las peticiones que no caben se rechazan con ThrottlingException (429).
+    """
+
+    def __init__(
+        self,
+        model_id: str = "fake.bedrock-model",
+        capacity_rps: Optional[float] = None,
+        latency: float = 0.0,
+        content: Optional[str] = None
+    ):
+        """
+        Args:
+            model_id: ID de modelo que expone el endpoint
+            capacity_rps: Peticiones por segundo admitidas (None = sin límite)
+            latency: Segundos que tarda cada respuesta correcta
+            content: Texto de la respuesta (por defecto una clasificación JSON válida)
+        """
+        self.model_id = model_id
+        self.capacity_rps = capacity_rps
+        self.latency = latency
+        self.content = content or json.dumps({
+            "causa_raiz_predicha": "Error de aplicación",
+            "confianza": 0.9,
+            "razonamiento": "Respuesta simulada",
+            "keywords_detectadas": [],
+            "causas_alternativas": [],
+        })
+        self._lock = threading.Lock()
+        self._tokens = capacity_rps or 0.0
+        self._last_refill = time.monotonic()
+        self._failure: Optional[Tuple[str, int]] = None
+        self.calls = 0
+        self.succeeded = 0
+        self.throttled = 0
+        self.failed = 0
+
+    def fail_with(self, code: str = "InternalServerException", status: int = 500) -> None:
+        """Hace que todas las peticiones siguientes fallen con el error indicado"""
+        with self._lock:
+            self._failure = (code, status)
+
+    def recover(self) -> None:
+        """Deja de forzar fallos"""
+        with self._lock:
+            self._failure = None
+
+    def _admit(self) -> None:
+        """Cuenta la petición y lanza el error que correspondería en Bedrock, si lo hay"""
+        with self._lock:
+            self.calls += 1
+            if self._failure is not None:
+                self.failed += 1
+                raise FakeClientError(*self._failure)
+            if self.capacity_rps is not None:
+                now = time.monotonic()
+                self._tokens = min(self.capacity_rps, self._tokens + (now - self._last_refill) * self.capacity_rps)
+                self._last_refill = now
+                if self._tokens < 1.0:
+                    self.throttled += 1
+                    raise FakeClientError("ThrottlingException", 429, "Too many requests, please wait before trying again.")
+                self._tokens -= 1.0
+            self.succeeded += 1
+
+    def invoke(self, messages: Any, **kwargs) -> FakeResponse:
+        """Responde como el modelo o lanza el error simulado"""
+        self._admit()
+        if self.latency:
+            time.sleep(self.latency)
+        return FakeResponse(self.content, self.model_id)
+
+    async def ainvoke(self, messages: Any, **kwargs) -> FakeResponse:
+        """Versión asíncrona de invoke"""
+        self._admit()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return FakeResponse(self.content, self.model_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Peticiones recibidas, atendidas, rechazadas por throttling y con fallo forzado"""
+        with self._lock:
+            return {
+                "peticiones": self.calls,
+                "atendidas": self.succeeded,
+                "throttles": self.throttled,
+                "fallos": self.failed,
+            }
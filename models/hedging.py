@@ -0,0 +1,207 @@
+"""
+Plazos máximos por llamada y peticiones de cobertura (hedging) contra Bedrock
+Si una llamada supera el percentil observado (p95 por defecto) se lanza una
+segunda petición idéntica y se usa la primera que termine
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(TimeoutError):
+    """La llamada al modelo superó su plazo máximo"""
+
+
+class HedgedChatModel:
+    """
+    Envuelve un modelo de chat con plazo por llamada y hedging opcional
+
+    En modo síncrono las llamadas se ejecutan en un pool propio y el plazo
+    cuenta desde que la llamada principal empieza a ejecutarse, no desde que
+    se encola. Las peticiones aún encoladas se cancelan al terminar; la que ya
+    está en curso no se puede interrumpir y termina en segundo plano, pero su
+    resultado se descarta. En modo asíncrono la perdedora se cancela.
+    """
+
+    def __init__(
+        self,
+        llm: Any,
+        timeout: Optional[float] = 30.0,
+        hedging: bool = False,
+        hedge_quantile: float = 0.95,
+        min_samples: int = 20,
+        window: int = 500,
+        max_workers: int = 2,
+        limiter: Any = None
+    ):
+        """
+        Args:
+            llm: Modelo de chat a envolver (invoke/ainvoke)
+            timeout: Plazo máximo por llamada en segundos (None = sin plazo)
+            hedging: Si es True, lanza una petición de cobertura en llamadas lentas
+            hedge_quantile: Percentil de latencia a partir del cual se cubre la llamada
+            min_samples: Latencias observadas necesarias antes de empezar a cubrir
+            window: Número de latencias recientes usadas para el percentil
+            max_workers: Hilos del pool de llamadas síncronas (concurrencia esperada,
+                el doble si hay hedging)
+            limiter: Limitador de tasa del que consumen las peticiones de cobertura
+        """
+        self.llm = llm
+        self.timeout = timeout or None
+        self.hedging = hedging
+        self.hedge_quantile = hedge_quantile
+        self.min_samples = min_samples
+        self.limiter = limiter
+
+        self._latencies: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bedrock-call")
+        self.calls = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.deadlines_exceeded = 0
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "llm":
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    def _record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Latencia observada en el percentil configurado, o None si no se cubre"""
+        if not self.hedging:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_quantile))]
+
+    def _timed_invoke(
+        self,
+        messages: Any,
+        kwargs: Dict[str, Any],
+        is_hedge: bool = False,
+        started: Optional[threading.Event] = None
+    ) -> Any:
+        if started is not None:
+            started.set()
+        if is_hedge and self.limiter is not None:
+            self.limiter.acquire()
+        start = time.monotonic()
+        response = self.llm.invoke(messages, **kwargs)
+        self._record_latency(time.monotonic() - start)
+        return response
+
+    async def _atimed_invoke(self, messages: Any, kwargs: Dict[str, Any], is_hedge: bool = False) -> Any:
+        if is_hedge and self.limiter is not None:
+            await self.limiter.aacquire()
+        start = time.monotonic()
+        response = await self.llm.ainvoke(messages, **kwargs)
+        self._record_latency(time.monotonic() - start)
+        return response
+
+    def _remaining(self, start: float) -> Optional[float]:
+        if self.timeout is None:
+            return None
+        return max(0.0, self.timeout - (time.monotonic() - start))
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _deadline_error(self) -> DeadlineExceeded:
+        self._count("deadlines_exceeded")
+        return DeadlineExceeded(f"La llamada a {getattr(self.llm, 'model_id', 'modelo')} superó el plazo de {self.timeout}s")
+
+    def invoke(self, messages: Any, **kwargs) -> Any:
+        """Invoca el modelo con plazo máximo y, si procede, petición de cobertura"""
+        self._count("calls")
+        started = threading.Event()
+        primary = self._executor.submit(self._timed_invoke, messages, kwargs, False, started)
+        pending = {primary}
+        hedge = None
+        try:
+            # El tiempo de espera en la cola del pool no cuenta para el plazo
+            started.wait()
+            start = time.monotonic()
+
+            hedge_delay = self._hedge_delay()
+            if hedge_delay is not None and (self.timeout is None or hedge_delay < self.timeout):
+                done, _ = wait(pending, timeout=hedge_delay)
+                if not done:
+                    hedge = self._executor.submit(self._timed_invoke, messages, kwargs, True)
+                    pending.add(hedge)
+                    self._count("hedges_fired")
+                    logger.info(f"Petición de cobertura lanzada tras {hedge_delay:.2f}s")
+
+            last_error: Optional[BaseException] = None
+            while pending:
+                done, pending = wait(pending, timeout=self._remaining(start), return_when=FIRST_COMPLETED)
+                if not done:
+                    raise self._deadline_error()
+                for future in done:
+                    if future.exception() is None:
+                        if future is hedge:
+                            self._count("hedges_won")
+                        return future.result()
+                    last_error = future.exception()
+            raise last_error
+        finally:
+            # Las peticiones que siguen encoladas no llegan a Bedrock
+            for future in pending:
+                future.cancel()
+
+    async def ainvoke(self, messages: Any, **kwargs) -> Any:
+        """Versión asíncrona de invoke; la petición perdedora se cancela"""
+        self._count("calls")
+        start = time.monotonic()
+        primary = asyncio.ensure_future(self._atimed_invoke(messages, kwargs))
+        pending = {primary}
+        hedge = None
+        try:
+            hedge_delay = self._hedge_delay()
+            if hedge_delay is not None and (self.timeout is None or hedge_delay < self.timeout):
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+                if not done:
+                    hedge = asyncio.ensure_future(self._atimed_invoke(messages, kwargs, True))
+                    pending.add(hedge)
+                    self._count("hedges_fired")
+
+            last_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=self._remaining(start), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise self._deadline_error()
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedges_won")
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de plazos y coberturas"""
+        with self._lock:
+            return {
+                "llamadas": self.calls,
+                "coberturas_lanzadas": self.hedges_fired,
+                "coberturas_ganadoras": self.hedges_won,
+                "plazos_superados": self.deadlines_exceeded,
+            }
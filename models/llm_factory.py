@@ -1,11 +1,20 @@
 """
 Factory para crear instancias de modelos LLM de AWS Bedrock
 """
+import json
 import logging
-from typing import Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import boto3
+from botocore.config import Config as BotocoreConfig
 from langchain_aws import ChatBedrock
 from langchain_community.embeddings import BedrockEmbeddings
 from config import config
+from .endpoint_pool import Endpoint, EndpointPool
+from .hedging import HedgedChatModel
+from .rate_limiter import AdaptiveRateLimiter, RateLimitedChatModel
 
 logger = logging.getLogger(__name__)
 
@@ -13,11 +22,64 @@ logger = logging.getLogger(__name__)
 class LLMFactory:
     """Factory para crear y gestionar modelos LLM"""
     
+    # Limitadores compartidos por todo el proceso, uno por modelo (la cuota de Bedrock es por modelo)
+    _rate_limiters: Dict[str, AdaptiveRateLimiter] = {}
+    _rate_limiters_lock = threading.Lock()
+    _hedged_models: List[HedgedChatModel] = []
+    _endpoint_pools: List[EndpointPool] = []
+    
+    # Sesión y clientes de boto3 compartidos (los clientes son seguros entre hilos, la sesión no)
+    _session: Optional[boto3.session.Session] = None
+    _clients: Dict[Tuple[str, str], Any] = {}
+    _chat_models: Dict[Tuple[str, float, int], EndpointPool] = {}
+    _clients_lock = threading.RLock()
+    
     @staticmethod
+    def _client_config(service_name: str = "bedrock-runtime") -> BotocoreConfig:
+        """Pool de conexiones, keep-alive, timeouts y reintentos de botocore"""
+        # El modo "standard" de botocore también reintenta ThrottlingException: en
+        # bedrock-runtime un solo intento, y el limitador adaptativo y el pool de
+        # endpoints deciden los reintentos (throttling, 5xx y timeouts)
+        max_attempts = 1 if service_name == "bedrock-runtime" else config.BEDROCK_BOTO_MAX_ATTEMPTS
+        return BotocoreConfig(
+            max_pool_connections=config.BEDROCK_MAX_POOL_CONNECTIONS,
+            connect_timeout=config.BEDROCK_CONNECT_TIMEOUT_S,
+            read_timeout=config.BEDROCK_READ_TIMEOUT_S,
+            tcp_keepalive=config.BEDROCK_TCP_KEEPALIVE,
+            retries={"mode": "standard", "max_attempts": max_attempts}
+        )
+    
+    @classmethod
+    def get_bedrock_client(cls, region_name: Optional[str] = None, service_name: str = "bedrock-runtime") -> Any:
+        """
+        Obtiene el cliente de boto3 compartido de una región
+        
+        Args:
+            region_name: Región de Bedrock (por defecto usa config)
+            service_name: Servicio de AWS
+            
+        Returns:
+            Cliente de boto3 (se crea la primera vez)
+        """
+        region = region_name or config.AWS_REGION
+        key = (service_name, region)
+        with cls._clients_lock:
+            client = cls._clients.get(key)
+            if client is None:
+                if cls._session is None:
+                    cls._session = boto3.session.Session()
+                client = cls._session.client(service_name, region_name=region, config=cls._client_config(service_name))
+                cls._clients[key] = client
+                logger.info(f"Cliente {service_name} creado para {region} (pool de {config.BEDROCK_MAX_POOL_CONNECTIONS} conexiones)")
+            return client
+    
+    @classmethod
     def create_chat_model(
+        cls,
         model_id: Optional[str] = None,
         temperature: float = 0.0,
-        max_tokens: int = 2000
+        max_tokens: int = 2000,
+        region_name: Optional[str] = None
     ) -> ChatBedrock:
         """
         Crea una instancia de ChatBedrock para Claude 3 Haiku
@@ -26,6 +88,7 @@ class LLMFactory:
             model_id: ID del modelo (por defecto usa config)
             temperature: Temperatura para generación (0.0 = determinista)
             max_tokens: Máximo de tokens a generar
+            region_name: Región de Bedrock (por defecto usa config)
             
         Returns:
             Instancia de ChatBedrock configurada
@@ -34,28 +97,32 @@ class LLMFactory:
         
         try:
             llm = ChatBedrock(
+                client=cls.get_bedrock_client(region_name),
                 model_id=model,
-                region_name=config.AWS_REGION,
+                region_name=region_name or config.AWS_REGION,
                 model_kwargs={
                     "temperature": temperature,
                     "max_tokens": max_tokens,
                 }
             )
-            logger.info(f"Modelo de chat creado: {model}")
+            logger.info(f"Modelo de chat creado: {model} ({region_name or config.AWS_REGION})")
             return llm
         except Exception as e:
             logger.error(f"Error al crear modelo de chat: {e}")
             raise
     
-    @staticmethod
+    @classmethod
     def create_embedding_model(
-        model_id: Optional[str] = None
+        cls,
+        model_id: Optional[str] = None,
+        dimensions: Optional[int] = None
     ) -> BedrockEmbeddings:
         """
         Crea una instancia de BedrockEmbeddings para Titan
         
         Args:
             model_id: ID del modelo de embeddings (por defecto usa config)
+            dimensions: Dimensiones del vector (solo Titan v2: 256, 512 o 1024)
             
         Returns:
             Instancia de BedrockEmbeddings configurada
@@ -64,11 +131,270 @@ class LLMFactory:
         
         try:
             embeddings = BedrockEmbeddings(
+                client=cls.get_bedrock_client(),
                 model_id=model,
-                region_name=config.AWS_REGION
+                region_name=config.AWS_REGION,
+                model_kwargs={"dimensions": dimensions} if dimensions else None
             )
             logger.info(f"Modelo de embeddings creado: {model}")
             return embeddings
         except Exception as e:
             logger.error(f"Error al crear modelo de embeddings: {e}")
             raise
+
+    
+    @classmethod
+    def get_rate_limiter(cls, model_id: str) -> AdaptiveRateLimiter:
+        """
+        Obtiene el limitador de tasa compartido de un modelo
+        
+        Args:
+            model_id: ID del modelo
+            
+        Returns:
+            Limitador AIMD del modelo (se crea la primera vez)
+        """
+        with cls._rate_limiters_lock:
+            limiter = cls._rate_limiters.get(model_id)
+            if limiter is None:
+                limiter = AdaptiveRateLimiter(
+                    initial_rate=config.RATE_LIMIT_INITIAL_RPS,
+                    min_rate=config.RATE_LIMIT_MIN_RPS,
+                    max_rate=config.RATE_LIMIT_MAX_RPS
+                )
+                cls._rate_limiters[model_id] = limiter
+            return limiter
+    
+    @classmethod
+    def with_rate_limit(
+        cls,
+        llm: Any,
+        limiter_key: Optional[str] = None,
+        max_retries: Optional[int] = None
+    ) -> RateLimitedChatModel:
+        """
+        Envuelve un modelo de chat con el limitador compartido de su model_id
+        
+        Args:
+            llm: Modelo de chat (ChatBedrock u otro con invoke/ainvoke y model_id)
+            limiter_key: Clave del limitador (por defecto el model_id; la cuota es por región y modelo)
+            max_retries: Reintentos ante throttling (por defecto RATE_LIMIT_MAX_RETRIES)
+            
+        Returns:
+            Modelo con limitación de tasa y reintentos ante throttling
+        """
+        return RateLimitedChatModel(
+            llm,
+            cls.get_rate_limiter(limiter_key or llm.model_id),
+            max_retries=config.RATE_LIMIT_MAX_RETRIES if max_retries is None else max_retries
+        )
+    
+    @classmethod
+    def rate_limiter_stats(cls) -> Dict[str, Dict[str, Any]]:
+        """Estado actual (tasa y throttles) de todos los limitadores"""
+        with cls._rate_limiters_lock:
+            limiters = dict(cls._rate_limiters)
+        return {model_id: limiter.stats() for model_id, limiter in limiters.items()}
+    
+    @classmethod
+    def with_deadline(cls, llm: Any, limiter_key: Optional[str] = None) -> HedgedChatModel:
+        """
+        Envuelve un modelo de chat con plazo máximo por llamada y hedging opcional
+        
+        Args:
+            llm: Modelo de chat (ChatBedrock u otro con invoke/ainvoke y model_id)
+            limiter_key: Clave del limitador del que consumen las coberturas (por defecto el model_id)
+            
+        Returns:
+            Modelo que aborta las llamadas colgadas y cubre las lentas
+        """
+        limiter = cls.get_rate_limiter(limiter_key or llm.model_id) if config.RATE_LIMIT_ENABLED else None
+        hedged = HedgedChatModel(
+            llm,
+            timeout=config.LLM_CALL_TIMEOUT_S,
+            hedging=config.HEDGING_ENABLED,
+            hedge_quantile=config.HEDGE_QUANTILE,
+            min_samples=config.HEDGE_MIN_SAMPLES,
+            # Un hilo por llamada concurrente y otro para su posible cobertura
+            max_workers=max(1, config.MAX_CONCURRENCY) * (2 if config.HEDGING_ENABLED else 1),
+            limiter=limiter
+        )
+        with cls._rate_limiters_lock:
+            cls._hedged_models.append(hedged)
+        return hedged
+    
+    @classmethod
+    def hedging_stats(cls) -> Dict[str, Dict[str, Any]]:
+        """Contadores de plazos superados y coberturas por modelo"""
+        with cls._rate_limiters_lock:
+            hedged_models = list(cls._hedged_models)
+        totals: Dict[str, Dict[str, Any]] = {}
+        for hedged in hedged_models:
+            model_stats = totals.setdefault(hedged.model_id, {})
+            for key, value in hedged.stats().items():
+                model_stats[key] = model_stats.get(key, 0) + value
+        return totals
+    
+    @classmethod
+    def wrap_chat_model(
+        cls,
+        llm: Any,
+        limiter_key: Optional[str] = None,
+        max_retries: Optional[int] = None
+    ) -> Any:
+        """
+        Aplica el plazo por llamada (con hedging) y el limitador de tasa si están habilitados
+        
+        Args:
+            llm: Modelo de chat a envolver
+            limiter_key: Clave del limitador compartido (por defecto el model_id)
+            max_retries: Reintentos del limitador ante throttling (por defecto RATE_LIMIT_MAX_RETRIES)
+            
+        Returns:
+            Modelo envuelto
+        """
+        if config.LLM_CALL_TIMEOUT_S > 0 or config.HEDGING_ENABLED:
+            llm = cls.with_deadline(llm, limiter_key)
+        return cls.with_rate_limit(llm, limiter_key, max_retries) if config.RATE_LIMIT_ENABLED else llm
+    
+    @classmethod
+    def create_balanced_chat_model(
+        cls,
+        model_id: Optional[str] = None,
+        temperature: float = 0.0,
+        max_tokens: int = 2000
+    ) -> EndpointPool:
+        """
+        Crea un cliente de chat que reparte la carga entre los endpoints de BEDROCK_ENDPOINTS
+        
+        Las entradas con model ID explícito son alternativas del modelo por defecto
+        (p. ej. perfiles de inferencia entre regiones) y solo se usan para él; el resto
+        de modelos se replican en cada región configurada.
+        
+        Args:
+            model_id: ID del modelo (por defecto usa config)
+            temperature: Temperatura para generación (0.0 = determinista)
+            max_tokens: Máximo de tokens a generar
+            
+        Returns:
+            Pool de endpoints con limitador y plazo por endpoint, compartido por todo
+            el proceso para la misma combinación de modelo, temperatura y max_tokens
+        """
+        model = model_id or config.BEDROCK_MODEL_ID
+        key = (model, temperature, max_tokens)
+        with cls._clients_lock:
+            pool = cls._chat_models.get(key)
+            if pool is not None:
+                return pool
+            
+            endpoints = []
+            for region, target_model in cls._endpoint_targets(model):
+                name = f"{region}/{target_model}"
+                llm = cls.create_chat_model(
+                    model_id=target_model,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    region_name=region
+                )
+                limiter = cls.get_rate_limiter(name) if config.RATE_LIMIT_ENABLED else None
+                # Sin reintentos en el endpoint: el throttling reduce su tasa (AIMD) y el
+                # pool decide si reintentar en otro endpoint o esperar con backoff
+                endpoints.append(Endpoint(name, cls.wrap_chat_model(llm, limiter_key=name, max_retries=0), limiter))
+            
+            pool = EndpointPool(
+                endpoints,
+                model_id=model,
+                eject_after=config.ENDPOINT_EJECT_AFTER,
+                eject_seconds=config.ENDPOINT_EJECT_SECONDS,
+                max_attempts=config.ENDPOINT_MAX_ATTEMPTS,
+                max_retries=config.RATE_LIMIT_MAX_RETRIES
+            )
+            cls._chat_models[key] = pool
+        with cls._rate_limiters_lock:
+            cls._endpoint_pools.append(pool)
+        return pool
+    
+    @staticmethod
+    def _endpoint_targets(model: str) -> List[Tuple[str, str]]:
+        """Pares (región, model_id) de BEDROCK_ENDPOINTS que sirven a un modelo"""
+        targets = []
+        for region, endpoint_model in config.bedrock_endpoints:
+            if endpoint_model is not None and model != config.BEDROCK_MODEL_ID:
+                continue
+            target = (region, endpoint_model or model)
+            if target not in targets:
+                targets.append(target)
+        return targets or [(config.AWS_REGION, model)]
+    
+    @classmethod
+    def warm_up(cls, model_ids: Optional[List[str]] = None, connections: int = 1) -> Dict[str, int]:
+        """
+        Prepara clientes, credenciales y conexiones antes de clasificar el primer ticket
+        
+        Crea los modelos compartidos de cada nivel y abre `connections` conexiones
+        TLS por endpoint con una petición mínima (1 token de salida). Los fallos se
+        registran como aviso: el calentamiento nunca impide procesar el batch.
+        
+        Args:
+            model_ids: Modelos a preparar (por defecto la cascada configurada)
+            connections: Conexiones a abrir por endpoint (normalmente la concurrencia)
+            
+        Returns:
+            Milisegundos de calentamiento por endpoint
+        """
+        model_ids = model_ids or config.model_tiers
+        start = time.monotonic()
+        with cls._clients_lock:
+            if cls._session is None:
+                cls._session = boto3.session.Session()
+            credentials = cls._session.get_credentials()
+        if credentials is not None:
+            credentials.get_frozen_credentials()
+        for model in model_ids:
+            cls.create_balanced_chat_model(model_id=model)
+        
+        body = json.dumps({
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": 1,
+            "messages": [{"role": "user", "content": "ping"}],
+        })
+        
+        def _ping(region: str, model: str) -> None:
+            cls.get_bedrock_client(region).invoke_model(modelId=model, body=body)
+        
+        timings = {}
+        targets = [target for model in model_ids for target in cls._endpoint_targets(model)]
+        with ThreadPoolExecutor(max_workers=max(1, min(connections, config.BEDROCK_MAX_POOL_CONNECTIONS))) as executor:
+            for region, model in dict.fromkeys(targets):
+                if "anthropic" not in model:
+                    continue
+                target_start = time.monotonic()
+                futures = [executor.submit(_ping, region, model) for _ in range(max(1, connections))]
+                for future in futures:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.warning(f"Calentamiento de {region}/{model} fallido: {e}")
+                        break
+                timings[f"{region}/{model}"] = int((time.monotonic() - target_start) * 1000)
+        
+        logger.info(f"Clientes de Bedrock calentados en {int((time.monotonic() - start) * 1000)}ms: {timings}")
+        return timings
+    
+    @classmethod
+    def endpoint_stats(cls) -> Dict[str, Dict[str, Any]]:
+        """Peticiones, fallos y expulsiones de cada endpoint"""
+        with cls._rate_limiters_lock:
+            pools = list(cls._endpoint_pools)
+        totals: Dict[str, Dict[str, Any]] = {}
+        for pool in pools:
+            for name, endpoint_stats in pool.stats().items():
+                current = totals.setdefault(name, {})
+                for key, value in endpoint_stats.items():
+                    if key == "expulsado":
+                        current[key] = current.get(key, False) or value
+                    elif key == "latencia_media_ms":
+                        current[key] = current.get(key) or value
+                    else:
+                        current[key] = current.get(key, 0) + value
+        return totals
@@ -0,0 +1,223 @@
+"""
+Clasificador local de causa raíz (n-gramas hasheados + regresión logística)
+Se entrena con el histórico de triage_results y responde en CPU sin llamar a
+Bedrock; solo se usa cuando su confianza supera el umbral configurado
+"""
+import json
+import logging
+import re
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[^\W\d_]{2,}", re.UNICODE)
+
+
+class LocalClassifier:
+    """Clasificador lineal sobre n-gramas de palabras hasheados"""
+
+    MODEL_NAME = "local-hashlr"
+
+    def __init__(
+        self,
+        classes: Sequence[str],
+        n_features: int = 1 << 18,
+        weights: Optional[np.ndarray] = None,
+        bias: Optional[np.ndarray] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Inicializa el clasificador
+
+        Args:
+            classes: Categorías de causa raíz
+            n_features: Dimensión del espacio de características hasheado
+            weights: Pesos (n_features x n_clases); por defecto a cero
+            bias: Sesgos por clase; por defecto a cero
+            metadata: Información del entrenamiento (fecha, muestras, precisión)
+        """
+        self.classes = list(classes)
+        self.n_features = n_features
+        self.weights = weights if weights is not None else np.zeros((n_features, len(self.classes)), dtype=np.float32)
+        self.bias = bias if bias is not None else np.zeros(len(self.classes), dtype=np.float32)
+        self.metadata = metadata or {}
+
+    @property
+    def version(self) -> str:
+        """Identificador del modelo para modelo_version"""
+        trained_at = self.metadata.get("trained_at", "")
+        return f"{self.MODEL_NAME}-{trained_at[:10].replace('-', '')}" if trained_at else self.MODEL_NAME
+
+    @staticmethod
+    def _tokens(text: str) -> List[str]:
+        words = _TOKEN.findall(str(text or "").lower())
+        return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+    def _features(self, text: str) -> Tuple[np.ndarray, np.ndarray, Dict[int, str]]:
+        """
+        Vector disperso de un texto
+
+        Returns:
+            Tupla (índices, valores normalizados, índice -> n-grama de ejemplo)
+        """
+        counts: Dict[int, int] = {}
+        names: Dict[int, str] = {}
+        for token in self._tokens(text):
+            index = zlib.crc32(token.encode("utf-8")) % self.n_features
+            counts[index] = counts.get(index, 0) + 1
+            names.setdefault(index, token)
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32), names
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = np.log1p(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        values /= np.linalg.norm(values)
+        return indices, values, names
+
+    @staticmethod
+    def _softmax(logits: np.ndarray) -> np.ndarray:
+        exp = np.exp(logits - logits.max())
+        return exp / exp.sum()
+
+    def predict_proba(self, text: str) -> np.ndarray:
+        """Probabilidad de cada clase para un texto"""
+        indices, values, _ = self._features(text)
+        return self._softmax(values @ self.weights[indices] + self.bias)
+
+    def predict(self, text: str, top_keywords: int = 5) -> Dict[str, Any]:
+        """
+        Clasifica un texto
+
+        Args:
+            text: Resumen y notas de la incidencia
+            top_keywords: Número de n-gramas más influyentes a devolver
+
+        Returns:
+            Diccionario con causa, confianza, alternativas y keywords
+        """
+        indices, values, names = self._features(text)
+        probabilities = self._softmax(values @ self.weights[indices] + self.bias)
+        ranking = np.argsort(probabilities)[::-1]
+        best = int(ranking[0])
+
+        keywords = []
+        if len(indices):
+            contributions = values * self.weights[indices, best]
+            for position in np.argsort(contributions)[::-1][:top_keywords]:
+                if contributions[position] > 0:
+                    keywords.append(names[int(indices[position])])
+
+        return {
+            "causa_raiz_predicha": self.classes[best],
+            "confianza": float(probabilities[best]),
+            "causas_alternativas": [
+                {"causa": self.classes[int(other)], "probabilidad": round(float(probabilities[other]), 4)}
+                for other in ranking[1:4]
+            ],
+            "keywords_detectadas": keywords,
+        }
+
+    def fit(
+        self,
+        texts: Sequence[str],
+        labels: Sequence[str],
+        epochs: int = 5,
+        learning_rate: float = 0.5,
+        l2: float = 1e-6,
+        holdout: float = 0.1,
+        seed: int = 42
+    ) -> Dict[str, Any]:
+        """
+        Entrena el modelo con descenso de gradiente estocástico (softmax)
+
+        Args:
+            texts: Textos de entrenamiento
+            labels: Causa raíz de cada texto (debe estar en classes)
+            epochs: Pasadas sobre los datos
+            learning_rate: Tasa de aprendizaje inicial
+            l2: Regularización L2 sobre las filas actualizadas
+            holdout: Fracción reservada para medir la precisión
+            seed: Semilla de barajado
+
+        Returns:
+            Metadatos del entrenamiento
+        """
+        class_index = {name: position for position, name in enumerate(self.classes)}
+        samples = [
+            (self._features(text)[:2], class_index[label])
+            for text, label in zip(texts, labels)
+            if label in class_index
+        ]
+        if not samples:
+            raise ValueError("No hay ejemplos de entrenamiento con categorías válidas")
+
+        generator = np.random.RandomState(seed)
+        order = generator.permutation(len(samples))
+        n_holdout = int(len(samples) * holdout) if len(samples) >= 50 else 0
+        holdout_ids, train_ids = order[:n_holdout], order[n_holdout:]
+
+        self.weights[:] = 0.0
+        self.bias[:] = 0.0
+        step = 0
+        for epoch in range(epochs):
+            generator.shuffle(train_ids)
+            for sample_id in train_ids:
+                (indices, values), target = samples[sample_id]
+                if not len(indices):
+                    continue
+                rate = learning_rate / (1.0 + 1e-4 * step)
+                probabilities = self._softmax(values @ self.weights[indices] + self.bias)
+                probabilities[target] -= 1.0
+                self.weights[indices] -= rate * (np.outer(values, probabilities) + l2 * self.weights[indices])
+                self.bias -= rate * probabilities
+                step += 1
+
+        accuracy = None
+        if n_holdout:
+            hits = sum(
+                int(np.argmax(values @ self.weights[indices] + self.bias) == target)
+                for (indices, values), target in (samples[i] for i in holdout_ids)
+            )
+            accuracy = hits / n_holdout
+
+        self.metadata = {
+            "trained_at": datetime.now().isoformat(timespec="seconds"),
+            "n_samples": len(samples),
+            "holdout_accuracy": accuracy,
+            "class_counts": {
+                name: int(sum(1 for _, target in samples if target == position))
+                for name, position in class_index.items()
+            },
+        }
+        logger.info(f"Clasificador local entrenado con {len(samples)} ejemplos (precisión holdout: {accuracy})")
+        return self.metadata
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Guarda el artefacto del modelo (npz comprimido)"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as handle:
+            np.savez_compressed(
+                handle,
+                weights=self.weights,
+                bias=self.bias,
+                classes=np.array(self.classes),
+                n_features=np.array(self.n_features),
+                metadata=np.array(json.dumps(self.metadata))
+            )
+        logger.info(f"Clasificador local guardado en {path}")
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "LocalClassifier":
+        """Carga un artefacto guardado con save"""
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                classes=[str(name) for name in data["classes"]],
+                n_features=int(data["n_features"]),
+                weights=data["weights"].astype(np.float32),
+                bias=data["bias"].astype(np.float32),
+                metadata=json.loads(str(data["metadata"]))
+            )
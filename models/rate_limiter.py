@@ -0,0 +1,263 @@
+"""
+Limitador de tasa adaptativo para las llamadas a Bedrock
+Token bucket compartido con ajuste AIMD (reduce a la mitad ante throttling,
+sube de forma aditiva con cada éxito) y reintentos con backoff exponencial
+con jitter para las llamadas limitadas
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+# Códigos de error de AWS que indican que se ha superado la cuota
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+    "ModelNotReadyException",
+    "ServiceUnavailableException",
+}
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """
+    Indica si una excepción corresponde a throttling de Bedrock
+
+    langchain-aws puede envolver el ClientError de botocore en un ValueError,
+    por lo que además del código de error se revisa el mensaje.
+    """
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        code = response.get("Error", {}).get("Code")
+        if code in THROTTLING_ERROR_CODES:
+            return True
+    message = str(error)
+    return any(code in message for code in THROTTLING_ERROR_CODES) or "Too many requests" in message
+
+
+# Errores del servicio (5xx y timeouts del modelo) que pueden resolverse reintentando en otro endpoint
+SERVER_ERROR_CODES = {
+    "InternalServerException",
+    "ModelTimeoutException",
+}
+
+# Excepciones de red de botocore/urllib3, comparadas por nombre para no depender de sus módulos
+_TRANSIENT_EXCEPTION_NAMES = {
+    "ReadTimeoutError",
+    "ConnectTimeoutError",
+    "EndpointConnectionError",
+    "ConnectionClosedError",
+}
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Indica si una excepción es transitoria: throttling, error 5xx del servicio o timeout
+
+    Los errores de cliente (p. ej. ValidationException o AccessDeniedException)
+    fallarían igual en cualquier endpoint y no son transitorios.
+    """
+    if is_throttling_error(error) or isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if any(cls.__name__ in _TRANSIENT_EXCEPTION_NAMES for cls in type(error).__mro__):
+        return True
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        if isinstance(status, int) and status >= 500:
+            return True
+        if response.get("Error", {}).get("Code") in SERVER_ERROR_CODES:
+            return True
+    message = str(error)
+    return any(code in message for code in SERVER_ERROR_CODES)
+
+
+class AdaptiveRateLimiter:
+    """Token bucket con tasa adaptativa AIMD, seguro para hilos y corutinas"""
+
+    def __init__(
+        self,
+        initial_rate: float = 5.0,
+        min_rate: float = 0.2,
+        max_rate: float = 50.0,
+        burst: float = 2.0,
+        additive_increase: float = 0.5,
+        multiplicative_decrease: float = 0.5,
+        decrease_cooldown: float = 1.0
+    ):
+        """
+        Inicializa el limitador
+
+        Args:
+            initial_rate: Peticiones por segundo iniciales
+            min_rate: Tasa mínima tras reducciones
+            max_rate: Tasa máxima a la que se sondea
+            burst: Capacidad del bucket (peticiones que pueden salir seguidas)
+            additive_increase: Incremento aproximado de la tasa por segundo sin throttling
+            multiplicative_decrease: Factor aplicado a la tasa ante throttling
+            decrease_cooldown: Segundos mínimos entre reducciones (un pico de rechazos cuenta una vez)
+        """
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.additive_increase = additive_increase
+        self.multiplicative_decrease = multiplicative_decrease
+        self.decrease_cooldown = decrease_cooldown
+
+        self._lock = threading.Lock()
+        self._tokens = burst
+        self._last_refill = time.monotonic()
+        self._last_decrease = 0.0
+        self.requests = 0
+        self.throttles = 0
+        self.retries = 0
+        self.wait_seconds = 0.0
+
+    def _reserve(self) -> float:
+        """Reserva un token y devuelve los segundos a esperar antes de usarlo"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            self._tokens -= 1.0
+            self.requests += 1
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+            self.wait_seconds += wait
+            return wait
+
+    def acquire(self) -> None:
+        """Bloquea el hilo hasta que haya capacidad para una petición"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self) -> None:
+        """Espera sin bloquear el event loop hasta que haya capacidad"""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self) -> None:
+        """Incremento aditivo: aprox. `additive_increase` peticiones/s más por cada segundo de éxitos"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.additive_increase / max(self.rate, 1.0))
+
+    def on_throttle(self) -> None:
+        """Reducción multiplicativa de la tasa ante throttling"""
+        with self._lock:
+            self.throttles += 1
+            now = time.monotonic()
+            if now - self._last_decrease < self.decrease_cooldown:
+                return
+            self._last_decrease = now
+            previous = self.rate
+            self.rate = max(self.min_rate, self.rate * self.multiplicative_decrease)
+            self._tokens = min(self._tokens, 0.0)
+        logger.warning(f"Throttling de Bedrock: tasa reducida de {previous:.2f} a {self.rate:.2f} peticiones/s")
+
+    def record_retry(self) -> None:
+        """Cuenta un reintento tras throttling"""
+        with self._lock:
+            self.retries += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Devuelve la tasa actual y los contadores"""
+        with self._lock:
+            return {
+                "tasa_actual": round(self.rate, 3),
+                "peticiones": self.requests,
+                "throttles": self.throttles,
+                "reintentos": self.retries,
+                "espera_total_s": round(self.wait_seconds, 3),
+            }
+
+
+class RateLimitedChatModel:
+    """
+    Envuelve un modelo de chat (invoke/ainvoke) con el limitador y reintentos
+
+    El resto de atributos (model_id, etc.) se delegan en el modelo original,
+    por lo que funciona igual con ChatBedrock que con un modelo falso local
+    que simule throttling.
+    """
+
+    def __init__(
+        self,
+        llm: Any,
+        limiter: AdaptiveRateLimiter,
+        max_retries: int = 8,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 20.0
+    ):
+        """
+        Args:
+            llm: Modelo de chat a envolver
+            limiter: Limitador compartido
+            max_retries: Reintentos máximos ante throttling
+            backoff_base: Espera base del backoff exponencial (segundos)
+            backoff_cap: Espera máxima entre reintentos (segundos)
+        """
+        self.llm = llm
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "llm":
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    def _backoff(self, attempt: int) -> float:
+        """Backoff exponencial con jitter completo"""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        if not is_throttling_error(error):
+            return False
+        self.limiter.on_throttle()
+        if attempt >= self.max_retries:
+            return False
+        self.limiter.record_retry()
+        return True
+
+    def invoke(self, messages: Any, **kwargs) -> Any:
+        """Invoca el modelo respetando el limitador y reintentando el throttling"""
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                response = self.llm.invoke(messages, **kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                delay = self._backoff(attempt)
+                logger.info(f"Reintento {attempt + 1}/{self.max_retries} tras throttling en {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.limiter.on_success()
+            return response
+
+    async def ainvoke(self, messages: Any, **kwargs) -> Any:
+        """Versión asíncrona de invoke"""
+        attempt = 0
+        while True:
+            await self.limiter.aacquire()
+            try:
+                response = await self.llm.ainvoke(messages, **kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                delay = self._backoff(attempt)
+                logger.info(f"Reintento {attempt + 1}/{self.max_retries} tras throttling en {delay:.2f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.limiter.on_success()
+            return response
@@ -0,0 +1,98 @@
+"""
+Reutilización de clasificaciones de incidencias casi idénticas ya triadas
+Antes de llamar al modelo se busca el vecino más similar por embeddings; si su
+similitud coseno supera el umbral y tiene una clasificación guardada, esa
+clasificación se devuelve directamente
+"""
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from .embeddings import IncidentEmbedder, content_hash, embedding_text
+
+logger = logging.getLogger(__name__)
+
+
+class RetrievalReuse:
+    """
+    Busca, entre los vecinos de una incidencia, uno ya clasificado por encima del umbral
+
+    Los candidatos pueden llegar ya calculados (la etapa de similares de main.py
+    los deja en `candidatos_reutilizacion`, sin las incidencias de la propia
+    ejecución) o buscarse aquí con un calculador de embeddings y un índice de
+    similares propios.
+    """
+
+    def __init__(
+        self,
+        lookup: Callable[[str], Optional[Dict[str, Any]]],
+        threshold: float = 0.97,
+        embedder: Optional[IncidentEmbedder] = None,
+        index: Any = None,
+        k: int = 5
+    ):
+        """
+        Inicializa la búsqueda de clasificaciones reutilizables
+
+        Args:
+            lookup: Devuelve el resultado guardado de una incidencia (p. ej. db.get_triage_result)
+            threshold: Similitud coseno mínima para reutilizar una clasificación
+            embedder: Calculador de embeddings para las incidencias sin vecinos calculados
+            index: SimilarityIndex o IVFIndex sobre el almacén del calculador; no debe
+                actualizarse mientras se consulta desde aquí
+            k: Vecinos examinados por incidencia
+        """
+        self.lookup = lookup
+        self.threshold = threshold
+        self.embedder = embedder
+        self.index = index
+        self.k = max(1, k)
+        self._index_lock = threading.Lock()
+
+    def _search(self, ticket_id: str, resumen: str, notas: str) -> List[Dict[str, Any]]:
+        """Vecinos por encima del umbral con el formato de incidencias_similares"""
+        if self.embedder is None or self.index is None:
+            return []
+        store = self.embedder.store
+        text = embedding_text(resumen, notas, self.embedder.max_chars)
+        rows = store.rows_for_hashes([content_hash(text, self.embedder.model_id, store.dim)])
+        if rows:
+            vector = np.asarray(store.matrix()[next(iter(rows.values()))])
+        else:
+            vector = self.embedder.embed_texts([text])[0]
+        with self._index_lock:
+            found = self.index.search(vector[None, :], self.k, exclude=[ticket_id], min_score=self.threshold)[0]
+        return [{"incident_id": incident_id, "similitud": score} for incident_id, score in found]
+
+    def find(
+        self,
+        ticket_id: str,
+        resumen: str,
+        notas: str,
+        similares: Optional[List[Dict[str, Any]]] = None
+    ) -> Optional[Tuple[str, float, Dict[str, Any]]]:
+        """
+        Clasificación guardada del vecino más similar que supere el umbral
+
+        Args:
+            ticket_id: ID de la incidencia
+            resumen: Resumen de la incidencia
+            notas: Notas de la incidencia
+            similares: Candidatos ya calculados ({"incident_id", "similitud"}); None = buscarlos
+
+        Returns:
+            Tupla (incidencia origen, similitud, resultado guardado) o None
+        """
+        if similares is None:
+            similares = self._search(ticket_id, resumen, notas)
+        candidates = sorted(
+            (item for item in similares if item["similitud"] >= self.threshold and item["incident_id"] != ticket_id),
+            key=lambda item: item["similitud"],
+            reverse=True
+        )
+        for item in candidates[:self.k]:
+            stored = self.lookup(item["incident_id"])
+            # Los resultados de error se guardan con confianza 0 y no se reutilizan
+            if stored and stored.get("causa_raiz_predicha") and float(stored.get("confianza") or 0.0) > 0.0:
+                return item["incident_id"], float(item["similitud"]), stored
+        return None
@@ -1,6 +1,18 @@
 """
 Módulo de prompts para la aplicación de Triage
 """
-from .classification import CLASSIFICATION_PROMPT, CLASSIFICATION_SYSTEM_PROMPT
+from .classification import (
+    CLASSIFICATION_PROMPT,
+    CLASSIFICATION_SYSTEM_PROMPT,
+    BATCH_CLASSIFICATION_PROMPT,
+    BATCH_INCIDENT_TEMPLATE,
+    ROOT_CAUSE_CATEGORIES,
+)
 
-__all__ = ["CLASSIFICATION_PROMPT", "CLASSIFICATION_SYSTEM_PROMPT"]
+__all__ = [
+    "CLASSIFICATION_PROMPT",
+    "CLASSIFICATION_SYSTEM_PROMPT",
+    "BATCH_CLASSIFICATION_PROMPT",
+    "BATCH_INCIDENT_TEMPLATE",
+    "ROOT_CAUSE_CATEGORIES",
+]
@@ -2,6 +2,25 @@
 Prompts para clasificación de incidencias
 """
 
+# Categorías de causa raíz que se ofrecen al modelo
+ROOT_CAUSE_CATEGORIES = [
+    "Error de Configuración",
+    "Problema de Red/Conectividad",
+    "Fallo de Hardware",
+    "Error de Software/Bug",
+    "Problema de Rendimiento",
+    "Error de Usuario",
+    "Problema de Seguridad",
+    "Fallo de Integración",
+    "Problema de Datos/Base de Datos",
+    "Timeout/Latencia",
+    "Problema de Memoria/Recursos",
+    "Error de Despliegue",
+    "Otro (especificar)",
+]
+
+_CATEGORIAS_TEXTO = "\n".join(f"- {categoria}" for categoria in ROOT_CAUSE_CATEGORIES)
+
 CLASSIFICATION_SYSTEM_PROMPT = """Eres un experto en análisis de incidencias técnicas de sistemas IT.
 Tu tarea es analizar incidencias y determinar su causa raíz basándote en el resumen y las notas proporcionadas.
 
@@ -23,19 +42,7 @@ Basándote en la información proporcionada, identifica:
 5. **Causas Alternativas**: Otras posibles causas ordenadas por probabilidad (máximo 3)
 
 **Categorías de Causas Raíz Comunes:**
-- Error de Configuración
-- Problema de Red/Conectividad
-- Fallo de Hardware
-- Error de Software/Bug
-- Problema de Rendimiento
-- Error de Usuario
-- Problema de Seguridad
-- Fallo de Integración
-- Problema de Datos/Base de Datos
-- Timeout/Latencia
-- Problema de Memoria/Recursos
-- Error de Despliegue
-- Otro (especificar)
+""" + _CATEGORIAS_TEXTO + """
 
 Responde en formato JSON con la siguiente estructura:
 {{
@@ -50,3 +57,42 @@ Responde en formato JSON con la siguiente estructura:
 }}
 
 Sé específico y técnico en tu análisis."""
+
+
+# Plantilla de cada incidencia dentro de un prompt empaquetado
+BATCH_INCIDENT_TEMPLATE = """### Incidencia {posicion}
+**Ticket ID:** {ticket_id}
+**Resumen:** {resumen}
+**Notas:** {notas}
+**Fecha de Creación:** {fecha_creacion}"""
+
+BATCH_CLASSIFICATION_PROMPT = """Analiza de forma independiente cada una de las siguientes {num_incidencias} incidencias y determina su causa raíz más probable:
+
+{incidencias}
+
+Para cada incidencia identifica:
+
+1. **Causa Raíz Principal**: La causa más probable del problema
+2. **Nivel de Confianza**: Tu nivel de confianza en esta clasificación (0.0 a 1.0)
+3. **Razonamiento**: Explicación técnica concisa de por qué identificaste esta causa
+4. **Keywords Detectadas**: Palabras clave técnicas relevantes encontradas en la descripción
+5. **Causas Alternativas**: Otras posibles causas ordenadas por probabilidad (máximo 3)
+
+**Categorías de Causas Raíz Comunes:**
+""" + _CATEGORIAS_TEXTO + """
+
+Responde ÚNICAMENTE con un array JSON con un objeto por incidencia, identificado por su ticket_id:
+[
+    {{
+        "ticket_id": "ID del ticket",
+        "causa_raiz_predicha": "nombre de la causa",
+        "confianza": 0.85,
+        "razonamiento": "explicación...",
+        "keywords_detectadas": ["keyword1", "keyword2"],
+        "causas_alternativas": [
+            {{"causa": "causa alternativa 1", "probabilidad": 0.10}}
+        ]
+    }}
+]
+
+Incluye todas las incidencias y sé específico y técnico en tu análisis."""
@@ -0,0 +1,82 @@
+"""
+Script para sincronizar con PostgreSQL los resultados guardados en local
+Lee la base de datos embebida (SQLite o DuckDB) y hace upsert masivo en triage_results
+"""
+import sys
+import argparse
+from config import config
+from utils.database import DatabaseManager
+from utils.local_database import LocalDatabaseManager
+from utils.logger import setup_logger
+
+# Configurar logger
+logger = setup_logger("sync_local_results")
+
+
+def main():
+    """Sincroniza la base de datos local con PostgreSQL"""
+    parser = argparse.ArgumentParser(
+        description='Sincroniza en bloque los resultados locales con PostgreSQL'
+    )
+    parser.add_argument(
+        '--source',
+        type=str,
+        default=str(config.DB_LOCAL_PATH),
+        help='Fichero de la base de datos local'
+    )
+    parser.add_argument(
+        '--backend',
+        choices=['sqlite', 'duckdb'],
+        default=config.DB_BACKEND if config.DB_BACKEND != 'postgres' else 'sqlite',
+        help='Backend de la base de datos local'
+    )
+    parser.add_argument(
+        '--batch-id',
+        type=str,
+        default=None,
+        help='Sincronizar solo este batch (por defecto todos)'
+    )
+    parser.add_argument(
+        '--mode',
+        choices=['values', 'copy'],
+        default='copy',
+        help='Modo de guardado masivo en PostgreSQL'
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=1000,
+        help='Filas por transacción en PostgreSQL'
+    )
+    args = parser.parse_args()
+
+    source = LocalDatabaseManager(args.source, backend=args.backend)
+    target = DatabaseManager()
+    if not target.test_connection():
+        logger.error("✗ No se pudo conectar a la base de datos PostgreSQL")
+        source.close()
+        return 1
+
+    failed = []
+    try:
+        target.create_tables()
+        synced = source.sync_to(
+            target,
+            batch_id=args.batch_id,
+            chunk_size=args.chunk_size,
+            mode=args.mode,
+            failed=failed
+        )
+    finally:
+        source.close()
+        target.close()
+
+    if failed:
+        logger.error(f"✗ {len(failed)} resultados no se pudieron sincronizar")
+        return 1
+    logger.info(f"✓ {synced} resultados sincronizados desde {args.source}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
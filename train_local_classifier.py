@@ -0,0 +1,81 @@
+"""
+Script para entrenar o refrescar el clasificador local de causa raíz
+Usa el histórico de triage_results clasificado por el LLM con confianza alta
+"""
+import sys
+import argparse
+from config import config
+from utils.database import create_database_manager
+from utils.logger import setup_logger
+from models.local_classifier import LocalClassifier
+from prompts.classification import ROOT_CAUSE_CATEGORIES
+
+# Configurar logger
+logger = setup_logger("train_local_classifier")
+
+# "Otro" no aporta una causa concreta: esos casos se dejan al LLM
+TRAINING_CATEGORIES = [categoria for categoria in ROOT_CAUSE_CATEGORIES if not categoria.startswith("Otro")]
+
+
+def main():
+    """Entrena el clasificador local y guarda el artefacto"""
+    parser = argparse.ArgumentParser(
+        description='Entrena el clasificador local a partir del histórico de triage'
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        default=str(config.LOCAL_CLASSIFIER_PATH),
+        help='Ruta del artefacto del modelo'
+    )
+    parser.add_argument(
+        '--min-confianza',
+        type=float,
+        default=config.LOCAL_CLASSIFIER_MIN_TRAIN_CONFIDENCE,
+        help='Confianza mínima de las clasificaciones usadas como etiqueta'
+    )
+    parser.add_argument(
+        '--epochs',
+        type=int,
+        default=5,
+        help='Pasadas de entrenamiento sobre los datos'
+    )
+    args = parser.parse_args()
+    
+    db = create_database_manager()
+    if not db.test_connection():
+        logger.error("✗ No se pudo conectar a la base de datos")
+        return 1
+    
+    examples = db.get_training_examples(
+        categories=TRAINING_CATEGORIES,
+        min_confianza=args.min_confianza,
+        exclude_model_prefix=LocalClassifier.MODEL_NAME
+    )
+    db.close()
+    logger.info(f"Ejemplos de entrenamiento obtenidos: {len(examples)}")
+    
+    if not examples:
+        logger.error("✗ No hay histórico suficiente para entrenar")
+        return 1
+    
+    classifier = LocalClassifier(classes=TRAINING_CATEGORIES)
+    try:
+        metadata = classifier.fit(
+            texts=[f"{row['resumen'] or ''}\n{row['notas'] or ''}" for row in examples],
+            labels=[row['causa_raiz_predicha'] for row in examples],
+            epochs=args.epochs
+        )
+    except ValueError as e:
+        logger.error(f"✗ Error al entrenar: {e}")
+        return 1
+    
+    classifier.save(args.output)
+    logger.info(f"✓ Clasificador local guardado en {args.output}")
+    logger.info(f"  - Muestras: {metadata['n_samples']}")
+    logger.info(f"  - Precisión holdout: {metadata['holdout_accuracy']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
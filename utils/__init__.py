@@ -1,7 +1,35 @@
 """
 Módulo de utilidades para la aplicación de Triage
 """
-from .database import DatabaseManager
+from .database import DatabaseManager, create_database_manager
+from .local_database import LocalDatabaseManager
 from .logger import setup_logger
+from .incident_loader import INCIDENT_COLUMNS, iter_incident_chunks, prefetch
+from .response_cache import ResponseCache
+from .dedup import NearDuplicateIndex
+from .write_behind import WriteBehindWriter, load_spilled_rows, replay_spilled_rows
+from .vector_store import VectorStore
+from .similarity import SimilarityIndex
+from .ivf_index import IVFIndex
+from .opensearch_indexer import FakeOpenSearchClient, OpenSearchIndexer, create_opensearch_client
 
-__all__ = ["DatabaseManager", "setup_logger"]
+__all__ = [
+    "DatabaseManager",
+    "create_database_manager",
+    "LocalDatabaseManager",
+    "setup_logger",
+    "INCIDENT_COLUMNS",
+    "iter_incident_chunks",
+    "prefetch",
+    "ResponseCache",
+    "NearDuplicateIndex",
+    "WriteBehindWriter",
+    "load_spilled_rows",
+    "replay_spilled_rows",
+    "VectorStore",
+    "SimilarityIndex",
+    "IVFIndex",
+    "OpenSearchIndexer",
+    "FakeOpenSearchClient",
+    "create_opensearch_client",
+]
@@ -0,0 +1,178 @@
+"""
+Compactación de las notas de una incidencia antes de enviarlas al modelo
+Solo actúa sobre textos que superan el presupuesto de tokens: elimina líneas
+de log repetidas consecutivas y texto repetitivo (firmas, avisos legales) y,
+si aún se supera el presupuesto, recorta por cabeza y cola conservando las
+líneas de error
+"""
+import re
+from typing import List, NamedTuple
+from utils.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+# Líneas que suelen abrir una firma de correo: se descartan junto al bloque que sigue
+_SIGNATURE_OPENERS = re.compile(
+    r"^\s*(un saludo|saludos|saludos cordiales|atentamente|cordialmente|best regards|kind regards|regards|--\s*)[\s,.!]*$",
+    re.IGNORECASE
+)
+
+# Texto repetitivo que no aporta información para el triage
+_BOILERPLATE = re.compile(
+    r"(enviado desde mi|sent from my|este (mensaje|correo)[^.]*confidencial|"
+    r"this (e-?mail|message)[^.]*confidential|aviso legal|disclaimer|"
+    r"antes de imprimir|please consider the environment|no responda a este correo|"
+    r"^\s*(de|from|para|to|cc|enviado|sent|asunto|subject)\s*:)",
+    re.IGNORECASE
+)
+
+# Líneas que hay que conservar al truncar
+_ERROR_LINE = re.compile(
+    r"(error|exception|excepci[oó]n|fail|fallo|fatal|critical|cr[ií]tico|timeout|"
+    r"timed out|refused|rechazad|denied|denegad|caused by|traceback|ora-\d+|\bhttp [45]\d\d\b)",
+    re.IGNORECASE
+)
+
+# Tokens variables que se ignoran al detectar líneas repetidas (fechas, horas, ids)
+_VOLATILE = re.compile(r"\b(?:0x)?[0-9a-f]*\d[0-9a-f]*\b", re.IGNORECASE)
+
+_SIGNATURE_MAX_LINES = 6
+
+
+class CompactionResult(NamedTuple):
+    """Resultado de la compactación de un texto"""
+    text: str
+    original_tokens: int
+    compacted_tokens: int
+
+
+def _strip_boilerplate(lines: List[str]) -> List[str]:
+    """Elimina firmas de correo y líneas repetitivas; las líneas de error se conservan siempre"""
+    kept = []
+    skip_signature = 0
+    for line in lines:
+        if _ERROR_LINE.search(line):
+            # Un error tras la firma indica que el texto útil continúa
+            skip_signature = 0
+            kept.append(line)
+            continue
+        if skip_signature:
+            if not line.strip():
+                skip_signature = 0
+            else:
+                skip_signature -= 1
+            continue
+        if _SIGNATURE_OPENERS.match(line):
+            skip_signature = _SIGNATURE_MAX_LINES
+            continue
+        if _BOILERPLATE.search(line):
+            continue
+        kept.append(line)
+    return kept
+
+
+def _collapse_repeated(lines: List[str]) -> List[str]:
+    """Funde las repeticiones consecutivas de una línea (ignorando tokens variables) y las anota"""
+    collapsed = []
+    previous_key = None
+    count = 0
+    for line in lines + [None]:
+        stripped = line.strip() if line is not None else None
+        key = _VOLATILE.sub("#", stripped.lower()) if stripped else stripped
+        if collapsed and key == previous_key:
+            count += 1
+            continue
+        # Las líneas en blanco consecutivas se reducen a una sin anotación
+        if count > 1 and previous_key:
+            collapsed[-1] = f"{collapsed[-1]}  [línea repetida {count} veces]"
+        if line is not None:
+            collapsed.append(line.rstrip() if stripped else "")
+        previous_key = key
+        count = 1
+    return collapsed
+
+
+def _split_long_lines(lines: List[str], max_chars: int) -> List[str]:
+    """
+    Parte las líneas más largas que max_chars por espacios, sin cortar una
+    coincidencia de error, para que el recorte pueda conservar la cabeza, la
+    cola y los fragmentos con errores de un párrafo largo
+    """
+    split = []
+    for line in lines:
+        protected = [match.span() for match in _ERROR_LINE.finditer(line)]
+        start = 0
+        while len(line) - start > max_chars:
+            end = line.rfind(" ", start + 1, start + max_chars)
+            if end <= start:
+                end = start + max_chars
+            for match_start, match_end in protected:
+                if match_start < end < match_end:
+                    end = match_end
+                    break
+            split.append(line[start:end].strip())
+            start = end
+        split.append(line[start:].strip() if start else line)
+    return split
+
+
+def _truncate_keeping_errors(lines: List[str], token_budget: int) -> List[str]:
+    """Recorta por cabeza y cola conservando las líneas de error intermedias que quepan"""
+    lines = _split_long_lines(lines, max(40, int(token_budget * CHARS_PER_TOKEN) // 5))
+    line_tokens = [estimate_tokens(line) + 1 for line in lines]
+    head_budget = token_budget * 2 // 5
+    tail_budget = token_budget * 2 // 5
+
+    head_end, used = 0, 0
+    while head_end < len(lines) and used + line_tokens[head_end] <= head_budget:
+        used += line_tokens[head_end]
+        head_end += 1
+
+    tail_start, used_tail = len(lines), 0
+    while tail_start > head_end and used_tail + line_tokens[tail_start - 1] <= tail_budget:
+        tail_start -= 1
+        used_tail += line_tokens[tail_start]
+
+    remaining = token_budget - used - used_tail
+    middle = []
+    omitted = 0
+    for position in range(head_end, tail_start):
+        if _ERROR_LINE.search(lines[position]) and line_tokens[position] <= remaining:
+            if omitted:
+                middle.append(f"[... {omitted} líneas omitidas ...]")
+                omitted = 0
+            middle.append(lines[position])
+            remaining -= line_tokens[position]
+        else:
+            omitted += 1
+    if omitted:
+        middle.append(f"[... {omitted} líneas omitidas ...]")
+
+    return lines[:head_end] + middle + lines[tail_start:]
+
+
+def compact_text(text: str, token_budget: int) -> CompactionResult:
+    """
+    Compacta un texto libre (notas de la incidencia) hasta un presupuesto de tokens
+
+    Args:
+        text: Texto original
+        token_budget: Tokens máximos aproximados del texto compactado
+
+    Returns:
+        CompactionResult con el texto y los tokens antes y después
+    """
+    original_tokens = estimate_tokens(text)
+    if not text:
+        return CompactionResult(text or "", 0, 0)
+    if original_tokens <= token_budget:
+        # Las notas cortas llegan íntegras: firmas y cabeceras pueden llevar identificadores útiles
+        return CompactionResult(text, original_tokens, original_tokens)
+
+    lines = text.splitlines()
+    lines = _strip_boilerplate(lines)
+    lines = _collapse_repeated(lines)
+
+    if sum(estimate_tokens(line) + 1 for line in lines) > token_budget:
+        lines = _truncate_keeping_errors(lines, token_budget)
+
+    compacted = "\n".join(lines).strip()
+    return CompactionResult(compacted, original_tokens, estimate_tokens(compacted))
@@ -1,9 +1,12 @@
 """
 Gestor de base de datos para almacenar resultados de triage
 """
+import io
+import json
 import logging
-from typing import Dict, List, Optional, Any
-from datetime import datetime
+import re
+from typing import Dict, Iterator, List, Optional, Any, Sequence, Set
+from datetime import date, datetime, timedelta
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.exc import SQLAlchemyError
@@ -11,6 +14,147 @@ from config import config
 
 logger = logging.getLogger(__name__)
 
+# Columnas que escriben save_triage_result y save_triage_results_bulk, en el orden del INSERT
+RESULT_COLUMNS = [
+    "incident_id", "resumen", "notas", "fecha_creacion",
+    "causa_raiz_predicha", "confianza", "razonamiento",
+    "keywords_detectadas", "causas_alternativas", "incidencias_similares",
+    "modelo_version", "prompt_version", "heredada_de", "reutilizada_de",
+    "tokens_originales", "tokens_compactados", "endpoint", "tiempo_procesamiento_ms", "batch_id",
+]
+_JSON_COLUMNS = {"keywords_detectadas", "causas_alternativas", "incidencias_similares"}
+
+# Columnas legibles de triage_results (proyección permitida en las lecturas en streaming)
+TRIAGE_RESULT_COLUMNS = ["id"] + RESULT_COLUMNS + ["timestamp_procesamiento", "created_at"]
+
+# Cubetas de los histogramas de los rollups (límite superior exclusivo; la última es abierta)
+CONFIDENCE_BUCKETS = 10
+LATENCY_BUCKETS_MS = [250, 500, 1000, 2000, 3000, 5000, 8000, 13000, 20000, 30000, 60000]
+
+# Semántica de upsert común a todas las rutas de guardado
+_UPSERT_CLAUSE = """
+        ON CONFLICT (incident_id) DO UPDATE SET
+            causa_raiz_predicha = EXCLUDED.causa_raiz_predicha,
+            confianza = EXCLUDED.confianza,
+            razonamiento = EXCLUDED.razonamiento,
+            keywords_detectadas = EXCLUDED.keywords_detectadas,
+            causas_alternativas = EXCLUDED.causas_alternativas,
+            incidencias_similares = EXCLUDED.incidencias_similares,
+            modelo_version = EXCLUDED.modelo_version,
+            prompt_version = EXCLUDED.prompt_version,
+            heredada_de = EXCLUDED.heredada_de,
+            reutilizada_de = EXCLUDED.reutilizada_de,
+            tokens_originales = EXCLUDED.tokens_originales,
+            tokens_compactados = EXCLUDED.tokens_compactados,
+            endpoint = EXCLUDED.endpoint,
+            tiempo_procesamiento_ms = EXCLUDED.tiempo_procesamiento_ms,
+            timestamp_procesamiento = CURRENT_TIMESTAMP
+"""
+
+# En la tabla particionada la clave única debe incluir la clave de partición
+_PARTITIONED_UPSERT_CLAUSE = _UPSERT_CLAUSE.replace(
+    "ON CONFLICT (incident_id)", "ON CONFLICT (incident_id, fecha_creacion)"
+)
+
+# Rellena el mapa incident_id -> fecha_creacion desde triage_results cuando está vacío
+_FECHA_MAP_BACKFILL_SQL = """
+        INSERT INTO triage_incident_fechas (incident_id, fecha_creacion)
+        SELECT DISTINCT ON (incident_id) incident_id, fecha_creacion FROM triage_results
+        WHERE NOT EXISTS (SELECT 1 FROM triage_incident_fechas)
+        ORDER BY incident_id, timestamp_procesamiento DESC
+        ON CONFLICT (incident_id) DO NOTHING;
+"""
+
+# Diseño particionado por mes de fecha_creacion (requiere PostgreSQL 15+ por NULLS NOT DISTINCT).
+# Se particiona por fecha_creacion y no por timestamp_procesamiento porque el upsert
+# actualiza este último y Postgres no permite que ON CONFLICT DO UPDATE mueva filas de partición.
+_PARTITIONED_TABLE_SQL = """
+        CREATE TABLE IF NOT EXISTS triage_results (
+            id BIGSERIAL,
+            incident_id VARCHAR(100) NOT NULL,
+            resumen TEXT,
+            notas TEXT,
+            fecha_creacion TIMESTAMP,
+            causa_raiz_predicha VARCHAR(200),
+            confianza DECIMAL(3,2),
+            razonamiento TEXT,
+            keywords_detectadas JSONB,
+            causas_alternativas JSONB,
+            incidencias_similares JSONB,
+            modelo_version VARCHAR(50),
+            prompt_version VARCHAR(32),
+            heredada_de VARCHAR(100),
+            reutilizada_de VARCHAR(100),
+            tokens_originales INTEGER,
+            tokens_compactados INTEGER,
+            endpoint VARCHAR(150),
+            tiempo_procesamiento_ms INTEGER,
+            timestamp_procesamiento TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            batch_id VARCHAR(100),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) PARTITION BY RANGE (fecha_creacion);
+
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_incident_fecha
+            ON triage_results(incident_id, fecha_creacion) NULLS NOT DISTINCT;
+
+        -- Filas sin fecha_creacion o de meses cuya partición aún no existe
+        CREATE TABLE IF NOT EXISTS triage_results_default PARTITION OF triage_results DEFAULT;
+
+        -- Mapa sin particionar incident_id -> fecha_creacion: las búsquedas por
+        -- incident_id resuelven antes la fecha y leen una sola partición
+        CREATE TABLE IF NOT EXISTS triage_incident_fechas (
+            incident_id VARCHAR(100) PRIMARY KEY,
+            fecha_creacion TIMESTAMP
+        );
+""" + _FECHA_MAP_BACKFILL_SQL
+
+# Antes de cada upsert en la tabla particionada: si la fecha de un ticket cambia,
+# su fila anterior (en otra partición) se borra y el mapa apunta a la nueva
+_FECHA_MAP_SYNC_SQL = """
+        WITH filas AS (
+            SELECT DISTINCT ON (incident_id) incident_id, fecha_creacion
+            FROM jsonb_to_recordset(CAST(:filas AS JSONB)) AS f(incident_id VARCHAR(100), fecha_creacion TIMESTAMP)
+        ), anteriores AS (
+            SELECT m.incident_id, m.fecha_creacion
+            FROM triage_incident_fechas m JOIN filas f USING (incident_id)
+            WHERE m.fecha_creacion IS DISTINCT FROM f.fecha_creacion
+        ), borradas AS (
+            DELETE FROM triage_results t USING anteriores a
+            WHERE t.incident_id = a.incident_id AND t.fecha_creacion IS NOT DISTINCT FROM a.fecha_creacion
+        )
+        INSERT INTO triage_incident_fechas (incident_id, fecha_creacion)
+        SELECT incident_id, fecha_creacion FROM filas
+        ON CONFLICT (incident_id) DO UPDATE SET fecha_creacion = EXCLUDED.fecha_creacion
+"""
+
+_PARTITION_NAME = re.compile(r"^triage_results_p(\d{4})(\d{2})$")
+
+
+def _month_start(value: Any) -> Optional[date]:
+    """Primer día del mes de una fecha (datetime, Timestamp de pandas o texto ISO)"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value[:19])
+        except ValueError:
+            return None
+    try:
+        if value != value:  # NaT de pandas
+            return None
+        return date(value.year, value.month, 1)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_name(month: date) -> str:
+    return f"triage_results_p{month.year:04d}{month.month:02d}"
+
 
 class DatabaseManager:
     """Gestor de conexiones y operaciones con la base de datos PostgreSQL"""
@@ -19,6 +163,8 @@ class DatabaseManager:
         """Inicializa el gestor de base de datos"""
         self.engine = None
         self.SessionLocal = None
+        self._partitioned: Optional[bool] = None
+        self._known_partitions: Set[date] = set()
         self._initialize_engine()
     
     def _initialize_engine(self):
@@ -56,8 +202,35 @@ class DatabaseManager:
             logger.error(f"Error al conectar a la base de datos: {e}")
             return False
     
+    @property
+    def partitioned(self) -> bool:
+        """Si triage_results es una tabla particionada (se detecta en la base de datos)"""
+        if self._partitioned is None:
+            try:
+                with self.engine.connect() as conn:
+                    kind = conn.execute(text(
+                        "SELECT relkind FROM pg_class WHERE oid = to_regclass('triage_results')"
+                    )).scalar()
+            except SQLAlchemyError as e:
+                logger.warning(f"No se pudo detectar el diseño de triage_results: {e}")
+                return config.DB_PARTITIONED
+            # Si la tabla aún no existe, manda la configuración
+            self._partitioned = config.DB_PARTITIONED if kind is None else kind == "p"
+        return self._partitioned
+
+    @property
+    def upsert_clause(self) -> str:
+        """Cláusula ON CONFLICT adecuada al diseño de la tabla"""
+        return _PARTITIONED_UPSERT_CLAUSE if self.partitioned else _UPSERT_CLAUSE
+
     def create_tables(self):
         """Crea las tablas necesarias si no existen"""
+        self._partitioned = None
+        if config.DB_PARTITIONED and not self.partitioned:
+            logger.warning(
+                "DB_PARTITIONED activo pero triage_results ya existe sin particionar; "
+                "ejecute manage_partitions.py migrate para migrarla"
+            )
         create_tables_sql = """
         -- Crear tabla de resultados
         CREATE TABLE IF NOT EXISTS triage_results (
@@ -73,6 +246,12 @@ class DatabaseManager:
             causas_alternativas JSONB,
             incidencias_similares JSONB,
             modelo_version VARCHAR(50),
+            prompt_version VARCHAR(32),
+            heredada_de VARCHAR(100),
+            reutilizada_de VARCHAR(100),
+            tokens_originales INTEGER,
+            tokens_compactados INTEGER,
+            endpoint VARCHAR(150),
             tiempo_procesamiento_ms INTEGER,
             timestamp_procesamiento TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             batch_id VARCHAR(100),
@@ -85,6 +264,50 @@ class DatabaseManager:
         CREATE INDEX IF NOT EXISTS idx_causa_raiz ON triage_results(causa_raiz_predicha);
         CREATE INDEX IF NOT EXISTS idx_timestamp ON triage_results(timestamp_procesamiento);
 
+        -- Migración de tablas existentes: versión de prompt para reanudación
+        ALTER TABLE triage_results ADD COLUMN IF NOT EXISTS prompt_version VARCHAR(32);
+        CREATE INDEX IF NOT EXISTS idx_modelo_prompt ON triage_results(modelo_version, prompt_version);
+
+        -- Migración: representante del que se hereda la clasificación (casi duplicados)
+        ALTER TABLE triage_results ADD COLUMN IF NOT EXISTS heredada_de VARCHAR(100);
+
+        -- Migración: incidencia ya triada cuya clasificación se reutilizó (similitud de embeddings)
+        ALTER TABLE triage_results ADD COLUMN IF NOT EXISTS reutilizada_de VARCHAR(100);
+
+        -- Migración: tokens de entrada antes y después de la compactación
+        ALTER TABLE triage_results ADD COLUMN IF NOT EXISTS tokens_originales INTEGER;
+        ALTER TABLE triage_results ADD COLUMN IF NOT EXISTS tokens_compactados INTEGER;
+
+        -- Migración: endpoint (región/modelo) de Bedrock que atendió la petición
+        ALTER TABLE triage_results ADD COLUMN IF NOT EXISTS endpoint VARCHAR(150);
+
+        -- Índices para analítica: búsqueda por keyword y distribución por batch
+        CREATE INDEX IF NOT EXISTS idx_keywords_gin ON triage_results USING GIN (keywords_detectadas jsonb_path_ops);
+        CREATE INDEX IF NOT EXISTS idx_batch_causa ON triage_results(batch_id, causa_raiz_predicha);
+
+        -- Rollups diarios por batch y causa (refrescados de forma incremental)
+        CREATE TABLE IF NOT EXISTS triage_rollup_diario (
+            batch_id VARCHAR(100) NOT NULL,
+            dia DATE NOT NULL,
+            causa_raiz_predicha VARCHAR(200) NOT NULL,
+            total INTEGER NOT NULL,
+            heredadas INTEGER NOT NULL,
+            reutilizadas INTEGER NOT NULL DEFAULT 0,
+            suma_confianza DOUBLE PRECISION NOT NULL,
+            histograma_confianza INTEGER[] NOT NULL,
+            suma_tiempo_ms BIGINT NOT NULL,
+            histograma_tiempo INTEGER[] NOT NULL,
+            actualizado TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (batch_id, dia, causa_raiz_predicha)
+        );
+        CREATE INDEX IF NOT EXISTS idx_rollup_dia ON triage_rollup_diario(dia);
+        ALTER TABLE triage_rollup_diario ADD COLUMN IF NOT EXISTS reutilizadas INTEGER NOT NULL DEFAULT 0;
+
+        CREATE TABLE IF NOT EXISTS triage_rollup_estado (
+            nombre VARCHAR(50) PRIMARY KEY,
+            watermark TIMESTAMP NOT NULL
+        );
+
         -- Crear tabla de métricas
         CREATE TABLE IF NOT EXISTS triage_metrics (
             id SERIAL PRIMARY KEY,
@@ -95,6 +318,10 @@ class DatabaseManager:
         );
         """
         
+        if self.partitioned:
+            # La tabla particionada se crea antes; el CREATE TABLE sin particionar queda sin efecto
+            create_tables_sql = _PARTITIONED_TABLE_SQL + create_tables_sql
+
         try:
             with self.engine.connect() as conn:
                 conn.execute(text(create_tables_sql))
@@ -118,7 +345,13 @@ class DatabaseManager:
         incidencias_similares: List[Dict[str, Any]],
         modelo_version: str,
         tiempo_procesamiento_ms: int,
-        batch_id: Optional[str] = None
+        batch_id: Optional[str] = None,
+        prompt_version: Optional[str] = None,
+        heredada_de: Optional[str] = None,
+        reutilizada_de: Optional[str] = None,
+        tokens_originales: Optional[int] = None,
+        tokens_compactados: Optional[int] = None,
+        endpoint: Optional[str] = None
     ) -> bool:
         """Guarda un resultado de triage en la base de datos"""
         insert_sql = """
@@ -126,28 +359,22 @@ class DatabaseManager:
             incident_id, resumen, notas, fecha_creacion,
             causa_raiz_predicha, confianza, razonamiento,
             keywords_detectadas, causas_alternativas, incidencias_similares,
-            modelo_version, tiempo_procesamiento_ms, batch_id
+            modelo_version, prompt_version, heredada_de, reutilizada_de,
+            tokens_originales, tokens_compactados, endpoint, tiempo_procesamiento_ms, batch_id
         ) VALUES (
             :incident_id, :resumen, :notas, :fecha_creacion,
             :causa_raiz, :confianza, :razonamiento,
-            :keywords::jsonb, :alternativas::jsonb, :similares::jsonb,
-            :modelo, :tiempo_ms, :batch_id
+            CAST(:keywords AS JSONB), CAST(:alternativas AS JSONB), CAST(:similares AS JSONB),
+            :modelo, :prompt_version, :heredada_de, :reutilizada_de,
+            :tokens_originales, :tokens_compactados, :endpoint, :tiempo_ms, :batch_id
         )
-        ON CONFLICT (incident_id) DO UPDATE SET
-            causa_raiz_predicha = EXCLUDED.causa_raiz_predicha,
-            confianza = EXCLUDED.confianza,
-            razonamiento = EXCLUDED.razonamiento,
-            keywords_detectadas = EXCLUDED.keywords_detectadas,
-            causas_alternativas = EXCLUDED.causas_alternativas,
-            incidencias_similares = EXCLUDED.incidencias_similares,
-            modelo_version = EXCLUDED.modelo_version,
-            tiempo_procesamiento_ms = EXCLUDED.tiempo_procesamiento_ms,
-            timestamp_procesamiento = CURRENT_TIMESTAMP
-        """
+        """ + self.upsert_clause
         
         try:
-            import json
+            self._ensure_partitions_for([fecha_creacion])
             with self.engine.connect() as conn:
+                if self.partitioned:
+                    self._sync_fecha_map(conn, [{"incident_id": incident_id, "fecha_creacion": fecha_creacion}])
                 conn.execute(
                     text(insert_sql),
                     {
@@ -162,6 +389,12 @@ class DatabaseManager:
                         "alternativas": json.dumps(causas_alternativas),
                         "similares": json.dumps(incidencias_similares),
                         "modelo": modelo_version,
+                        "prompt_version": prompt_version,
+                        "heredada_de": heredada_de,
+                        "reutilizada_de": reutilizada_de,
+                        "tokens_originales": tokens_originales,
+                        "tokens_compactados": tokens_compactados,
+                        "endpoint": endpoint,
                         "tiempo_ms": tiempo_procesamiento_ms,
                         "batch_id": batch_id
                     }
@@ -173,17 +406,163 @@ class DatabaseManager:
             logger.error(f"Error al guardar resultado: {e}")
             return False
     
+    @staticmethod
+    def _result_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        """Normaliza un resultado a las columnas de RESULT_COLUMNS (JSON serializado)"""
+        values = {}
+        for column in RESULT_COLUMNS:
+            value = row.get(column)
+            if column in _JSON_COLUMNS:
+                value = json.dumps(value if value is not None else [])
+            elif column == "fecha_creacion" and value is not None and value != value:
+                value = None  # NaT de pandas
+            values[column] = value
+        return values
+
+    @staticmethod
+    def _sync_fecha_map(conn, rows: List[Dict[str, Any]]) -> None:
+        """Actualiza el mapa incident_id -> fecha_creacion y borra la fila anterior si la fecha cambió"""
+        filas = []
+        for row in rows:
+            fecha = row.get("fecha_creacion")
+            if fecha is not None and fecha == fecha:  # NaT de pandas
+                fecha = fecha.isoformat() if hasattr(fecha, "isoformat") else str(fecha)
+            else:
+                fecha = None
+            filas.append({"incident_id": row["incident_id"], "fecha_creacion": fecha})
+        conn.execute(text(_FECHA_MAP_SYNC_SQL), {"filas": json.dumps(filas)})
+
+    @staticmethod
+    def _upsert_values(conn, rows: List[Dict[str, Any]], clause: str = _UPSERT_CLAUSE) -> None:
+        """Un único INSERT multi-fila con la misma cláusula ON CONFLICT que save_triage_result"""
+        params = {}
+        tuples = []
+        for position, row in enumerate(rows):
+            cells = []
+            for column in RESULT_COLUMNS:
+                name = f"{column}_{position}"
+                params[name] = row[column]
+                cells.append(f"CAST(:{name} AS JSONB)" if column in _JSON_COLUMNS else f":{name}")
+            tuples.append(f"({', '.join(cells)})")
+        insert_sql = (
+            f"INSERT INTO triage_results ({', '.join(RESULT_COLUMNS)}) VALUES "
+            + ",\n".join(tuples)
+            + clause
+        )
+        conn.execute(text(insert_sql), params)
+
+    @staticmethod
+    def _upsert_copy(conn, rows: List[Dict[str, Any]], clause: str = _UPSERT_CLAUSE) -> None:
+        """COPY a una tabla temporal y fusión con un único INSERT ... SELECT ... ON CONFLICT"""
+        columns = ", ".join(RESULT_COLUMNS)
+        conn.execute(text(
+            "CREATE TEMP TABLE triage_results_staging "
+            "(LIKE triage_results INCLUDING DEFAULTS) ON COMMIT DROP"
+        ))
+
+        # En CSV de Postgres un campo vacío sin comillas es NULL y "" es cadena vacía
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write(",".join(
+                "" if row[column] is None else '"' + str(row[column]).replace('"', '""') + '"'
+                for column in RESULT_COLUMNS
+            ))
+            buffer.write("\n")
+        buffer.seek(0)
+
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY triage_results_staging ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+
+        conn.execute(text(
+            f"INSERT INTO triage_results ({columns}) SELECT {columns} FROM triage_results_staging"
+            + clause
+        ))
+
+    def save_triage_results_bulk(
+        self,
+        results: List[Dict[str, Any]],
+        mode: str = "values",
+        chunk_size: int = 500,
+        failed: Optional[List[Dict[str, Any]]] = None
+    ) -> int:
+        """
+        Guarda varios resultados de triage con la misma semántica de upsert que save_triage_result
+
+        Cada bloque se escribe en una única transacción. Si un incident_id se repite,
+        prevalece la última aparición (como con llamadas sucesivas a save_triage_result).
+
+        Args:
+            results: Diccionarios con las claves de RESULT_COLUMNS
+            mode: "values" (INSERT multi-fila por bloque) o "copy" (COPY a tabla temporal + fusión)
+            chunk_size: Filas por transacción
+            failed: Lista opcional donde se añaden los resultados de los bloques que fallaron
+
+        Returns:
+            Número de resultados guardados
+        """
+        if mode not in ("values", "copy"):
+            raise ValueError(f"Modo de guardado masivo no soportado: {mode}")
+
+        latest = {}
+        for row in results:
+            latest.pop(row["incident_id"], None)
+            latest[row["incident_id"]] = row
+        originals = list(latest.values())
+        upsert = self._upsert_copy if mode == "copy" else self._upsert_values
+        clause = self.upsert_clause
+        partitioned = self.partitioned
+        self._ensure_partitions_for([row.get("fecha_creacion") for row in originals])
+
+        saved = 0
+        for start in range(0, len(originals), max(1, chunk_size)):
+            chunk = originals[start:start + max(1, chunk_size)]
+            try:
+                with self.engine.begin() as conn:
+                    rows = [self._result_row(row) for row in chunk]
+                    if partitioned:
+                        self._sync_fecha_map(conn, rows)
+                    upsert(conn, rows, clause)
+                saved += len(chunk)
+            except Exception as e:
+                logger.error(f"Error al guardar bloque de {len(chunk)} resultados ({mode}): {e}")
+                if failed is not None:
+                    failed.extend(chunk)
+
+        logger.info(f"Guardado masivo ({mode}): {saved}/{len(originals)} resultados")
+        return saved
+
     def get_triage_result(self, incident_id: str) -> Optional[Dict[str, Any]]:
-        """Obtiene un resultado de triage por ID de incidencia"""
+        """
+        Obtiene un resultado de triage por ID de incidencia
+        
+        En la tabla particionada la fecha_creacion se resuelve antes con el mapa
+        triage_incident_fechas, de modo que la consulta lee una sola partición.
+        """
         query_sql = """
         SELECT * FROM triage_results WHERE incident_id = :incident_id
         """
+        params: Dict[str, Any] = {"incident_id": incident_id}
         
         try:
             with self.engine.connect() as conn:
+                if self.partitioned:
+                    mapped = conn.execute(
+                        text("SELECT fecha_creacion FROM triage_incident_fechas WHERE incident_id = :incident_id"),
+                        params
+                    ).fetchone()
+                    if mapped is None:
+                        return None
+                    if mapped[0] is None:
+                        query_sql += " AND fecha_creacion IS NULL"
+                    else:
+                        query_sql += " AND fecha_creacion = :fecha_creacion"
+                        params["fecha_creacion"] = mapped[0]
                 result = conn.execute(
                     text(query_sql),
-                    {"incident_id": incident_id}
+                    params
                 ).fetchone()
                 
                 if result:
@@ -213,6 +592,620 @@ class DatabaseManager:
             logger.error(f"Error al obtener resultados del batch: {e}")
             return []
     
+    def iter_batch_results(
+        self,
+        batch_id: str,
+        columns: Optional[Sequence[str]] = None,
+        yield_per: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre los resultados de un batch con un cursor de servidor, en memoria constante
+        
+        A diferencia de get_batch_results, las filas se traen del servidor de
+        `yield_per` en `yield_per` y solo con las columnas pedidas.
+        
+        Args:
+            batch_id: ID del batch
+            columns: Columnas a leer (por defecto todas); deben estar en TRIAGE_RESULT_COLUMNS
+            yield_per: Filas por viaje al servidor
+            
+        Yields:
+            Un diccionario por resultado, ordenados por id
+        """
+        columns = list(columns or TRIAGE_RESULT_COLUMNS)
+        unknown = [column for column in columns if column not in TRIAGE_RESULT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Columnas no válidas: {', '.join(unknown)}")
+        
+        query_sql = f"""
+        SELECT {', '.join(columns)} FROM triage_results
+        WHERE batch_id = :batch_id
+        ORDER BY id
+        """
+        
+        try:
+            with self.engine.connect() as conn:
+                result = conn.execution_options(stream_results=True, yield_per=yield_per).execute(
+                    text(query_sql),
+                    {"batch_id": batch_id}
+                )
+                for row in result:
+                    yield dict(row._mapping)
+        except SQLAlchemyError as e:
+            logger.error(f"Error al leer en streaming los resultados del batch: {e}")
+            raise
+    
+    def get_processed_incident_ids(
+        self,
+        modelo_versions: List[str],
+        prompt_versions: List[str]
+    ) -> Set[str]:
+        """
+        Obtiene en una sola consulta los IDs ya triados con los modelos y versiones de prompt dados
+        
+        Args:
+            modelo_versions: Modelos válidos (todos los niveles de la cascada)
+            prompt_versions: Huellas de plantilla de prompt válidas (p. ej. empaquetada e individual)
+            
+        Returns:
+            Conjunto de incident_id ya procesados
+        """
+        query_sql = """
+        SELECT incident_id FROM triage_results
+        WHERE modelo_version = ANY(:modelos) AND prompt_version = ANY(:prompt_versions)
+        """
+        
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.execute(
+                    text(query_sql),
+                    {"modelos": list(modelo_versions), "prompt_versions": list(prompt_versions)}
+                )
+                return {row[0] for row in rows}
+        except SQLAlchemyError as e:
+            logger.error(f"Error al obtener incidencias ya procesadas: {e}")
+            return set()
+    
+    def get_training_examples(
+        self,
+        categories: List[str],
+        min_confianza: float,
+        exclude_model_prefix: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Obtiene el histórico clasificado por el LLM para entrenar el clasificador local
+        
+        Args:
+            categories: Causas raíz admitidas como etiqueta
+            min_confianza: Confianza mínima de la clasificación original
+            exclude_model_prefix: Excluye resultados producidos por modelos con este prefijo
+            
+        Returns:
+            Lista de diccionarios con resumen, notas y causa_raiz_predicha
+        """
+        query_sql = """
+        SELECT resumen, notas, causa_raiz_predicha FROM triage_results
+        WHERE causa_raiz_predicha = ANY(:categories)
+          AND confianza >= :min_confianza
+          AND heredada_de IS NULL
+          AND reutilizada_de IS NULL
+          AND (CAST(:exclude_prefix AS TEXT) IS NULL OR modelo_version NOT LIKE :exclude_prefix || '%')
+        """
+        
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.execute(
+                    text(query_sql),
+                    {
+                        "categories": list(categories),
+                        "min_confianza": min_confianza,
+                        "exclude_prefix": exclude_model_prefix
+                    }
+                ).fetchall()
+                return [dict(row._mapping) for row in rows]
+        except SQLAlchemyError as e:
+            logger.error(f"Error al obtener ejemplos de entrenamiento: {e}")
+            return []
+    
+    @staticmethod
+    def _rollup_aggregates() -> str:
+        """Expresiones de agregación de una fila de triage_rollup_diario"""
+        confidence = ", ".join(
+            f"COUNT(*) FILTER (WHERE LEAST(FLOOR(COALESCE(t.confianza, 0) * {CONFIDENCE_BUCKETS}), {CONFIDENCE_BUCKETS - 1}) = {bucket})"
+            for bucket in range(CONFIDENCE_BUCKETS)
+        )
+        edges = [0] + LATENCY_BUCKETS_MS
+        latency = ", ".join(
+            f"COUNT(*) FILTER (WHERE t.tiempo_procesamiento_ms >= {low} AND t.tiempo_procesamiento_ms < {high})"
+            for low, high in zip(edges, edges[1:])
+        ) + f", COUNT(*) FILTER (WHERE t.tiempo_procesamiento_ms >= {edges[-1]})"
+        return f"""
+            COUNT(*),
+            COUNT(*) FILTER (WHERE t.heredada_de IS NOT NULL),
+            COUNT(*) FILTER (WHERE t.reutilizada_de IS NOT NULL),
+            COALESCE(SUM(t.confianza), 0),
+            ARRAY[{confidence}],
+            COALESCE(SUM(t.tiempo_procesamiento_ms), 0),
+            ARRAY[{latency}]
+        """
+    
+    def refresh_rollups(self, full: bool = False, overlap_minutes: int = 5) -> int:
+        """
+        Refresca triage_rollup_diario de forma incremental
+        
+        Solo se recalculan los grupos (batch_id, día) con filas escritas desde el
+        último refresco; cada grupo se recalcula entero a partir de triage_results,
+        así que las reclasificaciones (upserts) no se cuentan dos veces. El día es
+        el de fecha_creacion (o el de procesamiento si falta), que no cambia al
+        reclasificar. Las filas sin batch_id no entran en los rollups.
+        
+        Args:
+            full: Si es True, recalcula todos los grupos
+            overlap_minutes: Margen hacia atrás sobre el watermark para cubrir
+                transacciones que confirmaron tarde
+            
+        Returns:
+            Número de grupos (batch_id, día) recalculados
+        """
+        day_expr = "CAST(COALESCE(t.fecha_creacion, t.timestamp_procesamiento) AS DATE)"
+        refresh_sql = f"""
+        CREATE TEMP TABLE rollup_claves ON COMMIT DROP AS
+        SELECT DISTINCT t.batch_id, {day_expr} AS dia
+        FROM triage_results t
+        WHERE t.batch_id IS NOT NULL
+          AND (CAST(:desde AS TIMESTAMP) IS NULL OR t.timestamp_procesamiento > :desde);
+
+        DELETE FROM triage_rollup_diario r
+        USING rollup_claves k
+        WHERE r.batch_id = k.batch_id AND r.dia = k.dia;
+
+        INSERT INTO triage_rollup_diario (
+            batch_id, dia, causa_raiz_predicha, total, heredadas, reutilizadas,
+            suma_confianza, histograma_confianza, suma_tiempo_ms, histograma_tiempo
+        )
+        SELECT t.batch_id, {day_expr}, COALESCE(t.causa_raiz_predicha, 'Desconocido'),
+            {self._rollup_aggregates()}
+        FROM triage_results t
+        JOIN rollup_claves k ON t.batch_id = k.batch_id AND {day_expr} = k.dia
+        WHERE t.batch_id IN (SELECT batch_id FROM rollup_claves)
+        GROUP BY 1, 2, 3;
+        """
+        
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('triage_rollup_diario'))"))
+                watermark = None if full else conn.execute(
+                    text("SELECT watermark FROM triage_rollup_estado WHERE nombre = 'diario'")
+                ).scalar()
+                new_watermark = conn.execute(text("SELECT MAX(timestamp_procesamiento) FROM triage_results")).scalar()
+                if new_watermark is None:
+                    return 0
+                
+                desde = watermark - timedelta(minutes=overlap_minutes) if watermark else None
+                conn.execute(text(refresh_sql), {"desde": desde})
+                groups = conn.execute(text("SELECT COUNT(*) FROM rollup_claves")).scalar()
+                conn.execute(
+                    text("""
+                    INSERT INTO triage_rollup_estado (nombre, watermark) VALUES ('diario', :watermark)
+                    ON CONFLICT (nombre) DO UPDATE SET watermark = EXCLUDED.watermark
+                    """),
+                    {"watermark": new_watermark}
+                )
+            logger.info(f"Rollups refrescados: {groups} grupos (batch, día) recalculados")
+            return groups
+        except SQLAlchemyError as e:
+            logger.error(f"Error al refrescar rollups: {e}")
+            return 0
+    
+    @staticmethod
+    def _rollup_filter(
+        batch_id: Optional[str],
+        desde: Optional[date],
+        hasta: Optional[date]
+    ) -> tuple:
+        """Cláusula WHERE y parámetros comunes a las consultas sobre rollups"""
+        conditions = []
+        params: Dict[str, Any] = {}
+        if batch_id is not None:
+            conditions.append("batch_id = :batch_id")
+            params["batch_id"] = batch_id
+        if desde is not None:
+            conditions.append("dia >= :desde")
+            params["desde"] = desde
+        if hasta is not None:
+            conditions.append("dia <= :hasta")
+            params["hasta"] = hasta
+        return ("WHERE " + " AND ".join(conditions)) if conditions else "", params
+    
+    def get_cause_distribution(
+        self,
+        batch_id: Optional[str] = None,
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Distribución de causas raíz a partir de los rollups
+        
+        Args:
+            batch_id: Limitar a un batch
+            desde: Primer día incluido
+            hasta: Último día incluido
+            
+        Returns:
+            Lista de {causa, total, porcentaje, confianza_media}, de mayor a menor
+        """
+        where, params = self._rollup_filter(batch_id, desde, hasta)
+        query_sql = f"""
+        SELECT causa_raiz_predicha AS causa, SUM(total) AS total,
+               SUM(suma_confianza) / NULLIF(SUM(total), 0) AS confianza_media
+        FROM triage_rollup_diario {where}
+        GROUP BY causa_raiz_predicha
+        ORDER BY total DESC
+        """
+        
+        try:
+            with self.engine.connect() as conn:
+                rows = [dict(row._mapping) for row in conn.execute(text(query_sql), params)]
+        except SQLAlchemyError as e:
+            logger.error(f"Error al obtener la distribución de causas: {e}")
+            return []
+        grand_total = sum(row["total"] for row in rows) or 1
+        for row in rows:
+            row["total"] = int(row["total"])
+            row["porcentaje"] = row["total"] / grand_total
+            row["confianza_media"] = float(row["confianza_media"] or 0.0)
+        return rows
+    
+    def _sum_histogram(self, column: str, size: int, batch_id, desde, hasta, causa=None) -> List[int]:
+        """Suma elemento a elemento un histograma de los rollups"""
+        where, params = self._rollup_filter(batch_id, desde, hasta)
+        if causa is not None:
+            where = f"{where} AND causa_raiz_predicha = :causa" if where else "WHERE causa_raiz_predicha = :causa"
+            params["causa"] = causa
+        query_sql = f"""
+        SELECT h.posicion, SUM(h.valor) AS valor
+        FROM triage_rollup_diario r
+        CROSS JOIN LATERAL unnest(r.{column}) WITH ORDINALITY AS h(valor, posicion)
+        {where}
+        GROUP BY h.posicion
+        """
+        counts = [0] * size
+        with self.engine.connect() as conn:
+            for posicion, valor in conn.execute(text(query_sql), params):
+                counts[int(posicion) - 1] = int(valor)
+        return counts
+    
+    def get_confidence_histogram(
+        self,
+        batch_id: Optional[str] = None,
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None,
+        causa: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Histograma de confianza en cubetas de 0.1 a partir de los rollups
+        
+        Returns:
+            Lista de {desde, hasta, total} por cubeta
+        """
+        try:
+            counts = self._sum_histogram("histograma_confianza", CONFIDENCE_BUCKETS, batch_id, desde, hasta, causa)
+        except SQLAlchemyError as e:
+            logger.error(f"Error al obtener el histograma de confianza: {e}")
+            return []
+        width = 1.0 / CONFIDENCE_BUCKETS
+        return [
+            {"desde": round(bucket * width, 2), "hasta": round((bucket + 1) * width, 2), "total": total}
+            for bucket, total in enumerate(counts)
+        ]
+    
+    @staticmethod
+    def _histogram_percentile(counts: List[int], edges: List[float], quantile: float) -> Optional[float]:
+        """Estima un percentil interpolando linealmente dentro de la cubeta"""
+        total = sum(counts)
+        if not total:
+            return None
+        target = quantile * total
+        cumulative = 0
+        for position, count in enumerate(counts):
+            if count and cumulative + count >= target:
+                low = edges[position]
+                if position + 1 >= len(edges):
+                    return float(low)  # cubeta abierta: se devuelve su límite inferior
+                return low + (edges[position + 1] - low) * (target - cumulative) / count
+            cumulative += count
+        return float(edges[-1])
+    
+    def get_latency_percentiles(
+        self,
+        batch_id: Optional[str] = None,
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None,
+        percentiles: Sequence[float] = (0.5, 0.9, 0.95, 0.99)
+    ) -> Dict[str, Any]:
+        """
+        Percentiles aproximados de tiempo de procesamiento a partir del histograma de los rollups
+        
+        Returns:
+            Diccionario {"p50": ms, ...} más total y media exacta
+        """
+        where, params = self._rollup_filter(batch_id, desde, hasta)
+        try:
+            counts = self._sum_histogram("histograma_tiempo", len(LATENCY_BUCKETS_MS) + 1, batch_id, desde, hasta)
+            with self.engine.connect() as conn:
+                total, suma = conn.execute(
+                    text(f"SELECT COALESCE(SUM(total), 0), COALESCE(SUM(suma_tiempo_ms), 0) FROM triage_rollup_diario {where}"),
+                    params
+                ).one()
+        except SQLAlchemyError as e:
+            logger.error(f"Error al obtener percentiles de latencia: {e}")
+            return {}
+        edges = [0] + LATENCY_BUCKETS_MS
+        summary: Dict[str, Any] = {"total": int(total), "media_ms": (float(suma) / total) if total else None}
+        for quantile in percentiles:
+            summary[f"p{round(quantile * 100, 1):g}"] = self._histogram_percentile(counts, edges, quantile)
+        return summary
+    
+    def get_daily_summary(
+        self,
+        batch_id: Optional[str] = None,
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Totales por día a partir de los rollups
+        
+        Returns:
+            Lista de {dia, total, heredadas, reutilizadas, confianza_media, tiempo_medio_ms} ordenada por día
+        """
+        where, params = self._rollup_filter(batch_id, desde, hasta)
+        query_sql = f"""
+        SELECT dia, SUM(total) AS total, SUM(heredadas) AS heredadas, SUM(reutilizadas) AS reutilizadas,
+               SUM(suma_confianza) / NULLIF(SUM(total), 0) AS confianza_media,
+               SUM(suma_tiempo_ms) / NULLIF(SUM(total), 0) AS tiempo_medio_ms
+        FROM triage_rollup_diario {where}
+        GROUP BY dia
+        ORDER BY dia
+        """
+        
+        try:
+            with self.engine.connect() as conn:
+                return [dict(row._mapping) for row in conn.execute(text(query_sql), params)]
+        except SQLAlchemyError as e:
+            logger.error(f"Error al obtener el resumen diario: {e}")
+            return []
+    
+    def search_by_keywords(
+        self,
+        keywords: List[str],
+        batch_id: Optional[str] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """
+        Incidencias cuyas keywords_detectadas contienen todas las indicadas (usa el índice GIN)
+        
+        Args:
+            keywords: Keywords que deben aparecer
+            batch_id: Limitar a un batch
+            limit: Máximo de filas
+            
+        Returns:
+            Lista de {incident_id, causa_raiz_predicha, confianza, keywords_detectadas, batch_id}
+        """
+        query_sql = """
+        SELECT incident_id, causa_raiz_predicha, confianza, keywords_detectadas, batch_id
+        FROM triage_results
+        WHERE keywords_detectadas @> CAST(:keywords AS JSONB)
+          AND (CAST(:batch_id AS VARCHAR) IS NULL OR batch_id = :batch_id)
+        ORDER BY timestamp_procesamiento DESC
+        LIMIT :limit
+        """
+        
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.execute(
+                    text(query_sql),
+                    {"keywords": json.dumps(list(keywords)), "batch_id": batch_id, "limit": limit}
+                )
+                return [dict(row._mapping) for row in rows]
+        except SQLAlchemyError as e:
+            logger.error(f"Error al buscar por keywords: {e}")
+            return []
+    
+    # --- Particionado mensual de triage_results ---
+
+    def _ensure_partitions_for(self, values: Sequence[Any]) -> None:
+        """Crea las particiones de los meses de las fechas dadas que aún no se conocen"""
+        if not self.partitioned:
+            return
+        months = {_month_start(value) for value in values} - {None} - self._known_partitions
+        if not months:
+            return
+        try:
+            self.ensure_partitions(months)
+        except SQLAlchemyError as e:
+            # Sin la partición del mes las filas caen en la partición por defecto
+            logger.warning(f"No se pudieron crear las particiones {sorted(months)}: {e}")
+
+    def ensure_partitions(self, months: Sequence[date]) -> List[str]:
+        """
+        Crea las particiones mensuales indicadas si no existen
+
+        Si la partición por defecto ya tiene filas del mes, se mueven a la nueva
+        partición antes de adjuntarla (CREATE ... PARTITION OF fallaría).
+
+        Args:
+            months: Meses (cualquier fecha del mes)
+
+        Returns:
+            Nombres de las particiones creadas
+        """
+        created = []
+        for month in sorted({_month_start(month) for month in months} - {None}):
+            name = _partition_name(month)
+            params = {"desde": month, "hasta": _add_months(month, 1)}
+            with self.engine.begin() as conn:
+                # Serializa la creación entre procesos que escriben a la vez
+                conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('triage_results_particiones'))"))
+                exists = conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()
+                if exists is None:
+                    conn.execute(text(
+                        f"CREATE TABLE {name} (LIKE triage_results INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+                    ))
+                    conn.execute(text(f"""
+                        WITH movidas AS (
+                            DELETE FROM triage_results_default
+                            WHERE fecha_creacion >= :desde AND fecha_creacion < :hasta
+                            RETURNING *
+                        )
+                        INSERT INTO {name} SELECT * FROM movidas
+                    """), params)
+                    conn.execute(text(
+                        f"ALTER TABLE triage_results ATTACH PARTITION {name} FOR VALUES FROM (:desde) TO (:hasta)"
+                    ), params)
+                    created.append(name)
+            self._known_partitions.add(month)
+        if created:
+            logger.info(f"Particiones creadas: {', '.join(created)}")
+        return created
+
+    def list_partitions(self) -> List[Dict[str, Any]]:
+        """Particiones mensuales de triage_results con su mes y filas estimadas"""
+        query_sql = """
+        SELECT c.relname AS nombre, GREATEST(c.reltuples, 0)::BIGINT AS filas_estimadas
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass('triage_results')
+        ORDER BY c.relname
+        """
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.execute(text(query_sql)).fetchall()
+        except SQLAlchemyError as e:
+            logger.error(f"Error al listar particiones: {e}")
+            raise
+
+        partitions = []
+        for nombre, filas in rows:
+            match = _PARTITION_NAME.match(nombre)
+            partitions.append({
+                "nombre": nombre,
+                "mes": date(int(match.group(1)), int(match.group(2)), 1) if match else None,
+                "filas_estimadas": int(filas),
+            })
+        return partitions
+
+    def drop_partitions_before(self, cutoff: date, dry_run: bool = False) -> List[str]:
+        """
+        Retención: elimina las particiones mensuales anteriores a una fecha
+
+        Se desadjunta y borra cada partición completa (sin DELETE ni VACUUM posteriores).
+        La partición por defecto nunca se elimina. Los rollups diarios se conservan.
+
+        Args:
+            cutoff: Se eliminan los meses que terminan en o antes de esta fecha
+            dry_run: Solo devuelve las particiones que se eliminarían
+
+        Returns:
+            Nombres de las particiones eliminadas (o que se eliminarían)
+        """
+        if not self.partitioned:
+            raise ValueError("triage_results no está particionada; ejecute antes la migración")
+
+        expired = [
+            partition["nombre"] for partition in self.list_partitions()
+            if partition["mes"] is not None and _add_months(partition["mes"], 1) <= cutoff
+        ]
+        if dry_run or not expired:
+            return expired
+
+        for name in expired:
+            match = _PARTITION_NAME.match(name)
+            month = date(int(match.group(1)), int(match.group(2)), 1)
+            with self.engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE triage_results DETACH PARTITION {name}"))
+                conn.execute(text(f"DROP TABLE {name}"))
+                conn.execute(
+                    text("DELETE FROM triage_incident_fechas WHERE fecha_creacion >= :desde AND fecha_creacion < :hasta"),
+                    {"desde": month, "hasta": _add_months(month, 1)}
+                )
+            self._known_partitions.discard(month)
+            logger.info(f"Partición {name} eliminada")
+        return expired
+
+    def migrate_to_partitioned(self, drop_legacy: bool = False) -> int:
+        """
+        Migra una tabla triage_results sin particionar al diseño particionado
+
+        En una única transacción (con la tabla bloqueada): renombra la tabla actual
+        a triage_results_legacy junto con sus índices y secuencia, crea la tabla
+        particionada con las particiones de los meses existentes y copia las filas.
+
+        Args:
+            drop_legacy: Eliminar triage_results_legacy tras copiar
+
+        Returns:
+            Filas copiadas (0 si la tabla ya estaba particionada)
+        """
+        columns = ", ".join(TRIAGE_RESULT_COLUMNS)
+        try:
+            with self.engine.begin() as conn:
+                kind = conn.execute(text(
+                    "SELECT relkind FROM pg_class WHERE oid = to_regclass('triage_results')"
+                )).scalar()
+                if kind == "p":
+                    logger.info("triage_results ya está particionada")
+                    return 0
+
+                if kind is not None:
+                    conn.execute(text("LOCK TABLE triage_results IN ACCESS EXCLUSIVE MODE"))
+                    conn.execute(text("ALTER TABLE triage_results RENAME TO triage_results_legacy"))
+                    # Los nombres de índices y secuencias son globales al esquema
+                    indexes = conn.execute(text(
+                        "SELECT indexname FROM pg_indexes WHERE tablename = 'triage_results_legacy'"
+                    )).scalars().all()
+                    for index in indexes:
+                        conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index}_legacy"'))
+                    sequence = conn.execute(text(
+                        "SELECT pg_get_serial_sequence('triage_results_legacy', 'id')"
+                    )).scalar()
+                    if sequence:
+                        conn.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO triage_results_legacy_id_seq"))
+
+                conn.execute(text(_PARTITIONED_TABLE_SQL))
+                if kind is None:
+                    copied = 0
+                else:
+                    months = conn.execute(text(
+                        "SELECT DISTINCT date_trunc('month', fecha_creacion)::date FROM triage_results_legacy "
+                        "WHERE fecha_creacion IS NOT NULL"
+                    )).scalars().all()
+                    for month in months:
+                        conn.execute(text(
+                            f"CREATE TABLE {_partition_name(month)} PARTITION OF triage_results "
+                            f"FOR VALUES FROM (:desde) TO (:hasta)"
+                        ), {"desde": month, "hasta": _add_months(month, 1)})
+                    copied = conn.execute(text(
+                        f"INSERT INTO triage_results ({columns}) SELECT {columns} FROM triage_results_legacy"
+                    )).rowcount
+                    conn.execute(text(_FECHA_MAP_BACKFILL_SQL))
+                    conn.execute(text(
+                        "SELECT setval(pg_get_serial_sequence('triage_results', 'id'), "
+                        "COALESCE((SELECT MAX(id) FROM triage_results), 0) + 1, false)"
+                    ))
+                    if drop_legacy:
+                        conn.execute(text("DROP TABLE triage_results_legacy"))
+        except SQLAlchemyError as e:
+            logger.error(f"Error al migrar triage_results a particionada: {e}")
+            raise
+
+        self._partitioned = True
+        self._known_partitions.clear()
+        # Índices secundarios, columnas añadidas por migraciones y tablas auxiliares
+        self.create_tables()
+        logger.info(f"triage_results migrada a particionada: {copied} filas copiadas")
+        return copied
+
     def save_metric(
         self,
         metric_name: str,
@@ -222,11 +1215,10 @@ class DatabaseManager:
         """Guarda una métrica en la base de datos"""
         insert_sql = """
         INSERT INTO triage_metrics (metric_name, metric_value, metric_metadata)
-        VALUES (:name, :value, :metadata::jsonb)
+        VALUES (:name, :value, CAST(:metadata AS JSONB))
         """
         
         try:
-            import json
             with self.engine.connect() as conn:
                 conn.execute(
                     text(insert_sql),
@@ -247,3 +1239,21 @@ class DatabaseManager:
         if self.engine:
             self.engine.dispose()
             logger.info("Conexiones de base de datos cerradas")
+
+
+def create_database_manager(backend: Optional[str] = None, path: Optional[str] = None) -> Any:
+    """
+    Crea el gestor de base de datos del backend configurado
+
+    Args:
+        backend: "postgres", "sqlite" o "duckdb" (por defecto config.DB_BACKEND)
+        path: Fichero de la base de datos local (por defecto config.DB_LOCAL_PATH)
+
+    Returns:
+        DatabaseManager o LocalDatabaseManager, con la misma API de guardado y consulta
+    """
+    backend = backend or config.DB_BACKEND
+    if backend == "postgres":
+        return DatabaseManager()
+    from .local_database import LocalDatabaseManager
+    return LocalDatabaseManager(path or config.DB_LOCAL_PATH, backend=backend)
@@ -0,0 +1,145 @@
+"""
+Detección de incidencias casi duplicadas mediante MinHash + LSH
+Permite clasificar un único representante por grupo y heredar el resultado
+en el resto de miembros sin comparar todos los pares (O(n²))
+"""
+import logging
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Primo de Mersenne 2^61 - 1 para las permutaciones universales
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Números, identificadores hexadecimales y fechas cambian entre copias de la misma alarma
+_VOLATILE_TOKENS = re.compile(r"\b(?:0x)?[0-9a-f]*\d[0-9a-f]*\b")
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def normalize_for_dedup(text: str) -> str:
+    """Normaliza un texto eliminando los tokens que varían entre duplicados"""
+    text = str(text or "").lower()
+    text = _VOLATILE_TOKENS.sub("0", text)
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def _optimal_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    Elige bandas (b) y filas por banda (r) cuyo umbral LSH (1/b)^(1/r)
+    se aproxime al umbral de similitud pedido
+    """
+    best = (num_perm, 1)
+    best_error = float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        error = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class NearDuplicateIndex:
+    """
+    Índice incremental de representantes de grupos de casi duplicados
+
+    Cada texto se resume en una firma MinHash sobre shingles de palabras.
+    Las firmas se reparten en bandas LSH, de modo que solo se comparan los
+    representantes que comparten al menos un cubo con la incidencia nueva.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        num_perm: int = 64,
+        shingle_size: int = 3,
+        seed: int = 1
+    ):
+        """
+        Inicializa el índice
+
+        Args:
+            threshold: Similitud de Jaccard estimada mínima para agrupar
+            num_perm: Número de permutaciones MinHash
+            shingle_size: Palabras por shingle
+            seed: Semilla de las permutaciones
+        """
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = _optimal_bands(num_perm, threshold)
+
+        generator = np.random.RandomState(seed)
+        self._a = generator.randint(1, 1 << 31, size=num_perm).astype(np.uint64)
+        self._b = generator.randint(0, 1 << 31, size=num_perm).astype(np.uint64)
+
+        self._buckets: List[Dict[bytes, List[str]]] = [dict() for _ in range(self.bands)]
+        self._signatures: Dict[str, np.ndarray] = {}
+
+    def _shingles(self, text: str) -> List[bytes]:
+        tokens = normalize_for_dedup(text).split()
+        if len(tokens) <= self.shingle_size:
+            return [" ".join(tokens).encode("utf-8")] if tokens else []
+        return [
+            " ".join(tokens[i:i + self.shingle_size]).encode("utf-8")
+            for i in range(len(tokens) - self.shingle_size + 1)
+        ]
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """Firma MinHash de un texto (None si no tiene contenido)"""
+        shingles = self._shingles(text)
+        if not shingles:
+            return None
+        hashes = np.fromiter((zlib.crc32(s) for s in set(shingles)), dtype=np.uint64)
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def find_or_add(self, key: str, text: str) -> Optional[str]:
+        """
+        Busca un representante casi idéntico; si no existe, registra el texto como nuevo representante
+
+        Args:
+            key: Identificador de la incidencia
+            text: Texto a comparar (resumen + notas)
+
+        Returns:
+            Clave del representante del grupo, o None si la incidencia inicia un grupo nuevo
+        """
+        signature = self.signature(text)
+        if signature is None:
+            return None
+
+        band_keys = self._band_keys(signature)
+        best_key, best_similarity = None, 0.0
+        seen = set()
+        for band, band_key in enumerate(band_keys):
+            for candidate in self._buckets[band].get(band_key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                similarity = float(np.mean(self._signatures[candidate] == signature))
+                if similarity > best_similarity:
+                    best_key, best_similarity = candidate, similarity
+
+        if best_key is not None and best_similarity >= self.threshold:
+            return best_key
+
+        self._signatures[key] = signature
+        for band, band_key in enumerate(band_keys):
+            self._buckets[band].setdefault(band_key, []).append(key)
+        return None
+
+    def __len__(self) -> int:
+        """Número de representantes registrados"""
+        return len(self._signatures)
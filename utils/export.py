@@ -0,0 +1,126 @@
+"""
+Exportación en streaming de resultados de triage a JSONL o Parquet
+Consume cualquier iterable de filas (p. ej. DatabaseManager.iter_batch_results)
+sin materializarlo, por lo que la memoria no depende del tamaño del batch
+"""
+import json
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence, Union
+
+logger = logging.getLogger(__name__)
+
+_INTEGER_COLUMNS = {"id", "tokens_originales", "tokens_compactados", "tiempo_procesamiento_ms"}
+_FLOAT_COLUMNS = {"confianza"}
+_TIMESTAMP_COLUMNS = {"fecha_creacion", "timestamp_procesamiento", "created_at"}
+_JSON_COLUMNS = {"keywords_detectadas", "causas_alternativas", "incidencias_similares"}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def write_jsonl(rows: Iterable[Dict[str, Any]], path: Union[str, Path]) -> int:
+    """
+    Escribe las filas como JSON Lines
+
+    Args:
+        rows: Filas a exportar
+        path: Fichero de salida
+
+    Returns:
+        Número de filas escritas
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    with open(path, "w", encoding="utf-8") as handle:
+        for row in rows:
+            handle.write(json.dumps(row, ensure_ascii=False, default=_json_default) + "\n")
+            count += 1
+    return count
+
+
+def _parquet_schema(columns: Sequence[str]):
+    import pyarrow as pa
+
+    fields = []
+    for column in columns:
+        if column in _INTEGER_COLUMNS:
+            fields.append(pa.field(column, pa.int64()))
+        elif column in _FLOAT_COLUMNS:
+            fields.append(pa.field(column, pa.float64()))
+        elif column in _TIMESTAMP_COLUMNS:
+            fields.append(pa.field(column, pa.timestamp("us")))
+        else:
+            # Texto y columnas JSONB (serializadas) como string
+            fields.append(pa.field(column, pa.string()))
+    return pa.schema(fields)
+
+
+def _parquet_value(column: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if column in _JSON_COLUMNS:
+        return json.dumps(value, ensure_ascii=False, default=_json_default)
+    if column in _FLOAT_COLUMNS:
+        return float(value)
+    return value
+
+
+def write_parquet(
+    rows: Iterable[Dict[str, Any]],
+    path: Union[str, Path],
+    columns: Sequence[str],
+    row_group_size: int = 10000
+) -> int:
+    """
+    Escribe las filas en Parquet, un row group cada `row_group_size` filas
+
+    Requiere pyarrow (dependencia opcional).
+
+    Args:
+        rows: Filas a exportar
+        path: Fichero de salida
+        columns: Columnas de las filas, en el orden del fichero
+        row_group_size: Filas acumuladas en memoria antes de escribir cada row group
+
+    Returns:
+        Número de filas escritas
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("La exportación a Parquet requiere pyarrow (pip install pyarrow)") from e
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    schema = _parquet_schema(columns)
+    count = 0
+
+    def _flush(buffer: Dict[str, List[Any]]) -> None:
+        writer.write_table(pa.Table.from_pydict(buffer, schema=schema))
+
+    with pq.ParquetWriter(str(path), schema, compression="zstd") as writer:
+        buffer: Dict[str, List[Any]] = {column: [] for column in columns}
+        pending = 0
+        for row in rows:
+            for column in columns:
+                buffer[column].append(_parquet_value(column, row.get(column)))
+            pending += 1
+            if pending >= row_group_size:
+                _flush(buffer)
+                count += pending
+                buffer = {column: [] for column in columns}
+                pending = 0
+        if pending:
+            _flush(buffer)
+            count += pending
+    return count
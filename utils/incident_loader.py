@@ -0,0 +1,148 @@
+"""
+Carga en streaming de exportaciones de incidencias (CSV/XLSX)
+Lee el fichero por bloques y solo las columnas que usa el pipeline
+"""
+import logging
+import queue
+import threading
+from typing import Iterable, Iterator, List, Optional
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Columnas de la exportación que utiliza el pipeline de triage
+INCIDENT_COLUMNS = ["Ticket ID", "Resumen", "Notas", "Fecha Creacion"]
+
+_END_OF_STREAM = object()
+
+
+def _iter_csv_chunks(file_path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Lee un CSV por bloques proyectando solo las columnas del pipeline"""
+    reader = pd.read_csv(
+        file_path,
+        usecols=lambda column: column in INCIDENT_COLUMNS,
+        dtype={"Ticket ID": str},
+        chunksize=chunk_size
+    )
+    with reader:
+        for chunk in reader:
+            yield chunk
+
+
+def _iter_xlsx_chunks(file_path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Lee un XLSX fila a fila en modo read-only de openpyxl"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+
+        positions = {
+            str(name).strip(): position
+            for position, name in enumerate(header)
+            if name is not None and str(name).strip() in INCIDENT_COLUMNS
+        }
+        columns = [column for column in INCIDENT_COLUMNS if column in positions]
+        missing = set(INCIDENT_COLUMNS) - set(columns)
+        if missing:
+            logger.warning(f"Columnas no encontradas en {file_path}: {', '.join(sorted(missing))}")
+
+        buffer: List[list] = []
+        offset = 0
+        for row in rows:
+            values = [row[positions[column]] if positions[column] < len(row) else None for column in columns]
+            if all(value is None for value in values):
+                continue
+            buffer.append(values)
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer, columns=columns, index=range(offset, offset + len(buffer)))
+                offset += len(buffer)
+                buffer = []
+
+        if buffer:
+            yield pd.DataFrame(buffer, columns=columns, index=range(offset, offset + len(buffer)))
+    finally:
+        workbook.close()
+
+
+def iter_incident_chunks(
+    file_path: str,
+    chunk_size: int = 1000,
+    limit: Optional[int] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Lee una exportación de incidencias por bloques
+
+    Args:
+        file_path: Ruta al archivo CSV/Excel
+        chunk_size: Número de filas por bloque
+        limit: Número máximo de incidencias a devolver
+
+    Yields:
+        DataFrames con las columnas de INCIDENT_COLUMNS disponibles
+    """
+    chunk_size = max(1, chunk_size)
+    chunks = _iter_xlsx_chunks(file_path, chunk_size) if file_path.endswith('.xlsx') else _iter_csv_chunks(file_path, chunk_size)
+
+    loaded = 0
+    for chunk in chunks:
+        if limit is not None and loaded + len(chunk) > limit:
+            chunk = chunk.head(limit - loaded)
+        loaded += len(chunk)
+        logger.info(f"Bloque de {len(chunk)} incidencias leído desde {file_path} (acumulado: {loaded})")
+        if len(chunk):
+            yield chunk
+        if limit is not None and loaded >= limit:
+            break
+
+
+def prefetch(items: Iterable, max_prefetch: int = 2) -> Iterator:
+    """
+    Consume un iterable en un hilo en segundo plano
+
+    Permite que el procesamiento del primer bloque empiece mientras los
+    siguientes se siguen parseando. La cola acotada limita la memoria usada.
+
+    Args:
+        items: Iterable a consumir (p. ej. bloques de iter_incident_chunks)
+        max_prefetch: Elementos máximos leídos por adelantado
+
+    Yields:
+        Los elementos del iterable en el mismo orden
+    """
+    buffer: queue.Queue = queue.Queue(maxsize=max(1, max_prefetch))
+    stop = threading.Event()
+
+    def _put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _producer():
+        try:
+            for item in items:
+                if not _put((item, None)):
+                    return
+            _put((_END_OF_STREAM, None))
+        except Exception as e:
+            _put((_END_OF_STREAM, e))
+
+    producer = threading.Thread(target=_producer, name="incident-prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _END_OF_STREAM:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,381 @@
+"""
+Índice aproximado de similitud: particionado IVF con vectores comprimidos
+Los vectores se reparten en `nlist` listas por k-means esférico y se guardan
+comprimidos (int8 por dimensión o product quantization); cada consulta solo
+recorre las `nprobe` listas más cercanas y, opcionalmente, re-puntúa los
+mejores candidatos con los vectores float32 exactos del almacén
+"""
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from .similarity import collect_neighbours, merge_top_k, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATIONS = ("int8", "pq")
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, block_size: int = 65536) -> np.ndarray:
+    """Centroide de mayor producto escalar de cada vector, por bloques"""
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block_size):
+        labels[start:start + block_size] = np.argmax(vectors[start:start + block_size] @ centroids.T, axis=1)
+    return labels
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Centroide euclídeo más cercano: argmin ||c||² - 2 x·c"""
+    return np.argmin((centroids ** 2).sum(axis=1) - 2.0 * vectors @ centroids.T, axis=1)
+
+
+def train_kmeans(
+    vectors: np.ndarray,
+    n_clusters: int,
+    iterations: int = 10,
+    spherical: bool = True,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    K-means sobre una muestra de entrenamiento
+
+    Args:
+        vectors: Muestra (n x d), n >= n_clusters
+        n_clusters: Número de centroides
+        iterations: Iteraciones de Lloyd
+        spherical: Centroides normalizados y asignación por producto escalar (coseno)
+        seed: Semilla de la inicialización
+
+    Returns:
+        Centroides (n_clusters x d) en float32
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        labels = _assign(vectors, centroids) if spherical else _nearest(vectors, centroids)
+        counts = np.bincount(labels, minlength=n_clusters)
+        # Suma por centroide ordenando por etiqueta (np.add.at es mucho más lento)
+        order = np.argsort(labels, kind="stable")
+        present = np.nonzero(counts)[0]
+        sums = np.zeros_like(centroids)
+        sums[present] = np.add.reduceat(vectors[order], np.concatenate([[0], np.cumsum(counts[present])[:-1]]), axis=0)
+        empty = counts == 0
+        if empty.any():
+            # Los centroides vacíos se reinician con puntos al azar
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+            counts[empty] = 1
+        centroids = sums / counts[:, None]
+        if spherical:
+            centroids = normalize_rows(centroids)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """
+    Índice IVF con compresión int8 o PQ sobre las filas de un VectorStore
+
+    Misma interfaz que SimilarityIndex (update/search), por lo que sus
+    resultados sirven igual para incidencias_similares. `nprobe` es el
+    compromiso recall/velocidad: más listas recorridas, más recall y más
+    coste. `rerank` candidatos se re-puntúan con los vectores exactos.
+    Las incidencias nuevas se asignan a la lista más cercana sin reentrenar.
+    """
+
+    # Vectores de la muestra usados para entrenar los codebooks de PQ
+    PQ_TRAIN_SIZE = 20_000
+
+    def __init__(
+        self,
+        store,
+        nlist: int = 0,
+        nprobe: int = 8,
+        quantization: str = "int8",
+        pq_m: int = 64,
+        rerank: int = 50,
+        train_size: int = 100_000,
+        seed: int = 0
+    ):
+        """
+        Entrena el índice con las incidencias ya almacenadas
+
+        Args:
+            store: VectorStore con vectores normalizados
+            nlist: Número de listas (0 = 4·√n, acotado por el tamaño de la muestra)
+            nprobe: Listas recorridas por consulta
+            quantization: "int8" (4x menos memoria) o "pq" (dim/pq_m x 4 menos memoria)
+            pq_m: Subespacios de PQ (debe dividir la dimensión); 256 centroides por subespacio
+            rerank: Candidatos re-puntuados con float32 exacto (0 = sin re-puntuación)
+            train_size: Vectores muestreados para entrenar k-means
+            seed: Semilla del muestreo y de k-means
+        """
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Cuantización no soportada: {quantization}")
+        if quantization == "pq" and store.dim % pq_m:
+            raise ValueError(f"pq_m={pq_m} debe dividir la dimensión {store.dim}")
+
+        self.store = store
+        self.nprobe = nprobe
+        self.quantization = quantization
+        self.pq_m = pq_m
+        self.rerank = rerank
+        self.ids: List[str] = []
+        self._rows: List[int] = []
+        self._positions: Dict[str, int] = {}
+        self._current_entry: List[int] = []
+        self._entry_count = 0
+        self._pending: List[List[Tuple[np.ndarray, np.ndarray, np.ndarray]]] = []
+        self._lists: List[Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]] = []
+
+        ids, rows = store.items()
+        if not ids:
+            raise ValueError("El almacén de vectores está vacío; no se puede entrenar el índice")
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(rows, min(train_size, len(rows)), replace=False))
+        sample = np.asarray(store.matrix()[sample_rows], dtype=np.float32)
+
+        nlist = nlist or int(4 * np.sqrt(len(ids)))
+        self.nlist = max(1, min(nlist, len(sample) // 4 or 1))
+        self.centroids = train_kmeans(sample, self.nlist, seed=seed)
+        self._train_codec(sample, seed)
+        self._reset_lists()
+        self.update(ids)
+        logger.info(
+            f"Índice IVF entrenado: {len(self.ids)} incidencias, {self.nlist} listas, "
+            f"{quantization}, {self.code_bytes} bytes por vector"
+        )
+
+    @property
+    def code_bytes(self) -> int:
+        """Bytes por vector comprimido"""
+        return self.pq_m if self.quantization == "pq" else self.store.dim
+
+    def _reset_lists(self) -> None:
+        self._pending = [[] for _ in range(self.nlist)]
+        self._lists = [None] * self.nlist
+
+    def _train_codec(self, sample: np.ndarray, seed: int) -> None:
+        if self.quantization == "int8":
+            # Escala por dimensión: el máximo absoluto de la muestra se codifica como 127
+            self.scale = (np.abs(sample).max(axis=0) / 127.0).astype(np.float32)
+            self.scale[self.scale == 0] = 1.0
+            return
+        # PQ sobre el residuo respecto al centroide de su lista (IVFADC)
+        sample = sample[:self.PQ_TRAIN_SIZE]
+        residuals = sample - self.centroids[_assign(sample, self.centroids)]
+        sub = self.store.dim // self.pq_m
+        codewords = min(256, len(sample))
+        self.codebooks = np.stack([
+            train_kmeans(residuals[:, j * sub:(j + 1) * sub], codewords, spherical=False, seed=seed + j)
+            for j in range(self.pq_m)
+        ])
+
+    def _encode(self, vectors: np.ndarray, labels: np.ndarray) -> np.ndarray:
+        if self.quantization == "int8":
+            return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+        residuals = vectors - self.centroids[labels]
+        sub = self.store.dim // self.pq_m
+        return np.stack([
+            _nearest(residuals[:, j * sub:(j + 1) * sub], self.codebooks[j])
+            for j in range(self.pq_m)
+        ], axis=1).astype(np.uint8)
+
+    def _list(self, list_id: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Códigos, posiciones y entradas de una lista (compacta lo añadido desde la última consulta)"""
+        if self._pending[list_id]:
+            parts = ([self._lists[list_id]] if self._lists[list_id] is not None else []) + self._pending[list_id]
+            self._lists[list_id] = tuple(np.concatenate(column) for column in zip(*parts))
+            self._pending[list_id] = []
+        if self._lists[list_id] is None:
+            empty_codes = np.empty((0, self.code_bytes), dtype=np.int8 if self.quantization == "int8" else np.uint8)
+            return empty_codes, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return self._lists[list_id]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def update(self, incident_ids: Sequence[str]) -> None:
+        """Asigna y codifica incidencias nuevas o modificadas del almacén"""
+        positions = self.store.positions(incident_ids)
+        if not positions:
+            return
+        matrix = self.store.matrix()
+        ids = list(positions)
+        rows = np.array([positions[incident_id] for incident_id in ids], dtype=np.int64)
+        order = np.argsort(rows)
+        for start in range(0, len(order), 65536):
+            chunk = order[start:start + 65536]
+            vectors = np.asarray(matrix[rows[chunk]], dtype=np.float32)
+            labels = _assign(vectors, self.centroids)
+            codes = self._encode(vectors, labels)
+            entries = np.arange(self._entry_count, self._entry_count + len(chunk), dtype=np.int64)
+            self._entry_count += len(chunk)
+            chunk_positions = np.empty(len(chunk), dtype=np.int64)
+            for offset, item in enumerate(chunk):
+                incident_id = ids[item]
+                position = self._positions.get(incident_id)
+                if position is None:
+                    position = len(self.ids)
+                    self._positions[incident_id] = position
+                    self.ids.append(incident_id)
+                    self._rows.append(int(rows[item]))
+                    self._current_entry.append(int(entries[offset]))
+                else:
+                    # La entrada anterior queda obsoleta y se ignora al buscar
+                    self._rows[position] = int(rows[item])
+                    self._current_entry[position] = int(entries[offset])
+                chunk_positions[offset] = position
+            for list_id in np.unique(labels):
+                mask = labels == list_id
+                self._pending[list_id].append((codes[mask], chunk_positions[mask], entries[mask]))
+
+    def _score(self, queries: np.ndarray, codes: np.ndarray, coarse: np.ndarray) -> np.ndarray:
+        """Similitud aproximada (consultas x códigos) dentro de una lista con producto `coarse` por su centroide"""
+        if self.quantization == "int8":
+            return (queries * self.scale) @ codes.T.astype(np.float32)
+        sub = self.store.dim // self.pq_m
+        # Tablas de distancias asimétricas: producto de cada subconsulta con cada centroide
+        tables = np.einsum("qms,mcs->qmc", queries.reshape(len(queries), self.pq_m, sub), self.codebooks)
+        subspaces = np.arange(self.pq_m)
+        scores = np.repeat(coarse[:, None], len(codes), axis=1).astype(np.float32)
+        for start in range(0, len(codes), 4096):
+            scores[:, start:start + 4096] += tables[:, subspaces, codes[start:start + 4096]].sum(axis=2)
+        return scores
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        exclude: Optional[Sequence[Optional[str]]] = None,
+        min_score: float = -1.0,
+        nprobe: Optional[int] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Incidencias aproximadamente más similares a cada consulta
+
+        Args:
+            queries: Matriz de consultas (n x dim); se normaliza
+            k: Vecinos por consulta
+            exclude: ID a excluir de los resultados de cada consulta
+            min_score: Similitud mínima para devolver un vecino
+            nprobe: Listas recorridas (por defecto la del índice)
+
+        Returns:
+            Por cada consulta, lista de (incident_id, similitud) de mayor a menor
+        """
+        if len(queries) == 0:
+            return []
+        if not self.ids or k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        queries = normalize_rows(queries)
+        wanted = k + (1 if exclude is not None else 0)
+        candidates = max(wanted, self.rerank)
+        probes = min(self.nlist, nprobe or self.nprobe)
+
+        coarse = queries @ self.centroids.T
+        probed = np.argpartition(-coarse, probes - 1, axis=1)[:, :probes]
+        best_scores = np.full((len(queries), candidates), -np.inf, dtype=np.float32)
+        best_positions = np.full((len(queries), candidates), -1, dtype=np.int64)
+        current = np.asarray(self._current_entry, dtype=np.int64)
+
+        # Cada lista se recorre una vez para todas las consultas que la sondean
+        for list_id in np.unique(probed):
+            codes, positions, entries = self._list(int(list_id))
+            if not len(codes):
+                continue
+            query_ids = np.nonzero((probed == list_id).any(axis=1))[0]
+            scores = self._score(queries[query_ids], codes, coarse[query_ids, list_id])
+            scores[:, current[positions] != entries] = -np.inf
+            top = min(candidates, scores.shape[1])
+            chosen = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+            best_scores[query_ids], best_positions[query_ids] = merge_top_k(
+                best_scores[query_ids],
+                best_positions[query_ids],
+                np.take_along_axis(scores, chosen, axis=1),
+                positions[chosen],
+                candidates
+            )
+
+        if self.rerank:
+            best_scores = self._rerank(queries, best_positions)
+        return collect_neighbours(best_scores, best_positions, self.ids, k, exclude, min_score)
+
+    def _rerank(self, queries: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        """Re-puntúa los candidatos con los vectores float32 exactos del almacén"""
+        matrix = self.store.matrix()
+        rows = np.asarray(self._rows, dtype=np.int64)
+        scores = np.full(positions.shape, -np.inf, dtype=np.float32)
+        for query, candidate_positions in enumerate(positions):
+            valid = candidate_positions >= 0
+            if valid.any():
+                vectors = np.asarray(matrix[rows[candidate_positions[valid]]])
+                scores[query, valid] = vectors @ queries[query]
+        return scores
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Guarda el índice (centroides, codificador y listas) en un fichero .npz"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lists = [self._list(list_id) for list_id in range(self.nlist)]
+        codec = {"scale": self.scale} if self.quantization == "int8" else {"codebooks": self.codebooks}
+        np.savez(
+            path,
+            params=np.array([self.nlist, self.nprobe, self.pq_m, self.rerank, self.store.dim], dtype=np.int64),
+            quantization=np.array(self.quantization),
+            centroids=self.centroids,
+            ids=np.array(self.ids, dtype=str),
+            rows=np.asarray(self._rows, dtype=np.int64),
+            current_entry=np.asarray(self._current_entry, dtype=np.int64),
+            list_sizes=np.array([len(item[0]) for item in lists], dtype=np.int64),
+            codes=np.concatenate([item[0] for item in lists]),
+            positions=np.concatenate([item[1] for item in lists]),
+            entries=np.concatenate([item[2] for item in lists]),
+            **codec
+        )
+        logger.info(f"Índice IVF guardado en {path}")
+
+    @classmethod
+    def load(cls, path: Union[str, Path], store) -> "IVFIndex":
+        """
+        Carga un índice guardado e incorpora lo añadido al almacén desde entonces
+
+        Args:
+            path: Fichero .npz de save()
+            store: VectorStore del que se construyó el índice
+        """
+        data = np.load(path)
+        nlist, nprobe, pq_m, rerank, dim = (int(value) for value in data["params"])
+        if dim != store.dim:
+            raise ValueError(f"El índice {path} es de {dim} dimensiones; el almacén usa {store.dim}")
+
+        index = cls.__new__(cls)
+        index.store = store
+        index.nlist, index.nprobe, index.pq_m, index.rerank = nlist, nprobe, pq_m, rerank
+        index.quantization = str(data["quantization"])
+        index.centroids = data["centroids"]
+        if index.quantization == "int8":
+            index.scale = data["scale"]
+        else:
+            index.codebooks = data["codebooks"]
+        index.ids = data["ids"].tolist()
+        index._rows = data["rows"].tolist()
+        index._positions = {incident_id: position for position, incident_id in enumerate(index.ids)}
+        index._current_entry = data["current_entry"].tolist()
+        index._entry_count = int(data["entries"].max()) + 1 if len(data["entries"]) else 0
+        index._reset_lists()
+        bounds = np.concatenate([[0], np.cumsum(data["list_sizes"])])
+        codes, positions, entries = data["codes"], data["positions"], data["entries"]
+        for list_id in range(nlist):
+            start, end = bounds[list_id], bounds[list_id + 1]
+            if end > start:
+                index._lists[list_id] = (codes[start:end], positions[start:end], entries[start:end])
+
+        # Incidencias nuevas o re-embebidas desde que se guardó el índice
+        stored_ids, stored_rows = store.items()
+        changed = [
+            incident_id for incident_id, row in zip(stored_ids, stored_rows)
+            if incident_id not in index._positions or index._rows[index._positions[incident_id]] != row
+        ]
+        index.update(changed)
+        logger.info(f"Índice IVF cargado desde {path}: {len(index.ids)} incidencias ({len(changed)} incorporadas)")
+        return index
@@ -0,0 +1,474 @@
+"""
+Backend embebido (SQLite en modo WAL o DuckDB) para los resultados de triage
+Misma API que DatabaseManager para ejecuciones locales, benchmarks y CI sin
+servidor; los resultados se pueden sincronizar después con PostgreSQL en bloque
+"""
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Union
+from .database import RESULT_COLUMNS, TRIAGE_RESULT_COLUMNS, _JSON_COLUMNS, _UPSERT_CLAUSE
+
+logger = logging.getLogger(__name__)
+
+LOCAL_BACKENDS = ("sqlite", "duckdb")
+
+# Tipos portables entre SQLite y DuckDB; JSONB se guarda como texto JSON
+_COLUMN_TYPES = {
+    "incident_id": "VARCHAR(100) UNIQUE NOT NULL",
+    "resumen": "TEXT",
+    "notas": "TEXT",
+    "fecha_creacion": "TIMESTAMP",
+    "causa_raiz_predicha": "VARCHAR(200)",
+    "confianza": "DOUBLE",
+    "razonamiento": "TEXT",
+    "keywords_detectadas": "TEXT",
+    "causas_alternativas": "TEXT",
+    "incidencias_similares": "TEXT",
+    "modelo_version": "VARCHAR(50)",
+    "prompt_version": "VARCHAR(32)",
+    "heredada_de": "VARCHAR(100)",
+    "reutilizada_de": "VARCHAR(100)",
+    "tokens_originales": "INTEGER",
+    "tokens_compactados": "INTEGER",
+    "endpoint": "VARCHAR(150)",
+    "tiempo_procesamiento_ms": "INTEGER",
+    "batch_id": "VARCHAR(100)",
+}
+
+_ID_COLUMN = {
+    "sqlite": "id INTEGER PRIMARY KEY AUTOINCREMENT",
+    "duckdb": "id BIGINT PRIMARY KEY DEFAULT nextval('triage_results_id_seq')",
+}
+
+
+def _sqlite_timestamp(value: bytes) -> datetime:
+    return datetime.fromisoformat(value.decode())
+
+
+sqlite3.register_converter("TIMESTAMP", _sqlite_timestamp)
+
+
+class LocalDatabaseManager:
+    """
+    Gestor de resultados de triage sobre un fichero local (SQLite o DuckDB)
+
+    Implementa los métodos de DatabaseManager que usa el procesamiento
+    (guardado individual y masivo, consultas por batch, reanudación, métricas).
+    Las tablas de rollups y el particionado son exclusivos de PostgreSQL:
+    refresh_rollups no hace nada. Cada operación abre su propia conexión
+    (SQLite) o cursor (DuckDB), por lo que puede usarse desde el hilo del
+    escritor diferido.
+    """
+
+    partitioned = False
+
+    def __init__(self, path: Union[str, Path], backend: str = "sqlite"):
+        """
+        Abre (o crea) la base de datos local y su esquema
+
+        Args:
+            path: Fichero de la base de datos
+            backend: "sqlite" o "duckdb" (requiere el paquete duckdb)
+        """
+        if backend not in LOCAL_BACKENDS:
+            raise ValueError(f"Backend local no soportado: {backend}")
+        self.backend = backend
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._duckdb = None
+        self._lock = threading.Lock()
+
+        if backend == "duckdb":
+            try:
+                import duckdb
+            except ImportError as e:
+                raise ImportError("El backend DuckDB requiere el paquete duckdb (pip install duckdb)") from e
+            self._duckdb = duckdb.connect(str(self.path))
+        else:
+            with self._connect() as conn:
+                # WAL: los lectores no bloquean al escritor; persiste en el fichero
+                conn.execute("PRAGMA journal_mode=WAL")
+
+        self.create_tables()
+        logger.info(f"Base de datos local ({backend}) inicializada en {self.path}")
+
+    @contextmanager
+    def _connect(self) -> Iterator[Any]:
+        """Conexión (SQLite) o cursor (DuckDB) para una operación"""
+        if self._duckdb is not None:
+            with self._lock:
+                cursor = self._duckdb.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+            return
+
+        conn = sqlite3.connect(
+            str(self.path),
+            timeout=30.0,
+            isolation_level=None,  # transacciones explícitas con BEGIN/COMMIT
+            detect_types=sqlite3.PARSE_DECLTYPES,
+        )
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[Any]:
+        with self._connect() as conn:
+            conn.execute("BEGIN TRANSACTION")
+            try:
+                yield conn
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def _fetch_dicts(cursor: Any, rows: Sequence[Sequence[Any]]) -> List[Dict[str, Any]]:
+        """Filas como diccionarios, con las columnas JSON ya decodificadas"""
+        names = [column[0] for column in cursor.description]
+        results = []
+        for row in rows:
+            values = dict(zip(names, row))
+            for column in _JSON_COLUMNS & values.keys():
+                if isinstance(values[column], str):
+                    values[column] = json.loads(values[column])
+            results.append(values)
+        return results
+
+    def test_connection(self) -> bool:
+        """Prueba la conexión a la base de datos"""
+        try:
+            with self._connect() as conn:
+                conn.execute("SELECT 1").fetchall()
+            logger.info("Conexión a base de datos local exitosa")
+            return True
+        except Exception as e:
+            logger.error(f"Error al conectar a la base de datos local: {e}")
+            return False
+
+    def create_tables(self):
+        """Crea las tablas necesarias si no existen"""
+        columns = ",\n            ".join(f"{column} {_COLUMN_TYPES[column]}" for column in RESULT_COLUMNS)
+        statements = []
+        if self.backend == "duckdb":
+            statements += [
+                "CREATE SEQUENCE IF NOT EXISTS triage_results_id_seq",
+                "CREATE SEQUENCE IF NOT EXISTS triage_metrics_id_seq",
+            ]
+        statements += [
+            f"""
+            CREATE TABLE IF NOT EXISTS triage_results (
+            {_ID_COLUMN[self.backend]},
+            {columns},
+            timestamp_procesamiento TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_batch_id ON triage_results(batch_id)",
+            "CREATE INDEX IF NOT EXISTS idx_modelo_prompt ON triage_results(modelo_version, prompt_version)",
+            f"""
+            CREATE TABLE IF NOT EXISTS triage_metrics (
+            {_ID_COLUMN[self.backend].replace('triage_results_id_seq', 'triage_metrics_id_seq')},
+            metric_name VARCHAR(100),
+            metric_value DOUBLE,
+            metric_metadata TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+        ]
+        try:
+            with self._connect() as conn:
+                for statement in statements:
+                    conn.execute(statement)
+                # Migración de ficheros creados antes de añadir columnas a RESULT_COLUMNS
+                cursor = conn.execute("SELECT * FROM triage_results LIMIT 0")
+                existing = {description[0] for description in cursor.description}
+                for column in RESULT_COLUMNS:
+                    if column not in existing:
+                        conn.execute(f"ALTER TABLE triage_results ADD COLUMN {column} {_COLUMN_TYPES[column]}")
+            logger.info("Tablas locales creadas/verificadas correctamente")
+        except Exception as e:
+            logger.error(f"Error al crear tablas locales: {e}")
+            raise
+
+    @staticmethod
+    def _local_row(row: Dict[str, Any]) -> List[Any]:
+        """Valores de RESULT_COLUMNS listos para el driver local"""
+        values = []
+        for column in RESULT_COLUMNS:
+            value = row.get(column)
+            if column in _JSON_COLUMNS:
+                value = json.dumps(value if value is not None else [], ensure_ascii=False)
+            elif value is not None and value != value:
+                value = None  # NaT / NaN de pandas
+            elif hasattr(value, "to_pydatetime"):
+                value = value.to_pydatetime()
+            if isinstance(value, datetime):
+                value = value.isoformat(" ")
+            values.append(value)
+        return values
+
+    def _upsert(self, conn: Any, rows: List[Dict[str, Any]]) -> None:
+        """INSERT con la misma cláusula ON CONFLICT que DatabaseManager"""
+        placeholders = ", ".join("?" for _ in RESULT_COLUMNS)
+        insert_sql = (
+            f"INSERT INTO triage_results ({', '.join(RESULT_COLUMNS)}) VALUES ({placeholders})"
+            + _UPSERT_CLAUSE
+        )
+        conn.executemany(insert_sql, [self._local_row(row) for row in rows])
+
+    def save_triage_result(
+        self,
+        incident_id: str,
+        resumen: str,
+        notas: str,
+        fecha_creacion: datetime,
+        causa_raiz_predicha: str,
+        confianza: float,
+        razonamiento: str,
+        keywords_detectadas: List[str],
+        causas_alternativas: List[Dict[str, Any]],
+        incidencias_similares: List[Dict[str, Any]],
+        modelo_version: str,
+        tiempo_procesamiento_ms: int,
+        batch_id: Optional[str] = None,
+        prompt_version: Optional[str] = None,
+        heredada_de: Optional[str] = None,
+        reutilizada_de: Optional[str] = None,
+        tokens_originales: Optional[int] = None,
+        tokens_compactados: Optional[int] = None,
+        endpoint: Optional[str] = None
+    ) -> bool:
+        """Guarda un resultado de triage en la base de datos local"""
+        row = {column: value for column, value in locals().items() if column in RESULT_COLUMNS}
+        try:
+            with self._transaction() as conn:
+                self._upsert(conn, [row])
+            logger.debug(f"Resultado guardado para incidencia {incident_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error al guardar resultado: {e}")
+            return False
+
+    def save_triage_results_bulk(
+        self,
+        results: List[Dict[str, Any]],
+        mode: str = "values",
+        chunk_size: int = 500,
+        failed: Optional[List[Dict[str, Any]]] = None
+    ) -> int:
+        """
+        Guarda varios resultados con la misma semántica que DatabaseManager.save_triage_results_bulk
+
+        En local no hay viaje de red: cada bloque es un executemany dentro de
+        una transacción, sea cual sea `mode` (se acepta por compatibilidad).
+        """
+        if mode not in ("values", "copy"):
+            raise ValueError(f"Modo de guardado masivo no soportado: {mode}")
+
+        latest = {}
+        for row in results:
+            latest.pop(row["incident_id"], None)
+            latest[row["incident_id"]] = row
+        originals = list(latest.values())
+
+        saved = 0
+        for start in range(0, len(originals), max(1, chunk_size)):
+            chunk = originals[start:start + max(1, chunk_size)]
+            try:
+                with self._transaction() as conn:
+                    self._upsert(conn, chunk)
+                saved += len(chunk)
+            except Exception as e:
+                logger.error(f"Error al guardar bloque de {len(chunk)} resultados en local: {e}")
+                if failed is not None:
+                    failed.extend(chunk)
+
+        logger.info(f"Guardado masivo local ({self.backend}): {saved}/{len(originals)} resultados")
+        return saved
+
+    def get_triage_result(self, incident_id: str) -> Optional[Dict[str, Any]]:
+        """Obtiene un resultado de triage por ID de incidencia"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute("SELECT * FROM triage_results WHERE incident_id = ?", [incident_id])
+                rows = self._fetch_dicts(cursor, cursor.fetchall())
+                return rows[0] if rows else None
+        except Exception as e:
+            logger.error(f"Error al obtener resultado: {e}")
+            return None
+
+    def get_batch_results(self, batch_id: str) -> List[Dict[str, Any]]:
+        """Obtiene todos los resultados de un batch"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    "SELECT * FROM triage_results WHERE batch_id = ? ORDER BY timestamp_procesamiento DESC",
+                    [batch_id]
+                )
+                return self._fetch_dicts(cursor, cursor.fetchall())
+        except Exception as e:
+            logger.error(f"Error al obtener resultados del batch: {e}")
+            return []
+
+    def iter_batch_results(
+        self,
+        batch_id: Optional[str],
+        columns: Optional[Sequence[str]] = None,
+        yield_per: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre los resultados de un batch de `yield_per` en `yield_per` filas
+
+        Args:
+            batch_id: ID del batch (None recorre todos los resultados)
+            columns: Columnas a leer (por defecto todas); deben estar en TRIAGE_RESULT_COLUMNS
+            yield_per: Filas por lectura
+
+        Yields:
+            Un diccionario por resultado, ordenados por id
+        """
+        columns = list(columns or TRIAGE_RESULT_COLUMNS)
+        unknown = [column for column in columns if column not in TRIAGE_RESULT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Columnas no válidas: {', '.join(unknown)}")
+
+        query_sql = f"SELECT {', '.join(columns)} FROM triage_results"
+        params: List[Any] = []
+        if batch_id is not None:
+            query_sql += " WHERE batch_id = ?"
+            params.append(batch_id)
+        query_sql += " ORDER BY id"
+
+        with self._connect() as conn:
+            cursor = conn.execute(query_sql, params)
+            while True:
+                rows = cursor.fetchmany(max(1, yield_per))
+                if not rows:
+                    return
+                yield from self._fetch_dicts(cursor, rows)
+
+    def get_processed_incident_ids(
+        self,
+        modelo_versions: List[str],
+        prompt_versions: List[str]
+    ) -> Set[str]:
+        """Obtiene en una sola consulta los IDs ya triados con los modelos y versiones de prompt dados"""
+        if not modelo_versions or not prompt_versions:
+            return set()
+        modelo_placeholders = ", ".join("?" for _ in modelo_versions)
+        prompt_placeholders = ", ".join("?" for _ in prompt_versions)
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    f"SELECT incident_id FROM triage_results "
+                    f"WHERE modelo_version IN ({modelo_placeholders}) AND prompt_version IN ({prompt_placeholders})",
+                    [*modelo_versions, *prompt_versions]
+                ).fetchall()
+                return {row[0] for row in rows}
+        except Exception as e:
+            logger.error(f"Error al obtener incidencias ya procesadas: {e}")
+            return set()
+
+    def get_training_examples(
+        self,
+        categories: List[str],
+        min_confianza: float,
+        exclude_model_prefix: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Obtiene el histórico clasificado por el LLM para entrenar el clasificador local"""
+        if not categories:
+            return []
+        placeholders = ", ".join("?" for _ in categories)
+        query_sql = (
+            f"SELECT resumen, notas, causa_raiz_predicha FROM triage_results "
+            f"WHERE causa_raiz_predicha IN ({placeholders}) AND confianza >= ? "
+            "AND heredada_de IS NULL AND reutilizada_de IS NULL"
+        )
+        params: List[Any] = [*categories, min_confianza]
+        if exclude_model_prefix:
+            query_sql += " AND modelo_version NOT LIKE ?"
+            params.append(exclude_model_prefix + "%")
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute(query_sql, params)
+                return self._fetch_dicts(cursor, cursor.fetchall())
+        except Exception as e:
+            logger.error(f"Error al obtener ejemplos de entrenamiento: {e}")
+            return []
+
+    def refresh_rollups(self, full: bool = False, overlap_minutes: int = 5) -> int:
+        """Sin rollups en local: las consultas se hacen directamente sobre triage_results"""
+        return 0
+
+    def save_metric(
+        self,
+        metric_name: str,
+        metric_value: float,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        """Guarda una métrica en la base de datos local"""
+        try:
+            with self._transaction() as conn:
+                conn.execute(
+                    "INSERT INTO triage_metrics (metric_name, metric_value, metric_metadata) VALUES (?, ?, ?)",
+                    [metric_name, metric_value, json.dumps(metadata or {}, default=str)]
+                )
+            return True
+        except Exception as e:
+            logger.error(f"Error al guardar métrica: {e}")
+            return False
+
+    def sync_to(
+        self,
+        target: Any,
+        batch_id: Optional[str] = None,
+        chunk_size: int = 1000,
+        mode: str = "copy",
+        failed: Optional[List[Dict[str, Any]]] = None
+    ) -> int:
+        """
+        Sincroniza en bloque los resultados locales con otra base de datos (p. ej. PostgreSQL)
+
+        Usa el upsert masivo del destino, así que es idempotente: repetir la
+        sincronización reescribe las mismas filas. timestamp_procesamiento toma
+        la hora de la sincronización, como en cualquier upsert.
+
+        Args:
+            target: DatabaseManager (o cualquier objeto con save_triage_results_bulk)
+            batch_id: Sincronizar solo este batch (por defecto todos)
+            chunk_size: Filas por transacción en el destino
+            mode: Modo de guardado masivo del destino ("values" o "copy")
+            failed: Lista opcional donde se añaden las filas que no se pudieron guardar
+
+        Returns:
+            Número de resultados sincronizados
+        """
+        synced = 0
+        chunk: List[Dict[str, Any]] = []
+        for row in self.iter_batch_results(batch_id, columns=RESULT_COLUMNS, yield_per=chunk_size):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                synced += target.save_triage_results_bulk(chunk, mode=mode, chunk_size=chunk_size, failed=failed)
+                chunk = []
+        if chunk:
+            synced += target.save_triage_results_bulk(chunk, mode=mode, chunk_size=chunk_size, failed=failed)
+        logger.info(f"Sincronizados {synced} resultados desde {self.path}")
+        return synced
+
+    def close(self):
+        """Cierra la base de datos local"""
+        if self._duckdb is not None:
+            self._duckdb.close()
+            self._duckdb = None
+        logger.info("Base de datos local cerrada")
@@ -0,0 +1,419 @@
+"""
+Indexación de los embeddings de incidencias en OpenSearch con la API bulk
+Los documentos se serializan una vez a NDJSON, se agrupan en peticiones de un
+tamaño máximo en bytes y varias peticiones se envían en paralelo; de cada
+respuesta solo se reintentan los documentos rechazados (429/5xx). El _id de
+cada documento es el ticket_id, de modo que reindexar una incidencia la
+sustituye (upsert) y las ejecuciones incrementales solo envían lo cambiado.
+Los documentos rechazados de forma permanente (4xx, p. ej. un mapping
+incompatible) se registran aparte y no bloquean la marca incremental
+"""
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+import numpy as np
+from config import config
+from .vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+
+def _retryable(status: Any) -> bool:
+    """Rechazos transitorios de un documento o de una petición completa (saturación o error del clúster)"""
+    return not isinstance(status, int) or status == 429 or status >= 500
+
+
+def create_opensearch_client(endpoint: Optional[str] = None, region: Optional[str] = None, timeout: int = 60) -> Any:
+    """
+    Crea el cliente de opensearch-py
+
+    Los endpoints de AWS (*.amazonaws.com) se firman con SigV4 (servicio "aoss"
+    para OpenSearch Serverless, "es" para dominios gestionados); cualquier otro
+    (p. ej. un contenedor local en http://localhost:9200) se usa sin autenticación.
+
+    Args:
+        endpoint: URL del clúster (por defecto usa config)
+        region: Región AWS para la firma (por defecto usa config)
+        timeout: Timeout de cada petición en segundos
+    """
+    from opensearchpy import OpenSearch, RequestsHttpConnection
+
+    endpoint = endpoint or config.OPENSEARCH_ENDPOINT
+    if "://" not in endpoint:
+        endpoint = f"https://{endpoint}"
+    url = urlparse(endpoint)
+    use_ssl = url.scheme == "https"
+    kwargs: Dict[str, Any] = {
+        "hosts": [{"host": url.hostname, "port": url.port or (443 if use_ssl else 80)}],
+        "use_ssl": use_ssl,
+        "verify_certs": use_ssl,
+        "connection_class": RequestsHttpConnection,
+        "timeout": timeout,
+        "http_compress": True,
+    }
+    if url.hostname and url.hostname.endswith(".amazonaws.com"):
+        import boto3
+        from requests_aws4auth import AWS4Auth
+
+        credentials = boto3.Session().get_credentials()
+        service = "aoss" if ".aoss." in url.hostname else "es"
+        kwargs["http_auth"] = AWS4Auth(
+            credentials.access_key,
+            credentials.secret_key,
+            region or config.AWS_REGION,
+            service,
+            session_token=credentials.token
+        )
+    return OpenSearch(**kwargs)
+
+
+def index_body(dimensions: int) -> Dict[str, Any]:
+    """Ajustes y mapping del índice: vector k-NN (HNSW) más los campos de la incidencia"""
+    return {
+        "settings": {"index": {"knn": True}},
+        "mappings": {
+            "properties": {
+                "ticket_id": {"type": "keyword"},
+                # Vectores normalizados: el orden por distancia L2 coincide con el de similitud coseno
+                "embedding": {
+                    "type": "knn_vector",
+                    "dimension": dimensions,
+                    "method": {"name": "hnsw", "engine": "faiss", "space_type": "l2"},
+                },
+                "content_hash": {"type": "keyword"},
+                "updated_at": {"type": "date", "format": "epoch_millis"},
+            }
+        },
+    }
+
+
+def iter_store_documents(
+    store: VectorStore,
+    since: float = 0.0,
+    batch_size: int = 1000
+) -> Iterator[Tuple[str, Dict[str, Any], float]]:
+    """
+    Documentos de las incidencias del almacén actualizadas después de `since`
+
+    Yields:
+        Tuplas (ticket_id, documento, updated_at) en orden de actualización
+    """
+    batch: List[Tuple[str, int, str, float]] = []
+
+    def _documents():
+        matrix = store.matrix()
+        rows = np.asarray([row for _, row, _, _ in batch], dtype=np.int64)
+        # Redondeo a 7 decimales: precisión de float32 con la mitad de bytes en el JSON
+        vectors = np.round(np.asarray(matrix[rows], dtype=np.float64), 7)
+        for (incident_id, _, text_hash, updated_at), vector in zip(batch, vectors):
+            yield incident_id, {
+                "ticket_id": incident_id,
+                "embedding": vector.tolist(),
+                "content_hash": text_hash,
+                "updated_at": int(updated_at * 1000),
+            }, updated_at
+
+    for entry in store.changed_since(since, page_size=batch_size):
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            yield from _documents()
+            batch = []
+    if batch:
+        yield from _documents()
+
+
+class FakeOpenSearchClient:
+    """
+    Cliente de OpenSearch en memoria para verificar la indexación sin clúster
+
+    Implementa bulk(body=...) e indices.exists/create. Rechaza con 429 una
+    fracción de los documentos de cada petición (saturación simulada) y con
+    400 los IDs de `reject_ids` (rechazo permanente, p. ej. mapping incompatible).
+    """
+
+    def __init__(
+        self,
+        throttle_ratio: float = 0.0,
+        reject_ids: Iterable[str] = (),
+        latency: float = 0.0,
+        seed: int = 0
+    ):
+        """
+        Args:
+            throttle_ratio: Fracción de documentos rechazados con 429 en cada petición
+            reject_ids: IDs que se rechazan siempre con 400
+            latency: Segundos que tarda cada petición bulk
+            seed: Semilla del generador de rechazos
+        """
+        self.throttle_ratio = throttle_ratio
+        self.latency = latency
+        self.reject_ids = set(reject_ids)
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.requests = 0
+        self.max_concurrent = 0
+        self._concurrent = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._indices: Set[str] = set()
+        self.indices = SimpleNamespace(
+            exists=lambda index: index in self._indices,
+            create=lambda index, body: self._indices.add(index),
+        )
+
+    def bulk(self, body: bytes) -> Dict[str, Any]:
+        """Procesa un cuerpo NDJSON de operaciones index como la API bulk"""
+        with self._lock:
+            self.requests += 1
+            self._concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self._concurrent)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            lines = body.decode("utf-8").splitlines()
+            items = []
+            for action_line, source_line in zip(lines[::2], lines[1::2]):
+                doc_id = json.loads(action_line)["index"]["_id"]
+                with self._lock:
+                    if doc_id in self.reject_ids:
+                        status, error = 400, {"type": "mapper_parsing_exception"}
+                    elif self._random.random() < self.throttle_ratio:
+                        status, error = 429, {"type": "es_rejected_execution_exception"}
+                    else:
+                        self.documents[doc_id] = json.loads(source_line)
+                        status, error = 201, None
+                result: Dict[str, Any] = {"_id": doc_id, "status": status}
+                if error:
+                    result["error"] = error
+                items.append({"index": result})
+            return {"errors": any(item["index"]["status"] >= 300 for item in items), "items": items}
+        finally:
+            with self._lock:
+                self._concurrent -= 1
+
+
+class OpenSearchIndexer:
+    """
+    Envía documentos a un índice de OpenSearch con peticiones bulk paralelas
+
+    El cliente solo necesita un método bulk(body=...) compatible con opensearch-py,
+    por lo que puede sustituirse por un falso en memoria para verificar el flujo.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        index: str,
+        max_bytes: int = 5_000_000,
+        max_docs: int = 500,
+        workers: int = 4,
+        max_retries: int = 5,
+        backoff: float = 1.0
+    ):
+        """
+        Inicializa el indexador
+
+        Args:
+            client: Cliente de OpenSearch (ver create_opensearch_client)
+            index: Nombre del índice destino
+            max_bytes: Tamaño máximo en bytes del cuerpo de cada petición bulk
+            max_docs: Documentos máximos por petición bulk
+            workers: Peticiones bulk simultáneas
+            max_retries: Reintentos de los documentos rechazados
+            backoff: Espera inicial entre reintentos en segundos (se duplica en cada uno)
+        """
+        self.client = client
+        self.index = index
+        self.max_bytes = max(1, max_bytes)
+        self.max_docs = max(1, max_docs)
+        self.workers = max(1, workers)
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.sent = 0
+        self.indexed = 0
+        self.retried = 0
+        # Fallos transitorios con los reintentos agotados (se reenvían en la próxima ejecución)
+        self.failed: List[Tuple[str, str]] = []
+        # Rechazos permanentes de un documento concreto (4xx): reenviarlo no cambiaría el resultado
+        self.rejected: List[Tuple[str, str]] = []
+        self.requests = 0
+        self.bytes_sent = 0
+
+    def ensure_index(self, dimensions: int) -> bool:
+        """Crea el índice con el mapping k-NN si no existe; devuelve True si lo ha creado"""
+        if self.client.indices.exists(index=self.index):
+            return False
+        self.client.indices.create(index=self.index, body=index_body(dimensions))
+        logger.info(f"Índice {self.index} creado ({dimensions} dimensiones)")
+        return True
+
+    def _serialize(self, doc_id: str, document: Dict[str, Any]) -> bytes:
+        """Par de líneas NDJSON de una operación index con _id = ticket_id"""
+        action = json.dumps({"index": {"_index": self.index, "_id": doc_id}}, separators=(",", ":"))
+        source = json.dumps(document, ensure_ascii=False, separators=(",", ":"))
+        return f"{action}\n{source}\n".encode("utf-8")
+
+    def _chunks(self, documents: Iterable[Tuple[str, Dict[str, Any]]]) -> Iterator[List[Tuple[str, bytes]]]:
+        """Agrupa los documentos serializados en cuerpos de hasta max_bytes y max_docs"""
+        chunk: List[Tuple[str, bytes]] = []
+        size = 0
+        for doc_id, document in documents:
+            line = self._serialize(str(doc_id), document)
+            if chunk and (size + len(line) > self.max_bytes or len(chunk) >= self.max_docs):
+                yield chunk
+                chunk, size = [], 0
+            chunk.append((str(doc_id), line))
+            size += len(line)
+        if chunk:
+            yield chunk
+
+    def _send(self, chunk: List[Tuple[str, bytes]]) -> Dict[str, Any]:
+        """
+        Envía una petición bulk y reintenta solo los documentos rechazados
+
+        Returns:
+            Diccionario con indexed (IDs), failed y rejected ((ID, motivo)), retried, requests y bytes
+        """
+        outcome: Dict[str, Any] = {"indexed": [], "failed": [], "rejected": [], "retried": 0, "requests": 0, "bytes": 0}
+        pending = chunk
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self.backoff * (2 ** (attempt - 1)))
+                outcome["retried"] += len(pending)
+            body = b"".join(line for _, line in pending)
+            outcome["requests"] += 1
+            outcome["bytes"] += len(body)
+            try:
+                response = self.client.bulk(body=body)
+            except Exception as e:
+                status = getattr(e, "status_code", None)
+                if not _retryable(status):
+                    # Un error de la petición completa (credenciales, permisos...) no es culpa
+                    # de los documentos: cuentan como fallidos y se reenviarán
+                    outcome["failed"].extend((doc_id, f"{status}: {e}") for doc_id, _ in pending)
+                    return outcome
+                # Conexión caída, timeout o saturación: se reintenta la petición entera
+                logger.warning(f"Petición bulk de {len(pending)} documentos fallida (intento {attempt + 1}): {e}")
+                continue
+
+            rejected = []
+            for (doc_id, line), item in zip(pending, response.get("items", [])):
+                result = next(iter(item.values()))
+                status = result.get("status", 500)
+                if status < 300:
+                    outcome["indexed"].append(doc_id)
+                elif _retryable(status):
+                    rejected.append((doc_id, line))
+                else:
+                    outcome["rejected"].append((doc_id, f"{status}: {result.get('error')}"))
+            if not rejected:
+                return outcome
+            pending = rejected
+
+        outcome["failed"].extend((doc_id, "reintentos agotados") for doc_id, _ in pending)
+        return outcome
+
+    def _collect(self, outcome: Dict[str, Any]) -> None:
+        self.indexed += len(outcome["indexed"])
+        self.failed.extend(outcome["failed"])
+        self.rejected.extend(outcome["rejected"])
+        self.retried += outcome["retried"]
+        self.requests += outcome["requests"]
+        self.bytes_sent += outcome["bytes"]
+
+    def index_documents(self, documents: Iterable[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Indexa documentos en streaming (como mucho 2 x workers peticiones en memoria)
+
+        Args:
+            documents: Pares (ticket_id, documento)
+
+        Returns:
+            Contadores acumulados (ver stats)
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            in_flight = set()
+            for chunk in self._chunks(documents):
+                self.sent += len(chunk)
+                in_flight.add(executor.submit(self._send, chunk))
+                if len(in_flight) >= 2 * self.workers:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._collect(future.result())
+            for future in in_flight:
+                self._collect(future.result())
+        return self.stats()
+
+    def index_store(self, store: VectorStore, full: bool = False) -> Dict[str, Any]:
+        """
+        Indexa las incidencias del almacén de vectores cambiadas desde la última ejecución
+
+        La marca de la última actualización indexada se guarda en el propio
+        almacén, por índice. Si algún documento falla de forma transitoria
+        (reintentos agotados), la marca no avanza más allá de él y la siguiente
+        ejecución lo vuelve a enviar. Los rechazos permanentes no la retienen:
+        se guardan en el almacén (ver rejected_documents) hasta que el documento
+        se indexe correctamente.
+
+        Args:
+            store: Almacén de vectores
+            full: Reindexar todas las incidencias ignorando la marca
+        """
+        key = f"opensearch:{self.index}:updated_at"
+        since = 0.0 if full else float(store.get_meta(key) or 0.0)
+        updated: Dict[str, float] = {}
+
+        def _documents():
+            for doc_id, document, updated_at in iter_store_documents(store, since):
+                updated[doc_id] = updated_at
+                yield doc_id, document
+
+        failed_before = len(self.failed)
+        rejected_before = len(self.rejected)
+        self.index_documents(_documents())
+
+        failed = {doc_id for doc_id, _ in self.failed[failed_before:]}
+        rejected = dict(self.rejected[rejected_before:])
+        stored = self.rejected_documents(store)
+        # Los reenviados que ya no fallan dejan de estar rechazados
+        cleared = [doc_id for doc_id in updated if doc_id in stored and doc_id not in failed]
+        if rejected or cleared:
+            for doc_id in cleared:
+                del stored[doc_id]
+            stored.update(rejected)
+            store.set_meta(self._rejected_key, json.dumps(stored, ensure_ascii=False))
+        if rejected:
+            logger.warning(f"{len(rejected)} documentos rechazados de forma permanente por {self.index}")
+
+        failed_at = [updated[doc_id] for doc_id in failed if doc_id in updated]
+        limit = min(failed_at) if failed_at else float("inf")
+        watermark = max((updated_at for updated_at in updated.values() if updated_at < limit), default=None)
+        if watermark is not None and watermark > since:
+            store.set_meta(key, repr(watermark))
+        return self.stats()
+
+    @property
+    def _rejected_key(self) -> str:
+        return f"opensearch:{self.index}:rechazados"
+
+    def rejected_documents(self, store: VectorStore) -> Dict[str, str]:
+        """Documentos rechazados de forma permanente por el índice (ticket_id -> motivo)"""
+        value = store.get_meta(self._rejected_key)
+        return json.loads(value) if value else {}
+
+    def stats(self) -> Dict[str, Any]:
+        """Documentos enviados, indexados, reintentados, fallidos y rechazados; peticiones y bytes"""
+        return {
+            "enviados": self.sent,
+            "indexados": self.indexed,
+            "reintentados": self.retried,
+            "fallidos": len(self.failed),
+            "rechazados": len(self.rejected),
+            "peticiones": self.requests,
+            "bytes": self.bytes_sent,
+        }
@@ -0,0 +1,254 @@
+"""
+Caché persistente en disco de respuestas del LLM
+Direccionada por contenido (hash de las entradas normalizadas, modelo,
+temperatura y versión del prompt) y respaldada por SQLite en modo WAL para
+poder compartirse entre varios procesos del mismo host
+"""
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+from config import config
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """Normaliza un texto para la clave de caché (espacios colapsados)"""
+    if value is None:
+        return ""
+    return _WHITESPACE.sub(" ", str(value)).strip()
+
+
+class ResponseCache:
+    """Caché de respuestas con expulsión por TTL, número de entradas y tamaño (LRU)"""
+
+    # Frecuencia (en escrituras) con la que se ejecuta la expulsión
+    EVICT_EVERY = 100
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        max_entries: int = 100_000,
+        max_bytes: int = 512 * 1024 * 1024,
+        ttl_seconds: Optional[float] = 30 * 24 * 3600
+    ):
+        """
+        Inicializa la caché
+
+        Args:
+            path: Ruta del fichero SQLite
+            max_entries: Número máximo de entradas antes de expulsar las menos usadas
+            max_bytes: Tamaño máximo de las respuestas almacenadas
+            ttl_seconds: Antigüedad máxima de una entrada (None = sin caducidad)
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_access ON llm_responses(last_access)")
+        logger.info(f"Caché de respuestas inicializada en {self.path}")
+
+    @classmethod
+    def from_config(cls) -> "ResponseCache":
+        """Crea la caché con los parámetros de configuración"""
+        return cls(
+            path=config.RESPONSE_CACHE_PATH,
+            max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+            max_bytes=config.RESPONSE_CACHE_MAX_MB * 1024 * 1024,
+            ttl_seconds=config.RESPONSE_CACHE_TTL_HOURS * 3600 if config.RESPONSE_CACHE_TTL_HOURS > 0 else None
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión SQLite propia de cada hilo"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(
+        inputs: Dict[str, Any],
+        model_id: str,
+        temperature: float,
+        prompt_version: str
+    ) -> str:
+        """
+        Calcula la clave de caché
+
+        Args:
+            inputs: Entradas del prompt que determinan la respuesta
+            model_id: ID del modelo
+            temperature: Temperatura de generación
+            prompt_version: Versión/huella de la plantilla de prompt
+
+        Returns:
+            Hash SHA-256 hexadecimal
+        """
+        payload = {
+            "inputs": {name: normalize_text(value) for name, value in sorted(inputs.items())},
+            "model_id": model_id,
+            "temperature": float(temperature),
+            "prompt_version": prompt_version,
+        }
+        return hashlib.sha256(
+            json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Obtiene una respuesta cacheada o None si no existe o ha caducado"""
+        now = time.time()
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                with self._lock:
+                    self.misses += 1
+                return None
+            conn.execute("UPDATE llm_responses SET last_access = ? WHERE key = ?", (now, key))
+            with self._lock:
+                self.hits += 1
+            return json.loads(row[0])
+        except sqlite3.Error as e:
+            logger.warning(f"Error al leer de la caché de respuestas: {e}")
+            with self._lock:
+                self.misses += 1
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        """Guarda una respuesta en la caché"""
+        now = time.time()
+        data = json.dumps(value, ensure_ascii=False, default=str)
+        try:
+            self._connection().execute(
+                """
+                INSERT INTO llm_responses (key, value, size, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    value = excluded.value,
+                    size = excluded.size,
+                    created_at = excluded.created_at,
+                    last_access = excluded.last_access
+                """,
+                (key, data, len(data), now, now)
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Error al escribir en la caché de respuestas: {e}")
+            return
+
+        with self._lock:
+            self.writes += 1
+            self._writes_since_evict += 1
+            run_eviction = self._writes_since_evict >= self.EVICT_EVERY
+            if run_eviction:
+                self._writes_since_evict = 0
+        if run_eviction:
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        Expulsa entradas caducadas y las menos usadas por encima de los límites
+
+        Returns:
+            Número de entradas eliminadas
+        """
+        removed = 0
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.ttl_seconds is not None:
+                    removed += conn.execute(
+                        "DELETE FROM llm_responses WHERE created_at < ?",
+                        (time.time() - self.ttl_seconds,)
+                    ).rowcount
+                if self.max_entries:
+                    removed += conn.execute(
+                        """
+                        DELETE FROM llm_responses WHERE key IN (
+                            SELECT key FROM llm_responses
+                            ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                        )
+                        """,
+                        (self.max_entries,)
+                    ).rowcount
+                if self.max_bytes:
+                    removed += conn.execute(
+                        """
+                        DELETE FROM llm_responses WHERE key IN (
+                            SELECT key FROM (
+                                SELECT key, SUM(size) OVER (ORDER BY last_access DESC, key) AS acumulado
+                                FROM llm_responses
+                            ) WHERE acumulado > ?
+                        )
+                        """,
+                        (self.max_bytes,)
+                    ).rowcount
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"Error al expulsar entradas de la caché de respuestas: {e}")
+            return 0
+
+        if removed:
+            with self._lock:
+                self.evictions += removed
+            logger.info(f"Caché de respuestas: {removed} entradas expulsadas")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Devuelve los contadores de la caché"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self) -> None:
+        """Cierra la conexión del hilo actual"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
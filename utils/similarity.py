@@ -0,0 +1,157 @@
+"""
+Búsqueda local de incidencias similares sobre los embeddings almacenados
+Similitud coseno exacta con vectores float32 normalizados: el histórico se
+recorre por bloques (producto de matrices por bloque y top-k con argpartition)
+y cada bloque se puntúa contra todas las consultas de un lote a la vez
+"""
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Normaliza cada fila a norma 1 en float32 (similitud coseno = producto escalar)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def merge_top_k(
+    best_scores: np.ndarray,
+    best_positions: np.ndarray,
+    scores: np.ndarray,
+    positions: np.ndarray,
+    k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Combina el top-k acumulado de cada consulta con candidatos nuevos (sin ordenar)"""
+    all_scores = np.concatenate([best_scores, scores], axis=1)
+    all_positions = np.concatenate([best_positions, positions], axis=1)
+    if all_scores.shape[1] > k:
+        keep = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+        all_scores = np.take_along_axis(all_scores, keep, axis=1)
+        all_positions = np.take_along_axis(all_positions, keep, axis=1)
+    return all_scores, all_positions
+
+
+def collect_neighbours(
+    scores: np.ndarray,
+    positions: np.ndarray,
+    ids: Sequence[str],
+    k: int,
+    exclude: Optional[Sequence[Optional[str]]] = None,
+    min_score: float = -1.0
+) -> List[List[Tuple[str, float]]]:
+    """Ordena los candidatos de cada consulta y aplica exclusión, similitud mínima y k"""
+    order = np.argsort(-scores, axis=1)
+    scores = np.take_along_axis(scores, order, axis=1)
+    positions = np.take_along_axis(positions, order, axis=1)
+
+    results = []
+    for query, (row_scores, row_positions) in enumerate(zip(scores, positions)):
+        excluded = exclude[query] if exclude is not None else None
+        neighbours = []
+        seen = set()
+        for score, position in zip(row_scores, row_positions):
+            if position < 0 or score < min_score:
+                continue
+            incident_id = ids[position]
+            if incident_id == excluded or incident_id in seen:
+                continue
+            seen.add(incident_id)
+            neighbours.append((incident_id, float(score)))
+            if len(neighbours) == k:
+                break
+        results.append(neighbours)
+    return results
+
+
+class SimilarityIndex:
+    """
+    Índice exacto de similitud sobre las filas de un VectorStore
+
+    No copia el histórico a memoria: guarda la lista de incidencias y sus
+    filas, y lee del memmap un bloque de `block_size` vectores cada vez.
+    """
+
+    def __init__(self, store, block_size: int = 65536):
+        """
+        Construye el índice con las incidencias ya almacenadas
+
+        Args:
+            store: VectorStore con vectores normalizados
+            block_size: Vectores del histórico puntuados por cada producto de matrices
+        """
+        self.store = store
+        self.block_size = max(1, block_size)
+        ids, rows = store.items()
+        self.ids: List[str] = ids
+        self._rows: List[int] = rows.tolist()
+        self._positions: Dict[str, int] = {incident_id: position for position, incident_id in enumerate(ids)}
+        self._row_array: Optional[np.ndarray] = None
+        logger.info(f"Índice de similitud construido con {len(self.ids)} incidencias")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def update(self, incident_ids: Sequence[str]) -> None:
+        """Incorpora (o actualiza) incidencias recién guardadas en el almacén"""
+        for incident_id, row in self.store.positions(incident_ids).items():
+            position = self._positions.get(incident_id)
+            if position is None:
+                self._positions[incident_id] = len(self.ids)
+                self.ids.append(incident_id)
+                self._rows.append(row)
+            else:
+                self._rows[position] = row
+        self._row_array = None
+
+    def _scan(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k exacto (sin ordenar) de cada consulta: puntuaciones y posiciones en self.ids"""
+        if self._row_array is None:
+            self._row_array = np.asarray(self._rows, dtype=np.int64)
+        matrix = self.store.matrix()
+        best_scores = np.empty((queries.shape[0], 0), dtype=np.float32)
+        best_positions = np.empty((queries.shape[0], 0), dtype=np.int64)
+        for start in range(0, len(self._row_array), self.block_size):
+            block = np.asarray(matrix[self._row_array[start:start + self.block_size]])
+            scores = queries @ block.T
+            top = min(k, scores.shape[1])
+            candidates = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+            best_scores, best_positions = merge_top_k(
+                best_scores,
+                best_positions,
+                np.take_along_axis(scores, candidates, axis=1),
+                candidates + start,
+                k
+            )
+        return best_scores, best_positions
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        exclude: Optional[Sequence[Optional[str]]] = None,
+        min_score: float = -1.0
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Incidencias más similares a cada consulta
+
+        Args:
+            queries: Matriz de consultas (n x dim); se normaliza
+            k: Vecinos por consulta
+            exclude: ID a excluir de los resultados de cada consulta (normalmente la propia incidencia)
+            min_score: Similitud mínima para devolver un vecino
+
+        Returns:
+            Por cada consulta, lista de (incident_id, similitud) de mayor a menor
+        """
+        if len(queries) == 0:
+            return []
+        if not self.ids or k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        extra = 1 if exclude is not None else 0
+        scores, positions = self._scan(normalize_rows(queries), k + extra)
+        return collect_neighbours(scores, positions, self.ids, k, exclude, min_score)
@@ -0,0 +1,22 @@
+"""
+Estimación aproximada de tokens para presupuestos de prompt
+"""
+import math
+
+# Caracteres por token aproximados para texto en español con jerga técnica
+CHARS_PER_TOKEN = 3.5
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estima el número de tokens de un texto sin llamar al tokenizador del modelo
+
+    Args:
+        text: Texto a medir
+
+    Returns:
+        Número aproximado de tokens
+    """
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
@@ -0,0 +1,250 @@
+"""
+Almacén local de embeddings de incidencias
+Los vectores se añaden a un fichero float32 de solo anexado que se lee con
+memmap (el arranque no carga nada en RAM); un índice SQLite en modo WAL asocia
+cada incident_id a su fila y al hash del contenido embebido
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class VectorStore:
+    """
+    Vectores float32 de dimensión fija, direccionables por incident_id
+
+    Una fila nunca se reescribe: si el contenido de una incidencia cambia, su
+    nuevo vector se anexa y el índice pasa a apuntar a la fila nueva. Varias
+    incidencias con el mismo contenido comparten fila. Admite lectores
+    concurrentes pero un único proceso escritor por directorio.
+    """
+
+    VECTORS_FILE = "vectors.f32"
+    INDEX_FILE = "index.sqlite3"
+
+    def __init__(self, directory: Union[str, Path], dim: int, model_id: str = ""):
+        """
+        Abre (o crea) el almacén
+
+        Args:
+            directory: Directorio del almacén
+            dim: Dimensión de los vectores
+            model_id: Modelo de embeddings; no se pueden mezclar vectores de modelos distintos
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.model_id = model_id
+        self.vectors_path = self.directory / self.VECTORS_FILE
+        self.index_path = self.directory / self.INDEX_FILE
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._memmap: Optional[np.memmap] = None
+
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS vectors (
+                incident_id TEXT PRIMARY KEY,
+                row INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_vectors_hash ON vectors(content_hash)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        if not meta:
+            conn.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?)",
+                [("dim", str(dim)), ("model_id", model_id)]
+            )
+        elif int(meta["dim"]) != dim or (model_id and meta["model_id"] != model_id):
+            raise ValueError(
+                f"El almacén {self.directory} contiene vectores de {meta['model_id']} ({meta['dim']} dims); "
+                f"no se pueden añadir de {model_id} ({dim} dims)"
+            )
+
+        self._rows = self._recover_tail()
+        logger.info(f"Almacén de vectores abierto en {self.directory}: {self._rows} filas, {len(self)} incidencias")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión SQLite propia de cada hilo"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _recover_tail(self) -> int:
+        """Descarta una fila escrita a medias (p. ej. tras una caída) y devuelve las filas completas"""
+        row_bytes = self.dim * 4
+        size = self.vectors_path.stat().st_size if self.vectors_path.exists() else 0
+        if size % row_bytes:
+            logger.warning(f"Fila incompleta al final de {self.vectors_path}; se descarta")
+            with open(self.vectors_path, "r+b") as handle:
+                handle.truncate(size - size % row_bytes)
+        return size // row_bytes
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    @property
+    def rows(self) -> int:
+        """Filas del fichero de vectores (incluidas las que ya no referencia ninguna incidencia)"""
+        return self._rows
+
+    def matrix(self) -> np.ndarray:
+        """Todas las filas del fichero como memmap de solo lectura (rows x dim)"""
+        with self._lock:
+            if self._rows == 0:
+                return np.empty((0, self.dim), dtype=np.float32)
+            if self._memmap is None or self._memmap.shape[0] != self._rows:
+                self._memmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self._rows, self.dim))
+            return self._memmap
+
+    def content_hashes(self, incident_ids: Sequence[str]) -> Dict[str, str]:
+        """Hash del contenido embebido de cada incidencia ya almacenada"""
+        conn = self._connection()
+        result = {}
+        for start in range(0, len(incident_ids), 500):
+            chunk = list(incident_ids[start:start + 500])
+            placeholders = ", ".join("?" for _ in chunk)
+            result.update(conn.execute(
+                f"SELECT incident_id, content_hash FROM vectors WHERE incident_id IN ({placeholders})", chunk
+            ).fetchall())
+        return result
+
+    def rows_for_hashes(self, content_hashes: Sequence[str]) -> Dict[str, int]:
+        """Fila de un vector ya calculado para cada hash de contenido conocido"""
+        conn = self._connection()
+        result = {}
+        unique = list(dict.fromkeys(content_hashes))
+        for start in range(0, len(unique), 500):
+            chunk = unique[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            result.update(conn.execute(
+                f"SELECT content_hash, MIN(row) FROM vectors WHERE content_hash IN ({placeholders}) GROUP BY content_hash",
+                chunk
+            ).fetchall())
+        return result
+
+    def append(self, vectors: np.ndarray) -> int:
+        """
+        Anexa vectores al fichero
+
+        Args:
+            vectors: Matriz (n x dim)
+
+        Returns:
+            Fila del primer vector anexado
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            raise ValueError(f"Se esperaban vectores de {self.dim} dimensiones, recibido {vectors.shape}")
+        with self._lock:
+            start = self._rows
+            with open(self.vectors_path, "ab") as handle:
+                handle.write(vectors.tobytes())
+                handle.flush()
+                os.fsync(handle.fileno())
+            self._rows += vectors.shape[0]
+            return start
+
+    def assign(self, entries: Sequence[Tuple[str, int, str]]) -> None:
+        """
+        Apunta incidencias a filas ya escritas, en una única transacción
+
+        Args:
+            entries: Tuplas (incident_id, fila, hash del contenido)
+        """
+        if not entries:
+            return
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                """
+                INSERT INTO vectors (incident_id, row, content_hash, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (incident_id) DO UPDATE SET
+                    row = excluded.row, content_hash = excluded.content_hash, updated_at = excluded.updated_at
+                """,
+                [(incident_id, int(row), content_hash, now) for incident_id, row, content_hash in entries]
+            )
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def add(self, incident_ids: Sequence[str], content_hashes: Sequence[str], vectors: np.ndarray) -> None:
+        """Anexa los vectores y los asocia a sus incidencias"""
+        start = self.append(vectors)
+        self.assign([
+            (incident_id, start + offset, content_hash)
+            for offset, (incident_id, content_hash) in enumerate(zip(incident_ids, content_hashes))
+        ])
+
+    def positions(self, incident_ids: Sequence[str]) -> Dict[str, int]:
+        """Fila actual de cada incidencia almacenada"""
+        conn = self._connection()
+        result = {}
+        for start in range(0, len(incident_ids), 500):
+            chunk = list(incident_ids[start:start + 500])
+            placeholders = ", ".join("?" for _ in chunk)
+            result.update(conn.execute(
+                f"SELECT incident_id, row FROM vectors WHERE incident_id IN ({placeholders})", chunk
+            ).fetchall())
+        return result
+
+    def get(self, incident_ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Vectores de las incidencias indicadas que estén almacenadas"""
+        positions = self.positions(incident_ids)
+        matrix = self.matrix()
+        return {incident_id: np.array(matrix[row]) for incident_id, row in positions.items()}
+
+    def items(self) -> Tuple[List[str], np.ndarray]:
+        """IDs de todas las incidencias almacenadas y sus filas, ordenados por fila"""
+        rows = self._connection().execute("SELECT incident_id, row FROM vectors ORDER BY row, incident_id").fetchall()
+        return [incident_id for incident_id, _ in rows], np.array([row for _, row in rows], dtype=np.int64)
+
+    def changed_since(self, since: float = 0.0, page_size: int = 1000) -> Iterator[Tuple[str, int, str, float]]:
+        """
+        Incidencias asociadas a un vector después de `since`, en orden de actualización
+
+        Yields:
+            Tuplas (incident_id, fila, hash del contenido, updated_at)
+        """
+        conn = self._connection()
+        columns = "SELECT incident_id, row, content_hash, updated_at FROM vectors"
+        order = "ORDER BY updated_at, incident_id LIMIT ?"
+        page = conn.execute(f"{columns} WHERE updated_at > ? {order}", (since, page_size)).fetchall()
+        while page:
+            yield from page
+            # Paginación por clave (updated_at, incident_id): las filas de una misma transacción comparten updated_at
+            last_id, last_at = page[-1][0], page[-1][3]
+            page = conn.execute(
+                f"{columns} WHERE updated_at > ? OR (updated_at = ? AND incident_id > ?) {order}",
+                (last_at, last_at, last_id, page_size)
+            ).fetchall()
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """Valor guardado en la tabla meta del almacén (p. ej. marcas de sincronización)"""
+        row = self._connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        """Guarda un valor en la tabla meta del almacén"""
+        self._connection().execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
@@ -0,0 +1,230 @@
+"""
+Escritura diferida (write-behind) de resultados de triage
+Un hilo de fondo toma los resultados de una cola acotada y los guarda en bloque
+por tamaño o por tiempo; las filas que no se pueden guardar se vuelcan a un
+fichero JSONL local y se reenvían al inicio de la siguiente ejecución
+(replay_spilled_rows)
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteBehindWriter:
+    """
+    Cola acotada con un hilo escritor que guarda en bloque en la base de datos
+
+    put bloquea cuando la cola está llena (backpressure: la clasificación no
+    puede adelantarse indefinidamente a la base de datos). close vacía la cola
+    antes de terminar, también tras un Ctrl-C si se llama desde un finally.
+    """
+
+    def __init__(
+        self,
+        db: Any,
+        spill_path: Union[str, Path],
+        flush_size: int = 200,
+        flush_interval: float = 2.0,
+        max_queue: int = 2000,
+        mode: str = "values"
+    ):
+        """
+        Inicializa el escritor y arranca el hilo de fondo
+
+        Args:
+            db: DatabaseManager (o cualquier objeto con save_triage_results_bulk)
+            spill_path: Fichero JSONL donde se añaden las filas que no se pudieron guardar
+            flush_size: Filas por guardado masivo
+            flush_interval: Segundos máximos que una fila espera en el buffer
+            max_queue: Capacidad de la cola antes de bloquear a los productores
+            mode: Modo de save_triage_results_bulk ("values" o "copy")
+        """
+        self.db = db
+        self.spill_path = Path(spill_path)
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.mode = mode
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, max_queue))
+        self._lock = threading.Lock()
+        self._closed = False
+        self.enqueued = 0
+        self.saved = 0
+        self.spilled = 0
+        self.flushes = 0
+        self.backpressure_seconds = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+
+    def put(self, row: Dict[str, Any]) -> None:
+        """Encola una fila; bloquea mientras la cola esté llena"""
+        if self._closed:
+            raise RuntimeError("El escritor diferido ya está cerrado")
+        start = time.monotonic()
+        self._queue.put(row)
+        waited = time.monotonic() - start
+        with self._lock:
+            self.enqueued += 1
+            self.backpressure_seconds += waited
+
+    def _run(self) -> None:
+        buffer: List[Dict[str, Any]] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(buffer)
+                return
+            if item is not None:
+                buffer.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if len(buffer) >= self.flush_size or (deadline is not None and time.monotonic() >= deadline):
+                self._flush(buffer)
+                buffer = []
+                deadline = None
+
+    def _flush(self, rows: List[Dict[str, Any]]) -> None:
+        """Guarda un bloque; lo que falle va al fichero de volcado"""
+        if not rows:
+            return
+        failed: List[Dict[str, Any]] = []
+        try:
+            saved = self.db.save_triage_results_bulk(rows, mode=self.mode, chunk_size=len(rows), failed=failed)
+        except Exception as e:
+            logger.error(f"Error inesperado en el guardado diferido de {len(rows)} resultados: {e}")
+            saved, failed = 0, list(rows)
+        if failed:
+            self._spill(failed)
+        with self._lock:
+            self.saved += saved
+            self.flushes += 1
+
+    def _spill(self, rows: List[Dict[str, Any]]) -> None:
+        """Añade las filas no guardadas al fichero JSONL de volcado"""
+        try:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as handle:
+                for row in rows:
+                    handle.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            logger.error(f"No se pudieron volcar {len(rows)} resultados a {self.spill_path}: {e}")
+            return
+        with self._lock:
+            self.spilled += len(rows)
+        logger.warning(f"{len(rows)} resultados no guardados volcados a {self.spill_path}")
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Vacía la cola, guarda lo pendiente y detiene el hilo escritor"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error(f"El escritor diferido no terminó en {timeout}s; quedan ~{self._queue.qsize()} resultados en cola")
+
+    def __enter__(self) -> "WriteBehindWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores del escritor"""
+        with self._lock:
+            return {
+                "encoladas": self.enqueued,
+                "guardadas": self.saved,
+                "volcadas": self.spilled,
+                "guardados_masivos": self.flushes,
+                "espera_backpressure_s": round(self.backpressure_seconds, 3),
+            }
+
+
+def load_spilled_rows(spill_path: Union[str, Path]) -> List[Dict[str, Any]]:
+    """Lee las filas de un fichero de volcado para reintentarlas con save_triage_results_bulk"""
+    path = Path(spill_path)
+    if not path.exists():
+        return []
+    rows = []
+    with open(path, encoding="utf-8") as handle:
+        for number, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Una línea cortada por una interrupción a mitad de escritura
+                logger.warning(f"Línea {number} de {path} ilegible; se descarta")
+    return rows
+
+
+def replay_spilled_rows(
+    db: Any,
+    spill_path: Union[str, Path],
+    mode: str = "values",
+    chunk_size: int = 500
+) -> int:
+    """
+    Reenvía a la base de datos las filas de un fichero de volcado
+
+    El fichero se renombra antes de leerlo, de modo que lo que otro escritor
+    vuelque mientras tanto no se pierde; las filas que vuelvan a fallar se
+    añaden de nuevo al fichero de volcado.
+
+    Args:
+        db: DatabaseManager (o cualquier objeto con save_triage_results_bulk)
+        spill_path: Fichero JSONL de volcado
+        mode: Modo de save_triage_results_bulk ("values" o "copy")
+        chunk_size: Filas por transacción
+
+    Returns:
+        Número de filas guardadas
+    """
+    path = Path(spill_path)
+    if not path.exists():
+        return 0
+    replay_path = path.with_name(f"{path.name}.replay")
+    # Un reenvío interrumpido deja su fichero: se reintenta antes que el volcado actual
+    try:
+        if not replay_path.exists():
+            os.replace(path, replay_path)
+        rows = load_spilled_rows(replay_path)
+    except OSError as e:
+        logger.error(f"No se pudo leer el volcado {path}: {e}")
+        return 0
+
+    failed: List[Dict[str, Any]] = []
+    try:
+        saved = db.save_triage_results_bulk(rows, mode=mode, chunk_size=chunk_size, failed=failed)
+    except Exception as e:
+        logger.error(f"Error inesperado al reenviar {len(rows)} resultados volcados: {e}")
+        saved, failed = 0, list(rows)
+
+    if failed:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as handle:
+            for row in failed:
+                handle.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+        logger.warning(f"{len(failed)} resultados volcados siguen sin guardarse; quedan en {path}")
+    replay_path.unlink()
+    if saved:
+        logger.info(f"{saved} resultados volcados reenviados a la base de datos desde {path}")
+    return saved